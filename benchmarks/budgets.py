@@ -0,0 +1,347 @@
+# notelog-api/benchmarks/budgets.py
+"""エンドポイントごとのクエリ数・レスポンスサイズ・メモリ確保量の上限
+
+BUDGETS に config/urls.py の各ルートの代表的なリクエストと上限を宣言し、
+check_budget() で 1 件ずつ計測する（manage.py check_budgets と benchmarks/tests.py から
+全件を実行できる）。
+計測はキャッシュを空にした状態で行い、2 回目のリクエストの値を使う（初回は
+インポートやテンプレートの読み込みなどが混ざるため捨てる）。
+
+クエリ数が上限を超えたときは、記録済みの SQL（SQL_SNAPSHOTS）との差分を表示する。
+"""
+import difflib
+import json
+import re
+import tracemalloc
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, resolve
+
+from users.tokens import RevocableRefreshToken
+
+from .seed import BENCHMARK_PASSWORD
+
+SQL_SNAPSHOTS = Path(__file__).resolve().parent / 'sql_snapshots.json'
+# ルートを網羅しているか確認する自前アプリ（サードパーティは代表的なルートだけを計測する）
+PROJECT_VIEW_MODULES = ('users.', 'notes.', 'core.')
+
+
+class Budget:
+    """1 リクエスト分の上限
+
+    path と data 内の '{name}' は BudgetContext の値で置き換える（計測対象外で準備される）。
+    """
+
+    def __init__(self, method, path, *, queries, response_kib, alloc_kib, data=None,
+                 content_type='application/json', auth=None, status=200):
+        self.method = method
+        self.path = path
+        self.queries = queries
+        self.response_kib = response_kib
+        self.alloc_kib = alloc_kib
+        self.data = data
+        self.content_type = content_type
+        self.auth = auth
+        self.status = status
+
+    @property
+    def label(self):
+        return f'{self.method} {self.path}'
+
+    def build(self, context):
+        """(path, data) を組み立てる"""
+        path = self.path.format_map(context)
+        if isinstance(self.data, dict):
+            data = json.dumps({
+                key: value.format_map(context) if isinstance(value, str) else value
+                for key, value in self.data.items()
+            })
+        elif callable(self.data):
+            data = self.data(context)
+        else:
+            data = self.data
+        return path, data
+
+
+def _bulk_operations(context):
+    return json.dumps({'operations': [
+        {'op': 'create', 'title': 'bulk', 'content': 'bulk content'},
+        {'op': 'update', 'id': context['fresh_note'], 'content': 'updated'},
+        {'op': 'delete', 'id': context['fresh_note']},
+    ]})
+
+
+def _ndjson_notes(context):
+    return ''.join(
+        json.dumps({'title': f'imported {i}', 'content': 'imported content'}) + '\n' for i in range(20)
+    )
+
+
+BUDGETS = [
+    # users
+    Budget('POST', '/api/auth/login/', data={'email': '{email}', 'password': BENCHMARK_PASSWORD},
+           queries=2, response_kib=2, alloc_kib=128),
+    Budget('POST', '/api/auth/refresh/', data={'refresh': '{refresh}'},
+           queries=1, response_kib=2, alloc_kib=128),
+    Budget('POST', '/api/auth/register/',
+           data={'name': 'new user', 'email': '{new_email}', 'password': 'new-password-123'},
+           queries=2, response_kib=1, alloc_kib=128, status=201),
+    Budget('GET', '/api/auth/google/', queries=0, response_kib=1, alloc_kib=64, status=302),
+    Budget('GET', '/api/auth/google/callback/?code=budget', queries=0, response_kib=1, alloc_kib=64,
+           status=302),
+    Budget('POST', '/api/auth/google/token/', data={'code': 'bench-1'},
+           queries=1, response_kib=2, alloc_kib=768),
+    # dj-rest-auth の SocialLoginView は Google を実際に呼ぶため、入力検証までを計測する
+    Budget('POST', '/api/auth/google/login/', data={},
+           queries=1, response_kib=1, alloc_kib=128, status=400),
+    # notes（1 件目のクエリは JWT のユーザー取得）
+    Budget('GET', '/api/notes/', auth='user', queries=2, response_kib=16, alloc_kib=384),
+    Budget('POST', '/api/notes/', auth='user', data={'title': 'new', 'content': 'new content'},
+           queries=8, response_kib=1, alloc_kib=128, status=201),
+    Budget('GET', '/api/notes/{note}/', auth='user', queries=3, response_kib=80, alloc_kib=256),
+    Budget('PATCH', '/api/notes/{fresh_note}/', auth='user', data={'content': 'patched'},
+           queries=10, response_kib=1, alloc_kib=128),
+    Budget('DELETE', '/api/notes/{fresh_note}/', auth='user',
+           queries=9, response_kib=1, alloc_kib=128, status=204),
+    Budget('POST', '/api/notes/bulk/', auth='user', data=_bulk_operations,
+           queries=19, response_kib=1, alloc_kib=256),
+    Budget('GET', '/api/notes/search/?q=django', auth='user', queries=3, response_kib=16, alloc_kib=1024),
+    Budget('GET', '/api/notes/sync/?limit=20', auth='user', queries=2, response_kib=512, alloc_kib=2560),
+    Budget('GET', '/api/notes/export/', auth='user', queries=2, response_kib=512, alloc_kib=1792),
+    Budget('POST', '/api/notes/import/', auth='user', data=_ndjson_notes,
+           content_type='application/x-ndjson', queries=8, response_kib=1, alloc_kib=384),
+    Budget('GET', '/api/notes/{note}/rendered/', auth='user', queries=3, response_kib=80, alloc_kib=256),
+    Budget('GET', '/api/notes/{revised_note}/revisions/', auth='user',
+           queries=3, response_kib=4, alloc_kib=128),
+    Budget('GET', '/api/notes/{revised_note}/revisions/3/', auth='user',
+           queries=4, response_kib=8, alloc_kib=256),
+    Budget('GET', '/api/notes/{revised_note}/revisions/diff/?from=1', auth='user',
+           queries=6, response_kib=16, alloc_kib=384),
+    Budget('GET', '/api/notes/cache-stats/', auth='admin', queries=1, response_kib=1, alloc_kib=128),
+    # core（スタッフの JWT で認証する。1 件目のクエリは JWT のユーザー取得）
+    Budget('GET', '/internal/db-pool/', auth='admin', queries=1, response_kib=1, alloc_kib=64),
+    Budget('GET', '/internal/metrics/', auth='admin', queries=1, response_kib=64, alloc_kib=384),
+    # サードパーティ（代表的なルートのみ）
+    Budget('GET', '/admin/', auth='session', queries=3, response_kib=24, alloc_kib=256),
+    Budget('GET', '/admin/users/user/', auth='session', queries=6, response_kib=32, alloc_kib=384),
+    Budget('GET', '/accounts/login/', queries=3, response_kib=8, alloc_kib=256),
+    Budget('POST', '/api/dj-rest-auth/login/', data={'email': '{email}', 'password': BENCHMARK_PASSWORD},
+           queries=1, response_kib=2, alloc_kib=128),
+    Budget('GET', '/api/dj-rest-auth/user/', auth='user', queries=1, response_kib=1, alloc_kib=128),
+    Budget('POST', '/api/dj-rest-auth/token/verify/', data={'token': '{access}'},
+           queries=0, response_kib=1, alloc_kib=64),
+    Budget('POST', '/api/dj-rest-auth/token/refresh/', data={'refresh': '{refresh}'},
+           queries=1, response_kib=2, alloc_kib=128),
+    Budget('POST', '/dj-rest-auth/token/refresh/', data={'refresh': '{refresh}'},
+           queries=1, response_kib=2, alloc_kib=128),
+    Budget('POST', '/api/dj-rest-auth/registration/',
+           data={'name': 'new user', 'email': '{new_email}',
+                 'password1': 'new-password-123', 'password2': 'new-password-123'},
+           queries=6, response_kib=2, alloc_kib=768, status=201),
+]
+
+
+class BudgetContext(dict):
+    """path / data の置き換えに使う値。fresh_note・new_email などは参照のたびに新しく作る"""
+
+    def __init__(self, users, note_ids, admin):
+        super().__init__()
+        self.users = users
+        self.note_ids = note_ids
+        self.admin = admin
+        self.counter = 0
+
+    def __missing__(self, key):
+        from notes.models import Note
+
+        user = self.users[0]
+        if key == 'email':
+            return user.email
+        if key == 'note':
+            return self.note_ids[len(self.note_ids) // 2]
+        if key == 'fresh_note':
+            return Note.objects.create(title='budget', content='budget content').pk
+        if key == 'revised_note':
+            # 版が 3 つあるノート（参照のたびには作らない）
+            note = Note.objects.create(title='budget', content=Note.objects.get(pk=self['note']).content)
+            for i in range(2):
+                note.content = f'{note.content}\nrevision {i}'
+                note.save()
+            self[key] = note.pk
+            return note.pk
+        if key == 'new_email':
+            self.counter += 1
+            return f'budget{self.counter}@example.com'
+        if key == 'refresh':
+            return str(RevocableRefreshToken.for_user(user))
+        if key == 'access':
+            return str(RevocableRefreshToken.for_user(user).access_token)
+        raise KeyError(key)
+
+    def client(self, auth):
+        client = Client(raise_request_exception=False)
+        if auth == 'user':
+            client.defaults['HTTP_AUTHORIZATION'] = f"Bearer {self['access']}"
+        elif auth == 'admin':
+            token = RevocableRefreshToken.for_user(self.admin).access_token
+            client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+        elif auth == 'session':
+            client.force_login(self.admin)
+        return client
+
+
+class Measurement:
+    def __init__(self, budget, status, queries, response_bytes, alloc_bytes):
+        self.budget = budget
+        self.status = status
+        self.queries = queries
+        self.response_bytes = response_bytes
+        self.alloc_bytes = alloc_bytes
+
+    @property
+    def sql(self):
+        return [normalize_sql(query['sql']) for query in self.queries]
+
+    def violations(self):
+        budget = self.budget
+        problems = []
+        if self.status != budget.status:
+            problems.append(f'ステータス {self.status}（期待値 {budget.status}）')
+        if len(self.queries) > budget.queries:
+            problems.append(f'クエリ {len(self.queries)} 件 > 上限 {budget.queries} 件')
+        if self.response_bytes > budget.response_kib * 1024:
+            problems.append(
+                f'レスポンス {self.response_bytes / 1024:.1f} KiB > 上限 {budget.response_kib} KiB'
+            )
+        if self.alloc_bytes > budget.alloc_kib * 1024:
+            problems.append(f'メモリ確保 {self.alloc_bytes / 1024:.0f} KiB > 上限 {budget.alloc_kib} KiB')
+        return problems
+
+
+def _send(budget, context):
+    client = context.client(budget.auth)
+    path, data = budget.build(context)
+    method = getattr(client, budget.method.lower())
+    if data is None:
+        return lambda: method(path)
+    return lambda: method(path, data, content_type=budget.content_type)
+
+
+def _response_size(response):
+    if response.streaming:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(response.content)
+
+
+def measure(budget, context):
+    """budget のリクエストを（ウォームアップ後に）1 回送り、計測結果を返す"""
+    _send(budget, context)()
+    request = _send(budget, context)
+    cache.clear()
+
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        with CaptureQueriesContext(connection) as queries:
+            response = request()
+            size = _response_size(response)
+        alloc = tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        if started:
+            tracemalloc.stop()
+    executed = [query for query in queries.captured_queries if not _TRANSACTION.match(query['sql'])]
+    return Measurement(budget, response.status_code, executed, size, alloc)
+
+
+# トランザクション制御文はバックエンドによって記録されたりされなかったりするため数えない
+_TRANSACTION = re.compile(r'(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE SAVEPOINT)\b', re.IGNORECASE)
+
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def normalize_sql(sql):
+    """値の違いで差分が出ないよう、文字列・数値リテラルを ? にする"""
+    return _LITERALS.sub('?', sql)
+
+
+def load_snapshots(path=SQL_SNAPSHOTS):
+    path = Path(path)
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def save_snapshots(measurements, path=SQL_SNAPSHOTS):
+    """計測した予算の記録だけを置き換える（--match で一部だけ計測した場合も他の記録は残す）"""
+    measured = {m.budget.label: m.sql for m in measurements}
+    recorded = load_snapshots(path)
+    # 記録の順序は BUDGETS の宣言順にそろえる（削除された予算の記録は捨てる）
+    data = {
+        budget.label: measured.get(budget.label, recorded.get(budget.label))
+        for budget in BUDGETS
+        if budget.label in measured or budget.label in recorded
+    }
+    Path(path).write_text(json.dumps(data, indent=2, ensure_ascii=False) + '\n')
+
+
+def format_sql_report(measurement, snapshots):
+    """記録済み SQL との差分（記録がなければ、同じ形のクエリの回数付き一覧）"""
+    current = measurement.sql
+    recorded = snapshots.get(measurement.budget.label)
+    if recorded is not None:
+        diff = difflib.unified_diff(recorded, current, 'recorded', 'actual', lineterm='', n=1)
+        return '\n'.join(diff)
+    counts = Counter(current)
+    lines = [f'{i:3}. {sql}' for i, sql in enumerate(current, start=1)]
+    repeated = [f'  x{count} {sql}' for sql, count in counts.items() if count > 1]
+    if repeated:
+        lines += ['繰り返し実行されたクエリ（N+1 の可能性）:', *repeated]
+    return '\n'.join(lines)
+
+
+def check_budget(budget, context, snapshots=None):
+    """上限を超えていれば AssertionError（テストから直接呼べる）"""
+    measurement = measure(budget, context)
+    problems = measurement.violations()
+    if problems:
+        message = f"{budget.label}: {', '.join(problems)}"
+        if len(measurement.queries) > budget.queries:
+            message += '\n' + format_sql_report(measurement, snapshots or load_snapshots())
+        raise AssertionError(message)
+    return measurement
+
+
+def iter_routes(patterns=None, prefix=''):
+    """(ルート文字列, ビューのモジュールパス) を列挙する（ResolverMatch.route と同じ形）"""
+    for pattern in get_resolver().url_patterns if patterns is None else patterns:
+        # 正規表現のルートは連結時に先頭の ^ が除かれる
+        route = prefix + str(pattern.pattern).removeprefix('^')
+        if isinstance(pattern, URLResolver):
+            yield from iter_routes(pattern.url_patterns, route)
+        elif isinstance(pattern, URLPattern):
+            yield route, pattern.lookup_str
+
+
+def uncovered_routes(budgets=BUDGETS):
+    """予算のない自前ルートと、1 件も予算のない config/urls.py の include"""
+    # '{note}' などの置き換え箇所はどれも数値 ID なので 1 で解決する
+    ids = defaultdict(lambda: 1)
+    covered = {resolve(budget.path.split('?')[0].format_map(ids)).route for budget in budgets}
+    missing = [
+        route for route, view in iter_routes()
+        if view.startswith(PROJECT_VIEW_MODULES) and route not in covered
+        # DRF のフォーマット接尾辞付き（.json など）は同じビューなので除く
+        and '(?P<format>' not in route
+    ]
+    for pattern in get_resolver().url_patterns:
+        prefix = str(pattern.pattern)
+        if isinstance(pattern, URLResolver) and not any(route.startswith(prefix) for route in covered):
+            missing.append(prefix)
+    return missing
@@ -0,0 +1,100 @@
+# notelog-api/benchmarks/google_stub.py
+"""Google OAuth2 エンドポイントのローカルスタブ
+
+トークン交換・userinfo・JWKS を返し、id_token はこのプロセスで生成した RSA 鍵で
+署名する。認証コード 'bench-<n>' はユーザー n のメールアドレスとして扱う。
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from .seed import user_email
+
+KEY_ID = 'benchmark'
+
+
+class GoogleStub:
+    def __init__(self, client_id):
+        self.client_id = client_id
+        self.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        jwk = jwt.algorithms.RSAAlgorithm.to_jwk(self.private_key.public_key(), as_dict=True)
+        self.jwks = {'keys': [{**jwk, 'kid': KEY_ID, 'alg': 'RS256', 'use': 'sig'}]}
+        self.server = None
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                form = parse_qs(self.rfile.read(length).decode())
+                code = form.get('code', [''])[0]
+                self.send_json({
+                    'access_token': f'access-{code}',
+                    'id_token': stub.make_id_token(code),
+                    'expires_in': 3600,
+                    'token_type': 'Bearer',
+                })
+
+            def do_GET(self):
+                if self.path.startswith('/certs'):
+                    self.send_json(stub.jwks, cache_control='public, max-age=3600')
+                else:
+                    self.send_json({'email': user_email(0), 'name': 'Benchmark 0', 'id': '0'})
+
+            def send_json(self, data, cache_control=None):
+                body = json.dumps(data).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                if cache_control:
+                    self.send_header('Cache-Control', cache_control)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address
+        return f'http://{host}:{port}'
+
+    def settings(self):
+        """override_settings に渡す URL 設定"""
+        return {
+            'GOOGLE_OAUTH2_TOKEN_URL': f'{self.base_url}/token',
+            'GOOGLE_OAUTH2_USERINFO_URL': f'{self.base_url}/userinfo',
+            'GOOGLE_OAUTH2_JWKS_URL': f'{self.base_url}/certs',
+        }
+
+    def make_id_token(self, code):
+        index = code.rpartition('-')[2] or '0'
+        now = int(time.time())
+        claims = {
+            'iss': 'https://accounts.google.com',
+            'aud': self.client_id,
+            'sub': f'google-{index}',
+            'email': user_email(index),
+            'name': f'Benchmark {index}',
+            'iat': now,
+            'exp': now + 3600,
+        }
+        return jwt.encode(claims, self.private_key, algorithm='RS256', headers={'kid': KEY_ID})
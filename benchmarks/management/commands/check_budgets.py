@@ -0,0 +1,78 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.budgets import (
+    BUDGETS,
+    BudgetContext,
+    format_sql_report,
+    load_snapshots,
+    measure,
+    save_snapshots,
+    uncovered_routes,
+)
+from benchmarks.runner import isolated_environment
+from benchmarks.seed import seed_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        'config/urls.py の各ルートに代表的なリクエストを送り、クエリ数・レスポンスサイズ・'
+        'メモリ確保量が benchmarks/budgets.py の上限内か確認します（--settings=benchmarks.settings で実行）'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5)
+        parser.add_argument('--notes', type=int, default=50)
+        parser.add_argument('--match', help='ラベル（"GET /api/notes/" など）にこの文字列を含む予算だけを確認する')
+        parser.add_argument(
+            '--update-snapshots', action='store_true',
+            help='実行した SQL を差分表示用の記録（benchmarks/sql_snapshots.json）に保存する',
+        )
+
+    def handle(self, *args, **options):
+        budgets = [b for b in BUDGETS if not options['match'] or options['match'] in b.label]
+        missing = [] if options['match'] else uncovered_routes()
+
+        with isolated_environment():
+            measurements, failures = self.measure_all(budgets, options)
+
+        for route in missing:
+            failures.append(f'予算が宣言されていないルートがあります: {route}')
+        if options['update_snapshots']:
+            save_snapshots(measurements)
+            self.stdout.write('SQL の記録を更新しました')
+        if failures:
+            for failure in failures:
+                self.stderr.write(self.style.ERROR(failure))
+            raise CommandError(f'{len(failures)} 件が上限を超えています', returncode=1)
+
+    def measure_all(self, budgets, options):
+        users, _ = seed_dataset(options['users'], options['notes'])
+        from notes.models import Note
+
+        admin = get_user_model().objects.create_superuser(
+            email='budget-admin@example.com', name='Budget Admin', password='budget-admin'
+        )
+        context = BudgetContext(users, list(Note.objects.values_list('id', flat=True)), admin)
+        snapshots = load_snapshots()
+
+        self.stdout.write(f"{'request':<42}{'status':>7}{'queries':>10}{'KiB':>14}{'alloc KiB':>16}")
+        measurements = []
+        failures = []
+        for budget in budgets:
+            measurement = measure(budget, context)
+            measurements.append(measurement)
+            problems = measurement.violations()
+            line = (
+                f'{budget.label:<42}{measurement.status:>7}'
+                f'{len(measurement.queries):>5}/{budget.queries:<4}'
+                f'{measurement.response_bytes / 1024:>8.1f}/{budget.response_kib:<5}'
+                f'{measurement.alloc_bytes / 1024:>9.0f}/{budget.alloc_kib:<6}'
+            )
+            self.stdout.write(self.style.ERROR(line) if problems else line)
+            if problems:
+                message = f"{budget.label}: {', '.join(problems)}"
+                if len(measurement.queries) > budget.queries:
+                    message += '\n' + format_sql_report(measurement, snapshots)
+                failures.append(message)
+        return measurements, failures
@@ -0,0 +1,117 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.runner import Context, compare, environment, isolated_environment, run_scenario
+from benchmarks.scenarios import SCENARIOS
+from benchmarks.seed import DEFAULT_NOTE_MIX, seed_dataset
+
+DEFAULT_BASELINE = Path(__file__).resolve().parents[2] / 'baseline.json'
+
+
+class Command(BaseCommand):
+    help = (
+        'テスト用データベースにデータを投入し、主要なエンドポイントのレイテンシ（p50/p95/p99）と'
+        'スループットを計測してベースラインと比較します（--settings=benchmarks.settings で実行）'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--notes', type=int, default=2000)
+        parser.add_argument(
+            '--note-mix', default=DEFAULT_NOTE_MIX,
+            help='ノートサイズの比率（small=200 字 / medium=4000 字 / large=64000 字）',
+        )
+        parser.add_argument('--requests', type=int, default=200, help='シナリオごとのリクエスト数')
+        parser.add_argument(
+            '--concurrency', default='1,4',
+            help='同時クライアント数（カンマ区切りで複数指定すると、それぞれ計測する）',
+        )
+        parser.add_argument(
+            '--scenarios', default=','.join(SCENARIOS),
+            help=f"計測するシナリオ（{', '.join(SCENARIOS)}）",
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+        parser.add_argument('--tolerance', type=float, default=0.25, help='回帰とみなす悪化の割合')
+        parser.add_argument('--output', help='結果を JSON で保存するパス')
+        parser.add_argument('--save-baseline', action='store_true', help='結果でベースラインを上書きする')
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        names = [name.strip() for name in options['scenarios'].split(',') if name.strip()]
+        unknown = [name for name in names if name not in SCENARIOS]
+        if unknown:
+            raise CommandError(f"不明なシナリオです: {', '.join(unknown)}")
+        levels = [int(value) for value in options['concurrency'].split(',')]
+
+        with isolated_environment():
+            results = self.run(names, levels, options)
+
+        report = {'environment': environment(), 'options': self.recorded_options(options), 'results': results}
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(report, indent=2, ensure_ascii=False) + '\n')
+        self.compare(results, options)
+        if options['save_baseline']:
+            Path(options['baseline']).write_text(json.dumps(report, indent=2, ensure_ascii=False) + '\n')
+            self.stdout.write(f"ベースラインを保存しました: {options['baseline']}")
+
+    def run(self, names, levels, options):
+        from notes.models import Note
+
+        self.stdout.write(
+            f"データ投入: users={options['users']} notes={options['notes']} ({options['note_mix']})"
+        )
+        users, _ = seed_dataset(options['users'], options['notes'], options['note_mix'], options['seed'])
+        note_ids = list(Note.objects.values_list('id', flat=True))
+        context = Context(users, note_ids)
+
+        results = {}
+        self.stdout.write(
+            f"{'scenario':<22}{'reqs':>6}{'err':>5}{'p50':>10}{'p95':>10}{'p99':>10}{'req/s':>10}"
+        )
+        for name in names:
+            for concurrency in levels:
+                key = f'{name}@c{concurrency}'
+                result = run_scenario(
+                    SCENARIOS[name], context, options['requests'], concurrency, seed=options['seed']
+                )
+                results[key] = result
+                self.stdout.write(
+                    f"{key:<22}{result['requests']:>6}{result['errors']:>5}"
+                    f"{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+                    f"{result['throughput']:>10.1f}"
+                )
+        return results
+
+    def recorded_options(self, options):
+        keys = ('users', 'notes', 'note_mix', 'requests', 'concurrency', 'seed')
+        return {key: options[key] for key in keys}
+
+    def compare(self, results, options):
+        path = Path(options['baseline'])
+        if not path.exists():
+            self.stdout.write(f'ベースラインがありません: {path}')
+            return
+        baseline = json.loads(path.read_text())
+        rows = compare(results, baseline.get('results', {}), options['tolerance'])
+        self.stdout.write('')
+        self.stdout.write(f'ベースライン比較（{path.name}, 許容 {options["tolerance"]:.0%}）')
+        regressions = 0
+        for key, base, current, p95_change, regressed in rows:
+            if base is None:
+                self.stdout.write(f'  {key:<22} ベースラインなし')
+                continue
+            change = f'{p95_change:+.1%}' if p95_change is not None else '-'
+            line = (
+                f"  {key:<22} p95 {base['p95_ms']:.2f} -> {current['p95_ms']:.2f} ms ({change}), "
+                f"{base['throughput']:.1f} -> {current['throughput']:.1f} req/s"
+            )
+            if regressed:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(line + '  REGRESSION'))
+            else:
+                self.stdout.write(line)
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f'{regressions} 件のシナリオで性能が悪化しました', returncode=1)
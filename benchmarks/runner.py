@@ -0,0 +1,141 @@
+# notelog-api/benchmarks/runner.py
+"""シナリオの実行と集計・ベースラインとの比較"""
+import math
+import platform
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import get_runner, override_settings
+
+from .google_stub import GoogleStub
+
+
+class Context:
+    """シナリオが参照する投入済みデータ"""
+
+    def __init__(self, users, note_ids):
+        self.users = users
+        self.note_ids = note_ids
+
+
+@contextmanager
+def isolated_environment():
+    """テスト用データベースを作り、Google のエンドポイントをスタブに向けた状態にする"""
+    # 本番のデータベースには触れない
+    runner = get_runner(settings)(verbosity=0, interactive=False)
+    old_config = runner.setup_databases()
+    stub = GoogleStub(settings.SOCIALACCOUNT_PROVIDERS['google']['APP']['client_id']).start()
+    try:
+        with override_settings(**stub.settings()):
+            yield
+    finally:
+        stub.stop()
+        runner.teardown_databases(old_config)
+
+
+def percentile(sorted_values, q):
+    """最近傍順位法によるパーセンタイル"""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(q / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    count = len(latencies)
+
+    def ms(value):
+        return round(value * 1000, 3) if value is not None else None
+
+    return {
+        'requests': count,
+        'errors': errors,
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'mean_ms': ms(sum(latencies) / count) if count else None,
+        'throughput': round(count / elapsed, 2) if elapsed else None,
+    }
+
+
+def run_scenario(scenario, context, requests, concurrency, seed=0, warmup=2):
+    """concurrency 個のクライアントで合計 requests 回リクエストし、集計結果を返す"""
+    total = max(int(requests * scenario.request_ratio), concurrency)
+    per_worker = [total // concurrency + (1 if i < total % concurrency else 0) for i in range(concurrency)]
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    # 準備とウォームアップを終えた全ワーカーが揃ってから計測を始める
+    start_times = []
+    start_barrier = threading.Barrier(concurrency, action=lambda: start_times.append(time.perf_counter()))
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        # 500 も失敗として数えるため、ビューの例外を送出させない
+        client = Client(raise_request_exception=False)
+        state = scenario.setup(context, index)
+        for _ in range(warmup):
+            scenario.request(client, context, state, rng)
+        start_barrier.wait()
+        local = []
+        failed = 0
+        try:
+            for _ in range(per_worker[index]):
+                started = time.perf_counter()
+                response = scenario.request(client, context, state, rng)
+                local.append(time.perf_counter() - started)
+                if response.status_code not in scenario.expected_status:
+                    failed += 1
+        finally:
+            with lock:
+                latencies.extend(local)
+                errors.append(failed)
+            if threading.current_thread() is not threading.main_thread():
+                connections.close_all()
+
+    if concurrency == 1:
+        worker(0)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - start_times[0]
+    return summarize(latencies, sum(errors), elapsed)
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'database': connection.vendor,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """ベースラインより p95 が tolerance 以上遅い、またはスループットが tolerance 以上低いものを返す"""
+    rows = []
+    for key, current in results.items():
+        base = baseline.get(key)
+        if not base:
+            rows.append((key, None, current, None, False))
+            continue
+        p95_change = _change(base.get('p95_ms'), current.get('p95_ms'))
+        throughput_change = _change(base.get('throughput'), current.get('throughput'))
+        regressed = (
+            (p95_change is not None and p95_change > tolerance)
+            or (throughput_change is not None and -throughput_change > tolerance)
+        )
+        rows.append((key, base, current, p95_change, regressed))
+    return rows
+
+
+def _change(before, after):
+    if not before or after is None:
+        return None
+    return (after - before) / before
@@ -0,0 +1,118 @@
+# notelog-api/benchmarks/scenarios.py
+"""計測するエンドポイント
+
+各シナリオは、ワーカー（同時接続する 1 クライアント）ごとの準備 setup() と、
+1 リクエストを送る request() を持つ。書き込みを伴うシナリオは他の結果に影響しない
+よう最後に並べる。
+"""
+from users.tokens import RevocableRefreshToken
+
+from .seed import BENCHMARK_PASSWORD, WORDS
+
+
+class Scenario:
+    # --requests に対する倍率（ログインなど重いシナリオは減らす）
+    request_ratio = 1.0
+    expected_status = (200,)
+
+    def __init__(self, name):
+        self.name = name
+
+    def setup(self, context, worker):
+        return {}
+
+    def request(self, client, context, state, rng):
+        raise NotImplementedError
+
+
+def bearer(user):
+    return {'HTTP_AUTHORIZATION': f'Bearer {RevocableRefreshToken.for_user(user).access_token}'}
+
+
+class Login(Scenario):
+    request_ratio = 0.1
+
+    def request(self, client, context, state, rng):
+        user = rng.choice(context.users)
+        return client.post(
+            '/api/auth/login/',
+            {'email': user.email, 'password': BENCHMARK_PASSWORD},
+            content_type='application/json',
+        )
+
+
+class Refresh(Scenario):
+    """ローテーションされたリフレッシュトークンを次のリクエストで使う"""
+
+    def setup(self, context, worker):
+        user = context.users[worker % len(context.users)]
+        return {'refresh': str(RevocableRefreshToken.for_user(user))}
+
+    def request(self, client, context, state, rng):
+        response = client.post(
+            '/api/auth/refresh/', {'refresh': state['refresh']}, content_type='application/json'
+        )
+        if response.status_code == 200:
+            state['refresh'] = response.json()['refresh']
+        return response
+
+
+class AuthenticatedScenario(Scenario):
+    def setup(self, context, worker):
+        return {'headers': bearer(context.users[worker % len(context.users)])}
+
+
+class NotesList(AuthenticatedScenario):
+    def request(self, client, context, state, rng):
+        return client.get('/api/notes/', **state['headers'])
+
+
+class NotesDetail(AuthenticatedScenario):
+    def request(self, client, context, state, rng):
+        return client.get(f'/api/notes/{rng.choice(context.note_ids)}/', **state['headers'])
+
+
+class NotesSearch(AuthenticatedScenario):
+    def request(self, client, context, state, rng):
+        query = ' '.join(rng.sample(WORDS, 2))
+        return client.get('/api/notes/search/', {'q': query}, **state['headers'])
+
+
+class NotesSync(AuthenticatedScenario):
+    def request(self, client, context, state, rng):
+        return client.get('/api/notes/sync/', **state['headers'])
+
+
+class GoogleToken(Scenario):
+    def request(self, client, context, state, rng):
+        index = rng.randrange(len(context.users))
+        return client.post(
+            '/api/auth/google/token/', {'code': f'bench-{index}'}, content_type='application/json'
+        )
+
+
+class NotesCreate(AuthenticatedScenario):
+    expected_status = (201,)
+
+    def request(self, client, context, state, rng):
+        return client.post(
+            '/api/notes/',
+            {'title': 'benchmark', 'content': ' '.join(rng.choices(WORDS, k=200))},
+            content_type='application/json',
+            **state['headers'],
+        )
+
+
+SCENARIOS = {
+    scenario.name: scenario
+    for scenario in (
+        Login('login'),
+        Refresh('refresh'),
+        NotesList('notes_list'),
+        NotesDetail('notes_detail'),
+        NotesSearch('notes_search'),
+        NotesSync('notes_sync'),
+        GoogleToken('google_token'),
+        NotesCreate('notes_create'),
+    )
+}
@@ -0,0 +1,81 @@
+# notelog-api/benchmarks/seed.py
+"""ベンチマーク用データの投入
+
+乱数のシードを固定し、同じ引数なら毎回同じデータになるようにする。
+"""
+import random
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+
+from notes.importer import NoteImporter
+
+BENCHMARK_PASSWORD = 'benchmark-password'
+# ノート本文のおおよその文字数
+NOTE_SIZES = {'small': 200, 'medium': 4000, 'large': 64000}
+DEFAULT_NOTE_MIX = 'small=70,medium=25,large=5'
+
+WORDS = (
+    'django', 'python', 'postgres', 'cache', 'index', 'query', 'latency', 'token',
+    'note', 'search', 'sync', 'export', 'import', 'render', 'markdown', 'release',
+    'メモ', '検索', '同期', '日本語', '性能', '改善', '設計', '会議', '議事録', '読書',
+)
+
+
+def parse_note_mix(value):
+    """'small=70,medium=25,large=5' を [(サイズ名, 重み)] にする"""
+    mix = []
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in NOTE_SIZES:
+            raise ValueError(f'不明なノートサイズです: {name}')
+        mix.append((name, int(weight or 1)))
+    return mix
+
+
+def make_text(rng, length):
+    parts = []
+    size = 0
+    while size < length:
+        word = rng.choice(WORDS)
+        parts.append(word)
+        size += len(word) + 1
+    return ' '.join(parts)[:length]
+
+
+def seed_users(count):
+    User = get_user_model()
+    # ハッシュ計算は 1 回だけ行い、全員同じパスワードにする
+    password = make_password(BENCHMARK_PASSWORD)
+    User.objects.bulk_create(
+        User(email=user_email(i), name=f'Benchmark {i}', password=password)
+        for i in range(count)
+    )
+    return list(User.objects.filter(email__startswith='bench').order_by('id'))
+
+
+def user_email(index):
+    return f'bench{index}@example.com'
+
+
+def iter_note_records(count, mix, rng):
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    for i in range(count):
+        size = rng.choices(names, weights)[0]
+        yield i, {
+            'title': f'{make_text(rng, 40)} #{i}',
+            'content': make_text(rng, NOTE_SIZES[size]),
+        }
+
+
+def seed_notes(count, mix, rng):
+    return NoteImporter().run(iter_note_records(count, mix, rng))
+
+
+def seed_dataset(users, notes, note_mix=DEFAULT_NOTE_MIX, seed=0):
+    rng = random.Random(seed)
+    created_users = seed_users(users)
+    result = seed_notes(notes, parse_note_mix(note_mix), rng)
+    return created_users, result
@@ -0,0 +1,48 @@
+# notelog-api/benchmarks/settings.py
+"""ベンチマーク用の設定
+
+    python manage.py run_benchmarks --settings=benchmarks.settings
+
+既定では一時ディレクトリの SQLite を使う。BENCHMARK_DATABASE=postgres のときは
+config.settings の PostgreSQL に test_ 付きのデータベースを作って使う（終了時に削除）。
+"""
+import os
+import tempfile
+
+os.environ.setdefault('SECRET_KEY', 'benchmark-secret-key')
+os.environ.setdefault('POSTGRES_PASSWORD', '')
+os.environ.setdefault('DEBUG', 'False')
+
+from config.settings import *  # noqa: E402,F401,F403
+from config.settings import DATABASES, INSTALLED_APPS, LOGGING, SOCIALACCOUNT_PROVIDERS, env  # noqa: E402
+
+INSTALLED_APPS = [*INSTALLED_APPS, 'benchmarks']
+
+BENCHMARK_DATABASE = env('BENCHMARK_DATABASE', default='sqlite')
+if BENCHMARK_DATABASE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(tempfile.gettempdir(), 'notelog_benchmark.sqlite3'),
+            'TEST': {'NAME': os.path.join(tempfile.gettempdir(), 'test_notelog_benchmark.sqlite3')},
+            # 並行リクエストの書き込みはロック待ちにする（読んでから書くトランザクションの競合を避ける）
+            'OPTIONS': {
+                'timeout': 30,
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': 'PRAGMA journal_mode=WAL;',
+            },
+        }
+    }
+
+# テストクライアント（testserver / http）からのリクエストを通す
+ALLOWED_HOSTS = ['testserver']
+SECURE_SSL_REDIRECT = False
+
+# Google のエンドポイントは実行時にローカルのスタブへ向ける（benchmarks.google_stub）
+SOCIALACCOUNT_PROVIDERS['google']['APP']['secret'] = 'benchmark-client-secret'
+
+# リクエストごとの INFO ログで結果が読みにくくならないようにする
+for _logger in LOGGING['loggers'].values():
+    if _logger.get('handlers'):
+        _logger['level'] = 'WARNING'
+LOGGING['root']['level'] = 'WARNING'
@@ -0,0 +1,43 @@
+from unittest import skipUnless
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from .budgets import BUDGETS, BudgetContext, check_budget, load_snapshots, uncovered_routes
+from .google_stub import GoogleStub
+from .seed import seed_dataset
+
+
+@skipUnless(apps.is_installed('benchmarks'), 'manage.py test --settings=benchmarks.settings で実行する')
+class BudgetTests(TestCase):
+    """BUDGETS の上限を超えたらテストを失敗させる（manage.py check_budgets と同じ計測）"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        stub = GoogleStub(settings.SOCIALACCOUNT_PROVIDERS['google']['APP']['client_id']).start()
+        cls.addClassCleanup(stub.stop)
+        cls.enterClassContext(override_settings(**stub.settings()))
+
+    @classmethod
+    def setUpTestData(cls):
+        from notes.models import Note
+
+        cls.users, _ = seed_dataset(5, 50)
+        cls.admin = get_user_model().objects.create_superuser(
+            email='budget-admin@example.com', name='Budget Admin', password='budget-admin'
+        )
+        cls.note_ids = list(Note.objects.values_list('id', flat=True))
+
+    def test_budgets(self):
+        context = BudgetContext(self.users, self.note_ids, self.admin)
+        snapshots = load_snapshots()
+        for budget in BUDGETS:
+            with self.subTest(budget.label):
+                check_budget(budget, context, snapshots)
+
+    def test_all_routes_have_budgets(self):
+        self.assertEqual(uncovered_routes(), [])
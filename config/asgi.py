@@ -9,8 +9,32 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
-
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# 設定側で ASGI 用の DB 接続モードを選ぶための目印
+os.environ.setdefault('NOTELOG_ASGI', '1')
+
+# JWT だけを使う API パスではセッション系ミドルウェアを通さない（core.handlers）
+from core.handlers import get_asgi_application  # noqa: E402
+
+django_application = get_asgi_application()
+
+from users.http import close_pooled_clients  # noqa: E402  (Django の初期化後に読み込む)
+
+
+async def lifespan(scope, receive, send):
+    """lifespan イベント: 終了時に共有 HTTP クライアントのコネクションを閉じる"""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await close_pooled_clients()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
 
-application = get_asgi_application()
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(scope, receive, send)
+        return
+    await django_application(scope, receive, send)
@@ -2,6 +2,7 @@ from pathlib import Path
 import environ
 import os
 from datetime import timedelta
+from django.core.exceptions import ImproperlyConfigured
 
 # BASE_DIR / 環境変数の読み込み
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -23,6 +24,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.sites',
+    'django.contrib.postgres',  # 全文検索（tsvector / pg_trgm）
 
     # 外部ライブラリ
     'rest_framework',
@@ -39,6 +41,7 @@ INSTALLED_APPS = [
     'dj_rest_auth.registration',
 
     # 自作アプリ
+    'core',
     'users',
     'notes',
 ]
@@ -86,6 +89,19 @@ SOCIALACCOUNT_PROVIDERS = {
     }
 }
 
+# Google API 呼び出し（users.views.GoogleAuthTokenView）
+# URL はローカルのスタブサーバに向けてテストできるよう環境変数で上書き可能
+GOOGLE_OAUTH2_TOKEN_URL = env('GOOGLE_OAUTH2_TOKEN_URL', default='https://oauth2.googleapis.com/token')
+GOOGLE_OAUTH2_USERINFO_URL = env('GOOGLE_OAUTH2_USERINFO_URL', default='https://www.googleapis.com/oauth2/v2/userinfo')
+GOOGLE_OAUTH2_JWKS_URL = env('GOOGLE_OAUTH2_JWKS_URL', default='https://www.googleapis.com/oauth2/v3/certs')
+# id_token の exp / iat 検証で許容する時計のずれ（秒）
+GOOGLE_ID_TOKEN_LEEWAY = env.int('GOOGLE_ID_TOKEN_LEEWAY', default=30)
+# 共有 HTTP クライアントのタイムアウト（秒）とコネクションプール
+GOOGLE_HTTP_TIMEOUT = env.float('GOOGLE_HTTP_TIMEOUT', default=10.0)
+GOOGLE_HTTP_MAX_CONNECTIONS = env.int('GOOGLE_HTTP_MAX_CONNECTIONS', default=100)
+GOOGLE_HTTP_MAX_KEEPALIVE = env.int('GOOGLE_HTTP_MAX_KEEPALIVE', default=20)
+GOOGLE_HTTP_KEEPALIVE_EXPIRY = env.float('GOOGLE_HTTP_KEEPALIVE_EXPIRY', default=30.0)
+
 # ソーシャルアカウント追加設定
 SOCIALACCOUNT_EMAIL_VERIFICATION = 'none'
 SOCIALACCOUNT_LOGIN_ON_GET = True
@@ -94,6 +110,9 @@ SOCIALACCOUNT_QUERY_EMAIL = True
 
 # ミドルウェア
 MIDDLEWARE = [
+    'core.middleware.RequestIDMiddleware',  # ログ用のリクエスト ID（最初に配置）
+    'core.middleware.MetricsMiddleware',  # ルートごとの計測（/internal/metrics/）
+    'core.middleware.CompressionMiddleware',  # レスポンス圧縮（本文を変更する他のミドルウェアより前に配置）
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # CORSは CommonMiddleware の前に配置
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -105,9 +124,45 @@ MIDDLEWARE = [
     'allauth.account.middleware.AccountMiddleware',  # 最後に配置
 ]
 
-# URL / WSGI
+# JWT だけで認証する API のパス。STATEFUL_MIDDLEWARE を除いた軽いスタックで処理する（core.handlers）
+# これらのパスではセッション認証（SessionAuthentication）は使えない
+STATELESS_PATH_PREFIXES = env.list('STATELESS_PATH_PREFIXES', default=[
+    '/api/notes/',
+    '/api/auth/login/',
+    '/api/auth/refresh/',
+    '/api/auth/register/',
+    '/api/auth/google/token/',
+    '/internal/',
+])
+STATEFUL_MIDDLEWARE = [
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'allauth.account.middleware.AccountMiddleware',
+]
+
+# 計測（core.metrics）: レイテンシのヒストグラムの境界（秒）と Server-Timing ヘッダーの付与
+METRICS_LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+METRICS_SERVER_TIMING = env.bool('METRICS_SERVER_TIMING', default=DEBUG)
+
+# レスポンス圧縮（core.middleware.CompressionMiddleware）
+# 対象のパス。秘密情報を含むレスポンス（認証・admin）は BREACH 対策のため含めない
+COMPRESSION_PATH_PREFIXES = env.list('COMPRESSION_PATH_PREFIXES', default=['/api/notes/'])
+# サーバ側の優先順。br は brotli、zstd は zstandard がインストールされている場合だけ使う
+COMPRESSION_ENCODINGS = env.list('COMPRESSION_ENCODINGS', default=['zstd', 'br', 'gzip'])
+COMPRESSION_MIN_BYTES = env.int('COMPRESSION_MIN_BYTES', default=1024)
+COMPRESSION_GZIP_LEVEL = env.int('COMPRESSION_GZIP_LEVEL', default=6)
+COMPRESSION_BROTLI_LEVEL = env.int('COMPRESSION_BROTLI_LEVEL', default=5)
+COMPRESSION_ZSTD_LEVEL = env.int('COMPRESSION_ZSTD_LEVEL', default=3)
+# 強い ETag の付いたレスポンスの圧縮結果をキャッシュする秒数（0 で無効）と、対象にする最大サイズ
+COMPRESSION_CACHE_TIMEOUT = env.int('COMPRESSION_CACHE_TIMEOUT', default=300)
+COMPRESSION_CACHE_MAX_BYTES = env.int('COMPRESSION_CACHE_MAX_BYTES', default=1024 * 1024)
+
+# URL / WSGI / ASGI
 ROOT_URLCONF = 'config.urls'
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
 
 # テンプレート設定（allauth用）
 TEMPLATES = [
@@ -142,6 +197,69 @@ DATABASES = {
     }
 }
 
+# DB 接続モード
+#   none       : リクエストごとに接続・切断（開発環境）
+#   persistent : スレッドごとに接続を使い回す（WSGI 向け。利用前にヘルスチェック）
+#   pool       : psycopg 3 のコネクションプール（ASGI 向け。psycopg[pool] が必要）
+# ASGI ではリクエストごとにスレッドが変わり得るため persistent は使えず、none として扱う
+DB_CONNECTION_MODE = env('DB_CONNECTION_MODE', default='none' if DEBUG else 'persistent')
+if DB_CONNECTION_MODE == 'persistent' and env.bool('NOTELOG_ASGI', default=False):
+    DB_CONNECTION_MODE = 'none'
+
+if DB_CONNECTION_MODE == 'persistent':
+    DATABASES['default']['CONN_MAX_AGE'] = env.int('DB_CONN_MAX_AGE', default=600)
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+elif DB_CONNECTION_MODE == 'pool':
+    try:
+        from psycopg_pool import ConnectionPool
+    except ImportError as e:
+        raise ImproperlyConfigured(
+            'DB_CONNECTION_MODE=pool には psycopg[binary,pool] が必要です（requirements.txt は psycopg2 のみ）'
+        ) from e
+
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': env.int('DB_POOL_MIN_SIZE', default=2),
+        'max_size': env.int('DB_POOL_MAX_SIZE', default=10),
+        # 空きがない場合に待つ最大秒数（超えると PoolTimeout）
+        'timeout': env.float('DB_POOL_TIMEOUT', default=5.0),
+        # この秒数使われなかった接続は min_size まで閉じる
+        'max_idle': env.float('DB_POOL_MAX_IDLE', default=600.0),
+        # 貸し出し前に接続が生きているか確認する
+        'check': ConnectionPool.check_connection,
+    }
+elif DB_CONNECTION_MODE != 'none':
+    raise ValueError(f'DB_CONNECTION_MODE が不正です: {DB_CONNECTION_MODE}')
+
+# パスワードハッシュ（users.hashers）: argon2 / scrypt / pbkdf2
+# argon2 には argon2-cffi が必要。先頭以外のハッシュも検証でき、ログイン時に先頭の方式へ再ハッシュされる
+PASSWORD_HASHER = env('PASSWORD_HASHER', default='pbkdf2')
+_PASSWORD_HASHERS = {
+    'argon2': 'users.hashers.TunedArgon2PasswordHasher',
+    'scrypt': 'users.hashers.TunedScryptPasswordHasher',
+    'pbkdf2': 'users.hashers.TunedPBKDF2PasswordHasher',
+}
+# Django 既定のハッシュ方式のうち、上の 3 方式と algorithm が重複しないもの（既存のハッシュを検証し、
+# ログイン時に再ハッシュするため末尾に残す。重複する方式は後ろが優先されるので含めない）
+_LEGACY_PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+PASSWORD_HASHERS = [
+    _PASSWORD_HASHERS.pop(PASSWORD_HASHER), *_PASSWORD_HASHERS.values(), *_LEGACY_PASSWORD_HASHERS,
+]
+# コスト（変更すると既存ユーザーは次回ログイン時に再ハッシュされる）
+PASSWORD_HASHER_PBKDF2_ITERATIONS = env.int('PASSWORD_HASHER_PBKDF2_ITERATIONS', default=1_000_000)
+PASSWORD_HASHER_SCRYPT_WORK_FACTOR = env.int('PASSWORD_HASHER_SCRYPT_WORK_FACTOR', default=2 ** 14)
+PASSWORD_HASHER_SCRYPT_BLOCK_SIZE = env.int('PASSWORD_HASHER_SCRYPT_BLOCK_SIZE', default=8)
+PASSWORD_HASHER_SCRYPT_PARALLELISM = env.int('PASSWORD_HASHER_SCRYPT_PARALLELISM', default=1)
+PASSWORD_HASHER_ARGON2_TIME_COST = env.int('PASSWORD_HASHER_ARGON2_TIME_COST', default=2)
+PASSWORD_HASHER_ARGON2_MEMORY_COST = env.int('PASSWORD_HASHER_ARGON2_MEMORY_COST', default=102400)  # KiB
+PASSWORD_HASHER_ARGON2_PARALLELISM = env.int('PASSWORD_HASHER_ARGON2_PARALLELISM', default=8)
+# ハッシュ計算を行うスレッド数（0 なら CPU コア数）と、空きを待てるリクエスト数・秒数
+PASSWORD_HASHING_WORKERS = env.int('PASSWORD_HASHING_WORKERS', default=0)
+PASSWORD_HASHING_QUEUE = env.int('PASSWORD_HASHING_QUEUE', default=32)
+PASSWORD_HASHING_TIMEOUT = env.float('PASSWORD_HASHING_TIMEOUT', default=5.0)
+
 # パスワードバリデーション
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -174,19 +292,22 @@ FILE_UPLOAD_PERMISSIONS = 0o644
 AUTH_USER_MODEL = 'users.User'
 
 # Django REST Framework + JWT
+# JSON の変換に orjson を使う（core.renderers / core.parsers）。未インストールなら標準の json と同じ処理になる
+FAST_JSON = env.bool('FAST_JSON', default=True)
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',  # ユーザー情報をキャッシュする JWT 認証
         'rest_framework.authentication.SessionAuthentication',  # Admin用
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'core.renderers.FastJSONRenderer' if FAST_JSON else 'rest_framework.renderers.JSONRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
-        'rest_framework.parsers.JSONParser',
+        'core.parsers.FastJSONParser' if FAST_JSON else 'rest_framework.parsers.JSONParser',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
@@ -214,8 +335,21 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_EXP_CLAIM': 'refresh_exp',
     'SLIDING_TOKEN_LIFETIME': timedelta(minutes=5),
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
+    # 失効済みトークンは DB（token_blacklist）ではなくキャッシュで管理する（users.revocation）
+    'TOKEN_REFRESH_SERIALIZER': 'users.serializers.RevocableTokenRefreshSerializer',
 }
 
+# リフレッシュトークン失効リストのブルームフィルタ（プロセス内）
+# 有効にすると失効していないトークンの確認でキャッシュを引かない。
+# 他プロセスでの失効は同期間隔（秒）だけ遅れて反映される
+JWT_REVOCATION_FILTER = env.bool('JWT_REVOCATION_FILTER', default=False)
+JWT_REVOCATION_FILTER_BITS = env.int('JWT_REVOCATION_FILTER_BITS', default=1 << 18)
+JWT_REVOCATION_FILTER_HASHES = env.int('JWT_REVOCATION_FILTER_HASHES', default=7)
+JWT_REVOCATION_FILTER_SYNC_INTERVAL = env.float('JWT_REVOCATION_FILTER_SYNC_INTERVAL', default=1.0)
+
+# JWT 認証時のユーザー情報キャッシュの保持秒数（users.authentication）
+JWT_USER_CACHE_TIMEOUT = env.int('JWT_USER_CACHE_TIMEOUT', default=300)
+
 # dj-rest-auth設定（Google OAuth2対応）
 REST_AUTH = {
     'USE_JWT': True,
@@ -301,42 +435,75 @@ LOCALE_PATHS = [
 # 自動フィールド
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-# 内部IPs（デバッグ用）
-INTERNAL_IPS = env.list('INTERNAL_IPS', default=['127.0.0.1', 'localhost'])
+# 内部IPs（デバッグ用）。REMOTE_ADDR と比較するのでホスト名は書けない
+INTERNAL_IPS = env.list('INTERNAL_IPS', default=['127.0.0.1', '::1'])
+
+# 運用向けエンドポイント（/internal/）の共有トークン。X-Internal-Token ヘッダーで送る
+# 未設定ならスタッフユーザーの JWT でのみアクセスできる（core.permissions.IsInternalClient）
+INTERNAL_API_TOKEN = env('INTERNAL_API_TOKEN', default='')
+
+# ログ設定
+# 各ロガーは 'queue' に積むだけで、出力（console / file）はバックグラウンドスレッドが行う（core.log）
+LOG_FORMAT = env('LOG_FORMAT', default='json')  # json / simple / verbose
+# allauth / dj_rest_auth の DEBUG ログを出力する割合（0〜1）
+LOG_DEBUG_SAMPLE_RATE = env.float('LOG_DEBUG_SAMPLE_RATE', default=0.1)
 
-# ログ設定（OAuth2デバッグ用）
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
     'formatters': {
         'verbose': {
-            'format': '{levelname} {asctime} {module} {process:d} {thread:d} {message}',
+            'format': '{levelname} {asctime} {module} {process:d} {thread:d} {request_id} {message}',
             'style': '{',
         },
         'simple': {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'core.log.JSONFormatter',
+        },
+    },
+    'filters': {
+        'request_id': {
+            '()': 'core.log.RequestIDFilter',
+        },
+        'sampling': {
+            '()': 'core.log.SamplingFilter',
+            'rates': {
+                'allauth': LOG_DEBUG_SAMPLE_RATE,
+                'dj_rest_auth': LOG_DEBUG_SAMPLE_RATE,
+            },
+        },
     },
     'handlers': {
         'console': {
             'class': 'logging.StreamHandler',
-            'formatter': 'simple',
-            'level': 'INFO',
+            'formatter': LOG_FORMAT,
+            'level': 'DEBUG' if DEBUG else 'INFO',
         },
         'file': {
             'class': 'logging.FileHandler',
             'filename': BASE_DIR / 'logs' / 'django.log',
             'formatter': 'verbose',
+            # verbose は request_id を使うので、queue を通さずに使う場合も付ける
+            'filters': ['request_id'],
+        },
+        'queue': {
+            '()': 'core.log.QueueHandler',
+            'targets': ['cfg://handlers.console'],
+            # これを超えて溜まった分は捨てる（リクエストスレッドを待たせない）
+            'maxsize': env.int('LOG_QUEUE_SIZE', default=10000),
+            'filters': ['request_id', 'sampling'],
         },
     },
     'root': {
-        'handlers': ['console'],
+        'handlers': ['queue'],
         'level': 'INFO',
     },
     'loggers': {
         'django': {
-            'handlers': ['console'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': False,
         },
@@ -346,22 +513,22 @@ LOGGING = {
             'propagate': False,
         },
         'allauth': {
-            'handlers': ['console'],
-            'level': 'DEBUG' if DEBUG else 'INFO',  # OAuth2デバッグ用
+            'handlers': ['queue'],
+            'level': 'DEBUG' if DEBUG else 'INFO',  # OAuth2デバッグ用（DEBUG はサンプリング）
             'propagate': False,
         },
         'dj_rest_auth': {
-            'handlers': ['console'],
-            'level': 'DEBUG' if DEBUG else 'INFO',  # REST APIデバッグ用
+            'handlers': ['queue'],
+            'level': 'DEBUG' if DEBUG else 'INFO',  # REST APIデバッグ用（DEBUG はサンプリング）
             'propagate': False,
         },
         'users': {
-            'handlers': ['console'],
+            'handlers': ['queue'],
             'level': 'DEBUG' if DEBUG else 'INFO',
             'propagate': False,
         },
         'notes': {
-            'handlers': ['console'],
+            'handlers': ['queue'],
             'level': 'DEBUG' if DEBUG else 'INFO',
             'propagate': False,
         },
@@ -392,6 +559,9 @@ if env('REDIS_URL', default=None):
         }
     }
 
+# ノート一覧・詳細レスポンスのキャッシュ保持秒数
+NOTES_CACHE_TIMEOUT = env.int('NOTES_CACHE_TIMEOUT', default=300)
+
 # データベースルーティング（将来の読み書き分離用）
 DATABASE_ROUTERS = []
 
@@ -400,6 +570,28 @@ API_VERSION = env('API_VERSION', default='v1')
 API_TITLE = env('API_TITLE', default='Notelog API')
 API_DESCRIPTION = env('API_DESCRIPTION', default='Personal Knowledge Management Platform API')
 
+# ノート差分同期: 削除の墓標を保持する日数（これより古いトークンは全件再同期）
+NOTES_SYNC_TOMBSTONE_RETENTION_DAYS = env.int('NOTES_SYNC_TOMBSTONE_RETENTION_DAYS', default=90)
+
+# ノート本文（NoteBody）の圧縮: zstd / zlib / none（zstd は zstandard が必要。未インストールなら圧縮しない）
+NOTES_BODY_COMPRESSION = env('NOTES_BODY_COMPRESSION', default='zstd')
+# これより小さい本文は圧縮しない（バイト数）
+NOTES_BODY_COMPRESSION_MIN_BYTES = env.int('NOTES_BODY_COMPRESSION_MIN_BYTES', default=4096)
+NOTES_BODY_ZSTD_LEVEL = env.int('NOTES_BODY_ZSTD_LEVEL', default=3)
+NOTES_BODY_ZLIB_LEVEL = env.int('NOTES_BODY_ZLIB_LEVEL', default=6)
+
+# ノートの版の履歴: 何版ごとに本文全体のスナップショットを保存するか（版の復元で当てる差分の最大数）
+NOTES_REVISION_SNAPSHOT_INTERVAL = env.int('NOTES_REVISION_SNAPSHOT_INTERVAL', default=20)
+# compact_note_revisions: この日数より新しい版はすべて残し、それより古い版は 1 日 1 版に間引く
+NOTES_REVISION_KEEP_ALL_DAYS = env.int('NOTES_REVISION_KEEP_ALL_DAYS', default=7)
+# compact_note_revisions: この日数より古い版は削除する（0 なら削除しない。最新の版は常に残す）
+NOTES_REVISION_RETENTION_DAYS = env.int('NOTES_REVISION_RETENTION_DAYS', default=365)
+
+# 本文をレンダリングした HTML（notes.rendering）を NoteBody にも保存するか（False ならキャッシュのみ）
+NOTES_RENDERED_HTML_PERSIST = env.bool('NOTES_RENDERED_HTML_PERSIST', default=True)
+# レンダリング済み HTML のキャッシュ保持秒数（キーは本文のハッシュなので無効化は不要）
+NOTES_RENDERED_HTML_CACHE_TIMEOUT = env.int('NOTES_RENDERED_HTML_CACHE_TIMEOUT', default=24 * 60 * 60)
+
 # セキュリティヘッダー（追加）
 SECURE_REFERRER_POLICY = 'strict-origin-when-cross-origin'
 SECURE_CROSS_ORIGIN_OPENER_POLICY = 'same-origin'
@@ -4,6 +4,8 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from users.views import RevocableCookieTokenRefreshView
+
 urlpatterns = [
     # Django管理画面
     path('admin/', admin.site.urls),
@@ -14,7 +16,14 @@ urlpatterns = [
     # カスタムAPI（優先度高）
     path('api/auth/', include('users.urls')),
     path('api/notes/', include('notes.urls')),
+
+    # 運用向け（INTERNAL_API_TOKEN を送ったクライアントかスタッフのみ）
+    path('internal/', include('core.urls')),
     
+    # dj-rest-auth のリフレッシュは失効リスト（users.revocation）を使うビューに差し替える
+    path('api/dj-rest-auth/token/refresh/', RevocableCookieTokenRefreshView.as_view()),
+    path('dj-rest-auth/token/refresh/', RevocableCookieTokenRefreshView.as_view()),
+
     # dj-rest-auth API（標準）
     path('api/dj-rest-auth/', include('dj_rest_auth.urls')),
     path('api/dj-rest-auth/registration/', include('dj_rest_auth.registration.urls')),
@@ -9,8 +9,9 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 
 import os
 
-from django.core.wsgi import get_wsgi_application
-
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
+# JWT だけを使う API パスではセッション系ミドルウェアを通さない（core.handlers）
+from core.handlers import get_wsgi_application  # noqa: E402
+
 application = get_wsgi_application()
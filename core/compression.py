@@ -0,0 +1,176 @@
+# notelog-api/core/compression.py
+"""レスポンス圧縮（core.middleware.CompressionMiddleware）の符号化方式とキャッシュ
+
+gzip は標準ライブラリ、br は brotli、zstd は zstandard パッケージがインストール
+されている場合だけ使う。StreamingHttpResponse はチャンクごとにフラッシュしながら
+圧縮するので、クライアントは全体の生成を待たずに受信できる。
+
+強い ETag の付いたレスポンスは、同じ ETag なら本文も同じなので、圧縮結果を
+(符号化方式, ホスト, パス, ETag) をキーにキャッシュし、次からは圧縮しない。
+"""
+import hashlib
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CACHE_KEY_PREFIX = 'compressed'
+
+
+class GzipCodec:
+    name = 'gzip'
+
+    def __init__(self, level):
+        self.level = level
+
+    def compressobj(self):
+        return zlib.compressobj(self.level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        compressor = self.compressobj()
+        return compressor.compress(data) + compressor.flush()
+
+    def stream(self, chunks):
+        compressor = self.compressobj()
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    async def astream(self, chunks):
+        compressor = self.compressobj()
+        async for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+class BrotliCodec:
+    name = 'br'
+
+    def __init__(self, level):
+        self.level = level
+
+    def compress(self, data):
+        return brotli.compress(data, quality=self.level)
+
+    def stream(self, chunks):
+        compressor = brotli.Compressor(quality=self.level)
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+
+    async def astream(self, chunks):
+        compressor = brotli.Compressor(quality=self.level)
+        async for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+
+
+class ZstdCodec:
+    name = 'zstd'
+
+    def __init__(self, level):
+        self.level = level
+
+    def compress(self, data):
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def stream(self, chunks):
+        compressor = zstandard.ZstdCompressor(level=self.level).compressobj()
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    async def astream(self, chunks):
+        compressor = zstandard.ZstdCompressor(level=self.level).compressobj()
+        async for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+def get_codecs():
+    """COMPRESSION_ENCODINGS の順（サーバ側の優先順）で、使える符号化方式を返す"""
+    available = {
+        'gzip': lambda: GzipCodec(settings.COMPRESSION_GZIP_LEVEL),
+        'br': (lambda: BrotliCodec(settings.COMPRESSION_BROTLI_LEVEL)) if brotli else None,
+        'zstd': (lambda: ZstdCodec(settings.COMPRESSION_ZSTD_LEVEL)) if zstandard else None,
+    }
+    return [available[name]() for name in settings.COMPRESSION_ENCODINGS if available.get(name)]
+
+
+def parse_accept_encoding(value):
+    """Accept-Encoding を {符号化方式: q 値} にする"""
+    qualities = {}
+    for item in value.split(','):
+        name, *params = item.strip().split(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, number = param.strip().partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(number)
+                except ValueError:
+                    quality = 0.0
+        qualities[name] = quality
+    return qualities
+
+
+def negotiate(accept_encoding, codecs):
+    """q 値が最大の符号化方式（同じならサーバ側の優先順）。使えるものがなければ None"""
+    if not accept_encoding:
+        return None
+    qualities = parse_accept_encoding(accept_encoding)
+    default = qualities.get('*', 0.0)
+    best, best_quality = None, 0.0
+    for codec in codecs:
+        quality = qualities.get(codec.name, default)
+        if quality > best_quality:
+            best, best_quality = codec, quality
+    return best
+
+
+def cache_key(codec, host, path, etag):
+    # ETag は URL ごとの識別子なので、別のリソース（別ホストの同じパスを含む）と衝突しないよう
+    # ホストとパスも含める
+    digest = hashlib.blake2b(f'{host}\n{path}\n{etag}'.encode(), digest_size=16).hexdigest()
+    return f'{CACHE_KEY_PREFIX}:{codec.name}:{digest}'
+
+
+def compress_cached(codec, content, etag, host, path):
+    """強い ETag があれば圧縮結果をキャッシュから返す（なければ圧縮して保存する）
+
+    キーは (符号化方式, host, path, ETag)。path はクエリ文字列を含むリクエストのパス。
+    """
+    timeout = settings.COMPRESSION_CACHE_TIMEOUT
+    if not etag or etag.startswith('W/') or not timeout or len(content) > settings.COMPRESSION_CACHE_MAX_BYTES:
+        return codec.compress(content)
+    key = cache_key(codec, host, path, etag)
+    compressed = cache.get(key)
+    if compressed is None:
+        compressed = codec.compress(content)
+        cache.set(key, compressed, timeout)
+    return compressed
@@ -0,0 +1,89 @@
+# notelog-api/core/db.py
+"""DB 接続の統計
+
+pool モード（psycopg 3 のコネクションプール）ではプール自身の統計を、
+それ以外ではこのプロセスで開いた接続数などを返す。
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+_lock = threading.Lock()
+_opened = {}
+
+
+@receiver(connection_created)
+def count_connection(sender, connection, **kwargs):
+    with _lock:
+        _opened[connection.alias] = _opened.get(connection.alias, 0) + 1
+
+
+def get_pool(alias='default'):
+    connection = connections[alias]
+    return getattr(connection, 'pool', None)
+
+
+def pool_stats(alias='default'):
+    """プール（またはこのプロセスの接続）の統計を dict で返す"""
+    db = settings.DATABASES[alias]
+    stats = {
+        'alias': alias,
+        'vendor': connections[alias].vendor,
+        'mode': getattr(settings, 'DB_CONNECTION_MODE', 'none'),
+        'conn_max_age': db.get('CONN_MAX_AGE', 0),
+        'health_checks': db.get('CONN_HEALTH_CHECKS', False),
+        'connections_opened': _opened.get(alias, 0),
+    }
+
+    pool = get_pool(alias)
+    if pool is None:
+        connection = connections[alias]
+        stats['connected'] = connection.connection is not None
+        if connection.close_at is not None:
+            stats['expires_in'] = round(max(connection.close_at - time.monotonic(), 0), 1)
+        return stats
+
+    raw = pool.get_stats()
+    pool_size = raw.get('pool_size', 0)
+    available = raw.get('pool_available', 0)
+    stats.update({
+        'min_size': pool.min_size,
+        'max_size': pool.max_size,
+        'timeout': pool.timeout,
+        'size': pool_size,
+        'in_use': pool_size - available,
+        'idle': available,
+        'waiting': raw.get('requests_waiting', 0),
+        'checkouts': raw.get('requests_num', 0),
+        'wait_ms': raw.get('requests_wait_ms', 0),
+        'wait_timeouts': raw.get('requests_errors', 0),
+        'connections_opened': raw.get('connections_num', stats['connections_opened']),
+        'connection_errors': raw.get('connections_errors', 0),
+    })
+    return stats
+
+
+def server_activity(alias='default'):
+    """PostgreSQL 側から見た接続状況（pg_stat_activity）。他のワーカーの接続も含む"""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT COALESCE(application_name, ''), COALESCE(state, 'unknown'), COUNT(*),
+                   COALESCE(MAX(EXTRACT(EPOCH FROM (now() - state_change))), 0)
+            FROM pg_stat_activity
+            WHERE datname = current_database() AND pid <> pg_backend_pid()
+            GROUP BY 1, 2
+            ORDER BY 1, 2
+            """
+        )
+        return [
+            {'application': app, 'state': state, 'count': count, 'max_age': round(age, 1)}
+            for app, state, count, age in cursor.fetchall()
+        ]
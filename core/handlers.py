@@ -0,0 +1,150 @@
+# notelog-api/core/handlers.py
+"""パスに応じてミドルウェアスタックを切り替えるハンドラー
+
+STATELESS_PATH_PREFIXES に一致するリクエスト（JWT だけで認証する API）は、
+MIDDLEWARE から STATEFUL_MIDDLEWARE（セッション・CSRF・認証・メッセージ・allauth）を
+除いた軽いスタックで処理する。admin/ や accounts/ などそれ以外は通常のスタックを通る。
+
+MIDDLEWARE 自体は変更しないため、admin や allauth の設定チェック、テストクライアント
+（常に通常のスタック）はそのまま動く。
+"""
+import django
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.base import BaseHandler, logger
+from django.core.handlers.exception import convert_exception_to_response
+from django.core.handlers.wsgi import WSGIHandler
+from django.utils.module_loading import import_string
+
+
+# LeanHandler.load_middleware が写している BaseHandler.load_middleware の Django のバージョン。
+# Django を更新したら本家との差分を確認して合わせ、この値を更新する（core.tests で確認）
+MIRRORED_DJANGO_VERSION = (5, 2)
+
+
+def get_lean_middleware():
+    stateful = set(settings.STATEFUL_MIDDLEWARE)
+    return [path for path in settings.MIDDLEWARE if path not in stateful]
+
+
+class LeanHandler(BaseHandler):
+    """STATEFUL_MIDDLEWARE を除いたスタックだけを持つハンドラー"""
+
+    def __init__(self, is_async=False):
+        super().__init__()
+        self.load_middleware(is_async=is_async)
+
+    def load_middleware(self, is_async=False):
+        """BaseHandler.load_middleware と同じ手順で、get_lean_middleware() のスタックを組む
+
+        本家は settings.MIDDLEWARE を直接読むので、一覧だけを差し替えて委譲することが
+        できない。settings.MIDDLEWARE を差し替えると、同時に初期化される他のハンドラーや
+        設定を読むコードに影響するため、ミドルウェアの一覧を明示して組み立てる。
+        本体は Django MIRRORED_DJANGO_VERSION の BaseHandler.load_middleware の写し。
+        """
+        self._view_middleware = []
+        self._template_response_middleware = []
+        self._exception_middleware = []
+
+        get_response = self._get_response_async if is_async else self._get_response
+        handler = convert_exception_to_response(get_response)
+        handler_is_async = is_async
+        for middleware_path in reversed(get_lean_middleware()):
+            middleware = import_string(middleware_path)
+            middleware_can_sync = getattr(middleware, 'sync_capable', True)
+            middleware_can_async = getattr(middleware, 'async_capable', False)
+            if not middleware_can_sync and not middleware_can_async:
+                raise RuntimeError(
+                    'Middleware %s must have at least one of '
+                    'sync_capable/async_capable set to True.' % middleware_path
+                )
+            elif not handler_is_async and middleware_can_sync:
+                middleware_is_async = False
+            else:
+                middleware_is_async = middleware_can_async
+            try:
+                adapted_handler = self.adapt_method_mode(
+                    middleware_is_async,
+                    handler,
+                    handler_is_async,
+                    debug=settings.DEBUG,
+                    name='middleware %s' % middleware_path,
+                )
+                mw_instance = middleware(adapted_handler)
+            except MiddlewareNotUsed as exc:
+                if settings.DEBUG:
+                    if str(exc):
+                        logger.debug('MiddlewareNotUsed(%r): %s', middleware_path, exc)
+                    else:
+                        logger.debug('MiddlewareNotUsed: %r', middleware_path)
+                continue
+            else:
+                handler = adapted_handler
+
+            if mw_instance is None:
+                raise ImproperlyConfigured(
+                    'Middleware factory %s returned None.' % middleware_path
+                )
+
+            if hasattr(mw_instance, 'process_view'):
+                self._view_middleware.insert(
+                    0, self.adapt_method_mode(is_async, mw_instance.process_view),
+                )
+            if hasattr(mw_instance, 'process_template_response'):
+                self._template_response_middleware.append(
+                    self.adapt_method_mode(is_async, mw_instance.process_template_response),
+                )
+            if hasattr(mw_instance, 'process_exception'):
+                # 例外処理のスタックは同期のみ（BaseHandler と同じ）
+                self._exception_middleware.append(
+                    self.adapt_method_mode(False, mw_instance.process_exception),
+                )
+
+            handler = convert_exception_to_response(mw_instance)
+            handler_is_async = middleware_is_async
+
+        handler = self.adapt_method_mode(is_async, handler, handler_is_async)
+        # 初期化完了の印として最後に代入する
+        self._middleware_chain = handler
+
+
+class PathAwareHandlerMixin:
+    def load_middleware(self, is_async=False):
+        super().load_middleware(is_async=is_async)
+        self.stateless_prefixes = tuple(settings.STATELESS_PATH_PREFIXES)
+        self.lean_handler = LeanHandler(is_async=is_async) if self.stateless_prefixes else None
+
+    def is_stateless(self, request):
+        return self.lean_handler is not None and request.path_info.startswith(
+            self.stateless_prefixes
+        )
+
+    def get_response(self, request):
+        if self.is_stateless(request):
+            return self.lean_handler.get_response(request)
+        return super().get_response(request)
+
+    async def get_response_async(self, request):
+        if self.is_stateless(request):
+            return await self.lean_handler.get_response_async(request)
+        return await super().get_response_async(request)
+
+
+class PathAwareWSGIHandler(PathAwareHandlerMixin, WSGIHandler):
+    pass
+
+
+class PathAwareASGIHandler(PathAwareHandlerMixin, ASGIHandler):
+    pass
+
+
+def get_wsgi_application():
+    """django.core.wsgi.get_wsgi_application と同じ初期化で PathAwareWSGIHandler を返す"""
+    django.setup(set_prefix=False)
+    return PathAwareWSGIHandler()
+
+
+def get_asgi_application():
+    django.setup(set_prefix=False)
+    return PathAwareASGIHandler()
@@ -0,0 +1,137 @@
+# notelog-api/core/log.py
+"""ログ出力
+
+リクエストスレッドではログレコードをキューに積むだけにし、書き込み（フォーマット・
+stdout / ファイルへの出力）はバックグラウンドスレッドの QueueListener が行う。
+キューが溢れた場合は待たずに捨て、捨てた件数を数える。
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+
+# 現在のリクエストの ID（core.middleware.RequestIDMiddleware が設定する）
+request_id_var = contextvars.ContextVar('request_id', default=None)
+
+# JSON に含めない LogRecord の標準属性
+RESERVED_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {
+    'message', 'asctime', 'request_id',
+}
+
+
+class RequestIDFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """指定したロガー（前方一致）の max_level 以下のレコードを rate の割合だけ通す"""
+
+    def __init__(self, rates=None, max_level='DEBUG'):
+        super().__init__()
+        self.rates = sorted((rates or {}).items(), key=lambda item: len(item[0]), reverse=True)
+        self.max_level = logging.getLevelName(max_level) if isinstance(max_level, str) else max_level
+
+    def get_rate(self, name):
+        for prefix, rate in self.rates:
+            if name == prefix or name.startswith(prefix + '.'):
+                return rate
+        return 1.0
+
+    def filter(self, record):
+        if record.levelno > self.max_level:
+            return True
+        rate = self.get_rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class JSONFormatter(logging.Formatter):
+    """1 レコード 1 行の JSON。extra で渡した項目もそのまま含める"""
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in RESERVED_ATTRS and not key.startswith('_'):
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exc_info'] = record.exc_text
+        if record.stack_info:
+            data['stack_info'] = self.formatStack(record.stack_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class QueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # キューが満杯でも終了できるよう、空くまで待つ
+        self.queue.put(self._sentinel)
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """上限付きキューに積み、targets のハンドラーへ別スレッドで書き込む
+
+    Python 3.11 の dictConfig は QueueHandler の出力先を設定できないため、出力先は
+    'cfg://handlers.<名前>' で受け取る。dictConfig は作成済みのハンドラーを設定の辞書に
+    書き戻し、ハンドラーを名前順に作るので、targets はこのハンドラーより前の名前にすること。
+    """
+
+    def __init__(self, targets, maxsize=10000):
+        super().__init__(queue.Queue(maxsize=maxsize))
+        # dictConfig の ConvertingList は添字で読んだときだけ cfg:// を解決する
+        self.targets = [targets[i] for i in range(len(targets))]
+        for handler in self.targets:
+            if not isinstance(handler, logging.Handler):
+                raise ValueError(f'Unknown logging handler: {handler!r}')
+        self.listener = None
+        self.dropped = 0
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self.listener is not None:
+                return
+            self.listener = QueueListener(self.queue, *self.targets, respect_handler_level=True)
+            self.listener.start()
+            atexit.register(self.stop)
+
+    def stop(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def prepare(self, record):
+        # メッセージの組み立て（% の展開）と例外の文字列化だけをここで行い、
+        # JSON へのフォーマットはリスナースレッドの出力先ハンドラーに任せる
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record):
+        if self.listener is None:
+            self.start()
+        super().emit(record)
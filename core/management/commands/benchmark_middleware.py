@@ -0,0 +1,65 @@
+import time
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from core.handlers import PathAwareWSGIHandler
+
+
+class Command(BaseCommand):
+    help = '通常のミドルウェアスタックとパス別の軽いスタックで、1 リクエストあたりの処理時間を比較します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/notes/', help='リクエストするパス')
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--token', default='', help='Authorization: Bearer に付けるアクセストークン')
+        parser.add_argument(
+            '--session-cookie', default='',
+            help='送信するセッション ID（admin にログイン済みのブラウザからの API 呼び出しを再現）',
+        )
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        headers = {}
+        if options['token']:
+            headers['HTTP_AUTHORIZATION'] = f"Bearer {options['token']}"
+        host = next((h for h in settings.ALLOWED_HOSTS if h != '*' and not h.startswith('.')), 'localhost')
+
+        def make_environ():
+            if options['session_cookie']:
+                factory.cookies[settings.SESSION_COOKIE_NAME] = options['session_cookie']
+            request = factory.get(options['path'], secure=True, HTTP_HOST=host, **headers)
+            return request.environ
+
+        results = {}
+        for label, handler_class in (('full', WSGIHandler), ('lean', PathAwareWSGIHandler)):
+            handler = handler_class()
+            status = self.call(handler, make_environ())  # ウォームアップ
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                for _ in range(options['requests']):
+                    self.call(handler, make_environ())
+                elapsed = time.perf_counter() - started
+            per_request = elapsed * 1_000_000 / options['requests']
+            results[label] = per_request
+            self.stdout.write(
+                f'{label}: {per_request:.1f} µs/request, '
+                f"{len(queries) / options['requests']:.2f} queries/request (status {status})"
+            )
+
+        saved = results['full'] - results['lean']
+        self.stdout.write(self.style.SUCCESS(
+            f"{options['path']}: {saved:.1f} µs/request 短縮 ({saved / results['full']:.0%})"
+        ))
+
+    def call(self, handler, environ):
+        statuses = []
+        response = handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+        for _ in response:
+            pass
+        response.close()
+        return statuses[0]
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from core.db import pool_stats, server_activity
+
+
+class Command(BaseCommand):
+    help = 'DB 接続の設定と、PostgreSQL 側から見た接続状況（pg_stat_activity）を表示します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        # このコマンド自身のプロセスの統計なので、主に設定の確認用
+        for name, value in pool_stats(alias).items():
+            self.stdout.write(f'{name}: {value}')
+
+        activity = server_activity(alias)
+        if activity is None:
+            return
+        self.stdout.write('')
+        self.stdout.write('pg_stat_activity（この DB への他の接続）:')
+        total = 0
+        for row in activity:
+            total += row['count']
+            self.stdout.write(
+                f"  {row['application'] or '-'} {row['state']}: {row['count']}"
+                f" (最長 {row['max_age']} 秒)"
+            )
+        self.stdout.write(f'  合計: {total}')
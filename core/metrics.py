@@ -0,0 +1,205 @@
+# notelog-api/core/metrics.py
+"""リクエスト単位の計測と Prometheus 形式での出力
+
+ルート（URL 名）ごとに、レイテンシのヒストグラム・SQL の件数と時間・キャッシュの
+ヒット / ミス・外部 HTTP 呼び出しの件数と時間を集計する。リクエスト中の値は
+contextvar 上の RequestMetrics に積み、リクエスト終了時に 1 回だけロックを取って
+集計に加える。
+
+集計はプロセスごとなので、複数ワーカー構成ではワーカーごとにスクレイプするか、
+ラベルの instance で区別すること。
+"""
+import bisect
+import contextvars
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = (
+        'started', 'sql_count', 'sql_time', 'cache_hits', 'cache_misses',
+        'http_count', 'http_time',
+    )
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.http_count = 0
+        self.http_time = 0.0
+
+    def server_timing(self, elapsed):
+        """Server-Timing ヘッダーの値"""
+        return ', '.join([
+            f'app;dur={elapsed * 1000:.1f}',
+            f'db;dur={self.sql_time * 1000:.1f};desc="{self.sql_count} queries"',
+            f'cache;desc="hit={self.cache_hits} miss={self.cache_misses}"',
+            f'http;dur={self.http_time * 1000:.1f};desc="{self.http_count} calls"',
+        ])
+
+
+def record_cache(hit):
+    metrics = current.get()
+    if metrics is not None:
+        if hit:
+            metrics.cache_hits += 1
+        else:
+            metrics.cache_misses += 1
+
+
+def record_http(elapsed):
+    metrics = current.get()
+    if metrics is not None:
+        metrics.http_count += 1
+        metrics.http_time += elapsed
+
+
+def sql_timer(execute, sql, params, many, context):
+    """DB の execute_wrapper。リクエスト外（管理コマンドなど）では何もしない"""
+    metrics = current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.sql_count += 1
+        metrics.sql_time += time.perf_counter() - started
+
+
+@receiver(connection_created)
+def install_sql_timer(sender, connection, **kwargs):
+    if sql_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_timer)
+
+
+class RouteStats:
+    __slots__ = ('buckets', 'sum', 'count', 'statuses', 'sql_count', 'sql_time',
+                 'cache_hits', 'cache_misses', 'http_count', 'http_time')
+
+    def __init__(self, bucket_count):
+        self.buckets = [0] * (bucket_count + 1)  # 最後は +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.statuses = defaultdict(int)
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.http_count = 0
+        self.http_time = 0.0
+
+
+class Registry:
+    def __init__(self, buckets):
+        self.bounds = sorted(buckets)
+        self.routes = {}
+        self._lock = threading.Lock()
+
+    def observe(self, route, method, status, elapsed, metrics):
+        key = (route, method)
+        index = bisect.bisect_left(self.bounds, elapsed)
+        with self._lock:
+            stats = self.routes.get(key)
+            if stats is None:
+                stats = self.routes[key] = RouteStats(len(self.bounds))
+            stats.buckets[index] += 1
+            stats.sum += elapsed
+            stats.count += 1
+            stats.statuses[status] += 1
+            stats.sql_count += metrics.sql_count
+            stats.sql_time += metrics.sql_time
+            stats.cache_hits += metrics.cache_hits
+            stats.cache_misses += metrics.cache_misses
+            stats.http_count += metrics.http_count
+            stats.http_time += metrics.http_time
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                key: (list(stats.buckets), stats.sum, stats.count, dict(stats.statuses),
+                      stats.sql_count, stats.sql_time, stats.cache_hits, stats.cache_misses,
+                      stats.http_count, stats.http_time)
+                for key, stats in self.routes.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self.routes = {}
+
+
+_registry = None
+
+
+def get_registry():
+    global _registry
+    if _registry is None:
+        _registry = Registry(settings.METRICS_LATENCY_BUCKETS)
+    return _registry
+
+
+def _labels(**labels):
+    escaped = (
+        '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in labels.items()
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _float(value):
+    return repr(float(value)) if value != float('inf') else '+Inf'
+
+
+def render_prometheus(extra_gauges=None):
+    """Prometheus テキスト形式（version 0.0.4）"""
+    registry = get_registry()
+    snapshot = sorted(registry.snapshot().items())
+    lines = []
+
+    def header(name, kind, help_text):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+
+    name = 'notelog_http_request_duration_seconds'
+    header(name, 'histogram', 'Request latency by route.')
+    for (route, method), (buckets, total, count, *_rest) in snapshot:
+        cumulative = 0
+        for bound, bucket in zip(registry.bounds + [float('inf')], buckets):
+            cumulative += bucket
+            lines.append(f'{name}_bucket{_labels(route=route, method=method, le=_float(bound))} {cumulative}')
+        lines.append(f'{name}_sum{_labels(route=route, method=method)} {_float(total)}')
+        lines.append(f'{name}_count{_labels(route=route, method=method)} {count}')
+
+    name = 'notelog_http_requests_total'
+    header(name, 'counter', 'Requests by route and status code.')
+    for (route, method), (_b, _s, _c, statuses, *_rest) in snapshot:
+        for status, count in sorted(statuses.items()):
+            lines.append(f'{name}{_labels(route=route, method=method, status=status)} {count}')
+
+    counters = [
+        ('notelog_db_queries_total', 'SQL queries executed.', 4),
+        ('notelog_db_query_seconds_total', 'Time spent in SQL queries.', 5),
+        ('notelog_cache_hits_total', 'Response/user cache hits.', 6),
+        ('notelog_cache_misses_total', 'Response/user cache misses.', 7),
+        ('notelog_external_http_requests_total', 'Outgoing HTTP requests.', 8),
+        ('notelog_external_http_seconds_total', 'Time spent in outgoing HTTP requests.', 9),
+    ]
+    for name, help_text, index in counters:
+        header(name, 'counter', help_text)
+        for (route, method), values in snapshot:
+            lines.append(f'{name}{_labels(route=route, method=method)} {_float(values[index])}')
+
+    for name, help_text, value in extra_gauges or ():
+        header(name, 'gauge', help_text)
+        lines.append(f'{name} {_float(value)}')
+
+    return '\n'.join(lines) + '\n'
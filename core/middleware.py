@@ -0,0 +1,174 @@
+# notelog-api/core/middleware.py
+import re
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from . import compression, metrics
+from .log import request_id_var
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+# 受け取るリクエスト ID の形式（ログへの注入を防ぐ）
+REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+class RequestIDMiddleware:
+    """X-Request-ID（なければ生成）をログとレスポンスヘッダーに付ける"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        self.begin(request)
+        response = self.get_response(request)
+        response[REQUEST_ID_HEADER] = request.request_id
+        return response
+
+    async def __acall__(self, request):
+        self.begin(request)
+        response = await self.get_response(request)
+        response[REQUEST_ID_HEADER] = request.request_id
+        return response
+
+    def begin(self, request):
+        request_id = request.headers.get(REQUEST_ID_HEADER, '')
+        if not REQUEST_ID_RE.match(request_id):
+            request_id = uuid.uuid4().hex
+        request.request_id = request_id
+        # django.request のログ（ミドルウェアを抜けた後に出力される）にも付けるため、
+        # 終了時に元へ戻さない。次のリクエストで上書きされる
+        request_id_var.set(request_id)
+
+
+class MetricsMiddleware:
+    """ルートごとのレイテンシ・SQL・キャッシュ・外部 HTTP を集計する（core.metrics）"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = settings.METRICS_SERVER_TIMING
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        request_metrics = metrics.RequestMetrics()
+        token = metrics.current.set(request_metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        return self.finish(request, response, request_metrics)
+
+    async def __acall__(self, request):
+        request_metrics = metrics.RequestMetrics()
+        token = metrics.current.set(request_metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        return self.finish(request, response, request_metrics)
+
+    def finish(self, request, response, request_metrics):
+        elapsed = time.perf_counter() - request_metrics.started
+        match = request.resolver_match
+        route = (match.view_name or match.route) if match else 'unmatched'
+        metrics.get_registry().observe(
+            route, request.method, response.status_code, elapsed, request_metrics
+        )
+        if self.server_timing:
+            response['Server-Timing'] = request_metrics.server_timing(elapsed)
+        return response
+
+
+class CompressionMiddleware:
+    """Accept-Encoding に応じてレスポンスを圧縮する（core.compression）
+
+    COMPRESSION_PATH_PREFIXES のパスだけを対象にする。秘密情報（CSRF トークンや
+    JWT）とリクエスト由来の文字列を同じ本文に含むレスポンスを圧縮すると、
+    圧縮後のサイズから秘密情報を推測される（BREACH）ため、認証や admin は含めない。
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    # 圧縮済み、または圧縮しても小さくならない Content-Type
+    SKIP_CONTENT_TYPES = ('application/gzip', 'application/zip', 'image/', 'audio/', 'video/')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.codecs = compression.get_codecs()
+        self.prefixes = tuple(settings.COMPRESSION_PATH_PREFIXES)
+        self.min_bytes = settings.COMPRESSION_MIN_BYTES
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        if not self.codecs or not request.path_info.startswith(self.prefixes):
+            return response
+        if response.has_header('Content-Encoding'):
+            return response
+        if response.get('Content-Type', '').startswith(self.SKIP_CONTENT_TYPES):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        codec = compression.negotiate(request.headers.get('Accept-Encoding', ''), self.codecs)
+        if codec is None:
+            return response
+
+        # 圧縮すると本文のバイト列が変わるので、強い ETag は弱い ETag にする（RFC 9110 8.8.1）。
+        # 304 には本文がなく 200 が圧縮されたかを判定できないため、実際に圧縮するかに
+        # かかわらず符号化方式を選べた応答はすべて弱くし、200 と 304 で同じ形にする
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        if response.status_code == 304:
+            return response
+        if not response.streaming and len(response.content) < self.min_bytes:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = codec.astream(response.streaming_content)
+            else:
+                response.streaming_content = codec.stream(response.streaming_content)
+            # 圧縮後のサイズは送り終えるまで分からない
+            del response.headers['Content-Length']
+        else:
+            if response.status_code == 200:
+                compressed = compression.compress_cached(
+                    codec, response.content, etag, request.get_host(), request.get_full_path()
+                )
+            else:
+                compressed = codec.compress(response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        response.headers['Content-Encoding'] = codec.name
+        return response
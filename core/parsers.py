@@ -0,0 +1,28 @@
+# notelog-api/core/parsers.py
+"""orjson による JSON パーサー
+
+本文を str にデコードせず、UTF-8 の bytes のまま orjson に渡す。orjson は NaN / Infinity を
+受け付けないため STRICT_JSON と同じ結果になる。orjson が未インストールの場合や、
+UTF-8 以外の文字コード・STRICT_JSON=False のときは標準の JSONParser の処理に切り替える。
+"""
+import codecs
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+from .renderers import FastJSONRenderer, orjson
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or not self.strict or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+from rest_framework.permissions import BasePermission
+
+INTERNAL_TOKEN_HEADER = 'HTTP_X_INTERNAL_TOKEN'
+
+
+def has_internal_token(request):
+    """X-Internal-Token ヘッダーが INTERNAL_API_TOKEN と一致するか（未設定なら常に False）"""
+    token = settings.INTERNAL_API_TOKEN
+    supplied = request.META.get(INTERNAL_TOKEN_HEADER, '')
+    return bool(token and supplied) and constant_time_compare(supplied, token)
+
+
+class IsInternalClient(BasePermission):
+    """監視・運用向けエンドポイント用: 共有トークンを送ったクライアントかスタッフユーザーだけを許可する
+
+    送信元 IP では判定しない。同じホストのリバースプロキシを経由すると、すべての
+    リクエストの REMOTE_ADDR がプロキシ（127.0.0.1）になるため。
+    """
+
+    def has_permission(self, request, view):
+        if has_internal_token(request):
+            return True
+        user = getattr(request, 'user', None)
+        return bool(user and user.is_active and user.is_staff)
+
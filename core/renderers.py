@@ -0,0 +1,44 @@
+# notelog-api/core/renderers.py
+"""orjson による JSON レンダラー
+
+rest_framework.renderers.JSONRenderer と同じ出力（UTF-8 のまま・区切り文字の空白なし・
+UTC は Z 表記・U+2028/U+2029 はエスケープ）を、文字列を経由せずに bytes で直接作る。
+datetime / date / UUID は orjson がそのまま変換し、Decimal や遅延翻訳文字列など
+orjson が扱えない値は DRF の JSONEncoder に任せる。
+
+orjson が未インストールの場合や、orjson で表現できない指定（indent=2 以外の整形、
+UNICODE_JSON=False、COMPACT_JSON=False、64 ビットを超える整数）のときは
+標準の JSONRenderer の処理に切り替える。STRICT_JSON でも NaN / Infinity は
+エラーにならず null になる点だけが異なる。
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+LINE_SEPARATORS = (('\u2028'.encode(), b'\\u2028'), ('\u2029'.encode(), b'\\u2029'))
+
+
+class FastJSONRenderer(JSONRenderer):
+    options = 0 if orjson is None else orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if orjson is None or self.ensure_ascii or not self.compact or indent not in (None, 2):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        options = self.options | orjson.OPT_INDENT_2 if indent else self.options
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # JavaScript のサブセットにするため、JSONRenderer と同じく行区切り文字をエスケープする
+        for raw, escaped in LINE_SEPARATORS:
+            if raw in ret:
+                ret = ret.replace(raw, escaped)
+        return ret
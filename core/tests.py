@@ -0,0 +1,172 @@
+import gzip
+import inspect
+import io
+import logging.config
+
+import django
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.handlers.base import BaseHandler
+from django.http import HttpResponse, HttpResponseNotModified
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from users.tokens import RevocableRefreshToken
+
+from .handlers import MIRRORED_DJANGO_VERSION, LeanHandler
+from .log import QueueHandler
+from .middleware import CompressionMiddleware
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def fetch(self, path, host='testserver'):
+        def get_response(request):
+            # 別のリソースが同じ強い ETag を返す場合
+            body = f'{request.get_host()}{request.get_full_path()}'.encode() * 200
+            response = HttpResponse(body, content_type='application/json')
+            response['ETag'] = '"same-etag"'
+            return response
+
+        request = self.factory.get(path, HTTP_ACCEPT_ENCODING='gzip', HTTP_HOST=host)
+        response = CompressionMiddleware(get_response)(request)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['ETag'], 'W/"same-etag"')
+        return gzip.decompress(response.content)
+
+    def test_same_etag_on_different_paths_is_not_shared(self):
+        first = self.fetch('/api/notes/1/')
+        second = self.fetch('/api/notes/2/')
+        paged = self.fetch('/api/notes/?page=2')
+
+        self.assertEqual(first, b'testserver/api/notes/1/' * 200)
+        self.assertEqual(second, b'testserver/api/notes/2/' * 200)
+        self.assertEqual(paged, b'testserver/api/notes/?page=2' * 200)
+        # 同じパスならキャッシュした圧縮結果を使う
+        self.assertEqual(self.fetch('/api/notes/1/'), first)
+
+    @override_settings(ALLOWED_HOSTS=['a.example', 'b.example'])
+    def test_same_etag_on_different_hosts_is_not_shared(self):
+        self.assertEqual(self.fetch('/api/notes/1/', 'a.example'), b'a.example/api/notes/1/' * 200)
+        self.assertEqual(self.fetch('/api/notes/1/', 'b.example'), b'b.example/api/notes/1/' * 200)
+
+    def test_not_modified_uses_same_etag_form(self):
+        def get_response(request):
+            response = HttpResponseNotModified()
+            response['ETag'] = '"same-etag"'
+            return response
+
+        request = self.factory.get('/api/notes/1/', HTTP_ACCEPT_ENCODING='gzip')
+        response = CompressionMiddleware(get_response)(request)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], 'W/"same-etag"')
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+        request = self.factory.get('/api/notes/1/', HTTP_ACCEPT_ENCODING='identity')
+        self.assertEqual(CompressionMiddleware(get_response)(request)['ETag'], '"same-etag"')
+
+
+def middleware_chain(handler):
+    """ハンドラーのミドルウェアチェーンを外側から順にたどったクラス名の一覧"""
+    names = []
+    current = handler._middleware_chain
+    while True:
+        # convert_exception_to_response / 同期・非同期の変換は functools.wraps で包む
+        current = inspect.unwrap(current)
+        if getattr(current, '__self__', None) is handler:
+            break
+        if not hasattr(current, 'get_response'):
+            # 関数のミドルウェアは内側をたどれない
+            names.append(current.__qualname__)
+            break
+        names.append(type(current).__qualname__)
+        current = current.get_response
+    hooks = [
+        [inspect.unwrap(method).__qualname__ for method in methods]
+        for methods in (
+            handler._view_middleware,
+            handler._template_response_middleware,
+            handler._exception_middleware,
+        )
+    ]
+    return names, hooks
+
+
+class LeanHandlerTests(SimpleTestCase):
+    def test_mirrors_pinned_django_version(self):
+        self.assertEqual(django.VERSION[:2], MIRRORED_DJANGO_VERSION)
+
+    @override_settings(STATEFUL_MIDDLEWARE=[])
+    def test_chain_matches_stock_handler(self):
+        for is_async in (False, True):
+            with self.subTest(is_async=is_async):
+                stock = BaseHandler()
+                stock.load_middleware(is_async=is_async)
+                lean = LeanHandler(is_async=is_async)
+                self.assertEqual(middleware_chain(lean), middleware_chain(stock))
+                self.assertEqual(len(middleware_chain(lean)[0]), len(settings.MIDDLEWARE))
+
+    def test_builds_chain_without_touching_settings(self):
+        before = list(settings.MIDDLEWARE)
+        with override_settings(MIDDLEWARE=before):
+            handler = LeanHandler()
+            self.assertIs(settings.MIDDLEWARE, before)
+        self.assertEqual(settings.MIDDLEWARE, before)
+        self.assertIsNotNone(handler._middleware_chain)
+
+        response = handler.get_response(RequestFactory().get('/api/notes/'))
+        # 認証・セッションのミドルウェアを通らないので request.user は付かない
+        self.assertEqual(response.status_code, 401)
+        self.assertNotIn('Set-Cookie', response)
+
+
+class QueueHandlerTests(SimpleTestCase):
+    def test_targets_are_resolved_through_dictconfig(self):
+        target = logging.StreamHandler(io.StringIO())
+        configurator = logging.config.DictConfigurator({'handlers': {'console': target}})
+        handler = QueueHandler(configurator.convert(['cfg://handlers.console']))
+        self.assertEqual(handler.targets, [target])
+
+        with self.assertRaises(ValueError):
+            QueueHandler(['console'])
+
+
+@override_settings(INTERNAL_API_TOKEN='internal-secret')
+class InternalEndpointTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.staff = User.objects.create_user(email='staff@example.com', name='staff', password='x', is_staff=True)
+        cls.user = User.objects.create_user(email='user@example.com', name='user', password='x')
+
+    def bearer(self, user):
+        return {'HTTP_AUTHORIZATION': f'Bearer {RevocableRefreshToken.for_user(user).access_token}'}
+
+    def test_db_pool_rejects_loopback_without_credentials(self):
+        # リバースプロキシ経由のリクエストは REMOTE_ADDR が 127.0.0.1 になる
+        response = self.client.get('/internal/db-pool/', REMOTE_ADDR='127.0.0.1')
+        self.assertIn(response.status_code, (401, 403))
+
+    def test_db_pool_token(self):
+        self.assertEqual(self.client.get('/internal/db-pool/', HTTP_X_INTERNAL_TOKEN='internal-secret').status_code, 200)
+        self.assertEqual(self.client.get('/internal/db-pool/', HTTP_X_INTERNAL_TOKEN='wrong').status_code, 401)
+
+    def test_db_pool_staff_only(self):
+        self.assertEqual(self.client.get('/internal/db-pool/', **self.bearer(self.staff)).status_code, 200)
+        self.assertEqual(self.client.get('/internal/db-pool/', **self.bearer(self.user)).status_code, 403)
+
+    @override_settings(INTERNAL_API_TOKEN='')
+    def test_empty_token_is_not_accepted(self):
+        response = self.client.get('/internal/db-pool/', HTTP_X_INTERNAL_TOKEN='')
+        self.assertIn(response.status_code, (401, 403))
+
+    def test_metrics_token_or_staff(self):
+        self.assertEqual(self.client.get('/internal/metrics/', REMOTE_ADDR='127.0.0.1').status_code, 403)
+        self.assertEqual(self.client.get('/internal/metrics/', HTTP_X_INTERNAL_TOKEN='internal-secret').status_code, 200)
+        self.assertEqual(self.client.get('/internal/metrics/', **self.bearer(self.staff)).status_code, 200)
+        self.assertEqual(self.client.get('/internal/metrics/', **self.bearer(self.user)).status_code, 403)
+        self.assertEqual(self.client.get('/internal/metrics/', HTTP_AUTHORIZATION='Bearer broken').status_code, 403)
@@ -0,0 +1,9 @@
+# notelog-api/core/urls.py
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('db-pool/', views.db_pool, name='internal-db-pool'),
+    path('metrics/', views.prometheus_metrics, name='internal-metrics'),
+]
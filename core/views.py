@@ -0,0 +1,49 @@
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .db import pool_stats
+from .metrics import render_prometheus
+from .permissions import IsInternalClient, has_internal_token
+
+# プールの統計のうち Prometheus のゲージとして出力する項目
+POOL_GAUGES = ('in_use', 'idle', 'waiting', 'size')
+
+
+@api_view(['GET'])
+@permission_classes([IsInternalClient])
+def db_pool(request):
+    """このワーカープロセスの DB 接続（プール）の統計"""
+    return Response(pool_stats())
+
+
+def prometheus_metrics(request):
+    """Prometheus のスクレイプ用（テキスト形式）。DRF を通さず軽く返す
+
+    db_pool と同じく IsInternalClient で判定する。スクレイパーは X-Internal-Token を
+    送るので、トークンが一致すれば JWT の認証は行わない。
+    """
+    if not has_internal_token(request) and not _is_internal_client(request):
+        return HttpResponseForbidden()
+    stats = pool_stats()
+    gauges = [
+        (f'notelog_db_pool_{name}', f'DB connection pool: {name}.', stats[name])
+        for name in POOL_GAUGES if name in stats
+    ]
+    return HttpResponse(
+        render_prometheus(gauges), content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+
+def _is_internal_client(request):
+    # DRF の既定の認証（JWT）で request.user を決めてから判定する
+    drf_request = Request(
+        request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    )
+    try:
+        return IsInternalClient().has_permission(drf_request, None)
+    except AuthenticationFailed:
+        return False
@@ -0,0 +1,103 @@
+# notelog-api/notes/bulk.py
+"""ノートの一括作成・更新・削除
+
+1 リクエスト内の操作を 1 トランザクションで実行し、INSERT / UPDATE / DELETE を
+それぞれ bulk_create / bulk_update / 1 回の DELETE にまとめる。
+いずれかの操作が失敗した場合は全体をロールバックする。
+"""
+from django.db import transaction
+
+from . import cache
+from .models import Note, save_bodies, save_search_documents
+from .revisions import record_revisions
+from .search import index_notes
+from .sync import assign_change_seqs
+from .serializers import NoteBulkOperationSerializer as Op
+
+BULK_BATCH_SIZE = 500
+
+# bulk_update で更新するカラム（派生フィールドを含む）
+UPDATE_FIELDS = ['title', *sorted(
+    Note.DERIVED_FIELDS['title'] | Note.DERIVED_FIELDS['content']
+)]
+
+
+class BulkOperationError(Exception):
+    """一括操作の一部が適用できない場合（results に操作ごとの結果を持つ）"""
+
+    def __init__(self, results):
+        super().__init__('bulk operation failed')
+        self.results = results
+
+
+def apply_bulk_operations(queryset, operations):
+    """検証済みの操作リストを適用し、操作ごとの結果を返す
+
+    queryset は更新・削除の対象にできるノートの範囲。
+    """
+    results = [{'index': i, 'op': item['op']} for i, item in enumerate(operations)]
+    target_ids = [item['id'] for item in operations if item['op'] != Op.OP_CREATE]
+
+    with transaction.atomic():
+        existing = (
+            queryset.select_for_update(of=('self',)).with_content().in_bulk(target_ids)
+            if target_ids else {}
+        )
+
+        missing = [i for i, item in enumerate(operations)
+                   if item['op'] != Op.OP_CREATE and item['id'] not in existing]
+        if missing:
+            for result in results:
+                result['status'] = 'not_applied'
+            for i in missing:
+                results[i]['status'] = 'error'
+                results[i]['errors'] = {'id': 'ノートが見つかりません。'}
+            raise BulkOperationError(results)
+
+        created, updated, deleted_ids = [], [], []
+        # 更新前の本文（版の差分の基準）
+        previous = {}
+        for i, item in enumerate(operations):
+            if item['op'] == Op.OP_CREATE:
+                note = Note(title=item['title'], content=item['content'])
+                note.refresh_derived_fields()
+                created.append((i, note))
+            elif item['op'] == Op.OP_UPDATE:
+                note = existing[item['id']]
+                previous[note.pk] = note.content
+                for name in ('title', 'content'):
+                    if name in item:
+                        setattr(note, name, item[name])
+                note.refresh_derived_fields()
+                note.mark_changed()
+                updated.append((i, note))
+            else:
+                deleted_ids.append(item['id'])
+
+        assign_change_seqs([note for _, note in created + updated])
+        if deleted_ids:
+            Note.objects.filter(pk__in=deleted_ids).delete()
+        if created:
+            Note.objects.bulk_create([note for _, note in created], batch_size=BULK_BATCH_SIZE)
+        if updated:
+            Note.objects.bulk_update(
+                [note for _, note in updated], UPDATE_FIELDS, batch_size=BULK_BATCH_SIZE
+            )
+        # 本文は NoteBody に別途書き込む（更新は本文を変えたものだけ）
+        save_bodies([note for _, note in created] + [
+            note for i, note in updated if 'content' in operations[i]
+        ])
+        save_search_documents([note for i, note in updated if 'content' not in operations[i]])
+        record_revisions([note for _, note in created + updated], previous=previous)
+        # bulk 系は save() / シグナルを通らないので検索インデックスを明示的に更新
+        index_notes([note for _, note in created + updated])
+        cache.invalidate()
+
+    for i, note in created:
+        results[i].update(status='created', id=note.pk)
+    for i, note in updated:
+        results[i].update(status='updated', id=note.pk)
+    for i, item in enumerate(operations):
+        if item['op'] == Op.OP_DELETE:
+            results[i].update(status='deleted', id=item['id'])
+    return results
@@ -0,0 +1,163 @@
+# notelog-api/notes/cache.py
+"""ノート一覧・詳細レスポンスのユーザー別キャッシュ
+
+キーには「世代番号」を含め、ノートの保存・削除時に世代を進めることで古いキーを
+まとめて無効化する（古いエントリは TIMEOUT で自然に消える）。キーが切れたときは
+ロックを取った 1 リクエストだけが再計算し、他はその結果を待つ。
+
+LocMemCache はプロセスごとに独立しているため、複数ワーカー構成では REDIS_URL を
+設定して共有キャッシュを使うこと。
+"""
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+from core.metrics import record_cache
+
+from .conditional import not_modified_response
+
+KEY_PREFIX = 'notes:resp'
+GENERATION_KEY = 'notes:resp:generation'
+# 保存するレスポンスヘッダー
+CACHED_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control')
+# 再計算中のリクエストを待つ間隔と最大待ち時間（秒）
+LOCK_POLL_INTERVAL = 0.05
+LOCK_WAIT = 2.0
+
+
+class CacheStats:
+    """プロセス内のヒット・ミス数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.refills = 0
+            self.lock_waits = 0
+
+    def incr(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'refills': self.refills,
+                'lock_waits': self.lock_waits,
+                'hit_ratio': round(self.hits / total, 4) if total else None,
+            }
+
+
+stats = CacheStats()
+
+
+def get_timeout():
+    return getattr(settings, 'NOTES_CACHE_TIMEOUT', 300)
+
+
+def get_generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # 他プロセスが先に作っていればそちらを使う
+        cache.add(GENERATION_KEY, 1, timeout=None)
+        generation = cache.get(GENERATION_KEY, 1)
+    return generation
+
+
+def bump_generation():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, 1, timeout=None)
+
+
+def invalidate():
+    """ノートのキャッシュを無効化する（コミット後に世代を進める）"""
+    transaction.on_commit(bump_generation)
+
+
+def make_key(request, action):
+    """ユーザー・アクション・クエリ（ページ・カーソル・?fields= など）ごとのキー"""
+    shape = hashlib.blake2b(request.get_full_path().encode('utf-8'), digest_size=16).hexdigest()
+    return f'{KEY_PREFIX}:g{get_generation()}:u{request.user.pk}:{action}:{shape}'
+
+
+def cached_response(request, action, compute, use_last_modified=False):
+    """キャッシュ済みならそれを返し、なければ compute() の結果を保存して返す
+
+    use_last_modified が偽なら、ヒット時も If-Modified-Since では 304 を返さない
+    （一覧では削除が Last-Modified に現れないため）。
+    """
+    key = make_key(request, action)
+    entry = cache.get(key)
+    record_cache(hit=entry is not None)
+    if entry is None:
+        entry, response = _refill(key, compute)
+        if response is not None:
+            return response
+    else:
+        stats.incr('hits')
+    return _build_response(request, entry, use_last_modified)
+
+
+def _refill(key, compute):
+    stats.incr('misses')
+    lock_key = f'{key}:lock'
+    if not cache.add(lock_key, 1, timeout=int(LOCK_WAIT * 5)):
+        # 他のリクエストが再計算中なら、その結果を待つ
+        stats.incr('lock_waits')
+        deadline = time.monotonic() + LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry, None
+        return None, compute()
+
+    try:
+        stats.incr('refills')
+        response = compute()
+        if response.status_code != 200:
+            return None, response
+        entry = {
+            'data': response.data,
+            'headers': {
+                name: response[name] for name in CACHED_HEADERS if response.has_header(name)
+            },
+            # ヒット時の If-Modified-Since の判定に使う
+            'last_modified': _parse_last_modified(response.get('Last-Modified')),
+        }
+        cache.set(key, entry, timeout=get_timeout())
+        return None, response
+    finally:
+        cache.delete(lock_key)
+
+
+def _parse_last_modified(value):
+    timestamp = parse_http_date_safe(value) if value else None
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc) if timestamp is not None else None
+
+
+def _build_response(request, entry, use_last_modified):
+    headers = entry['headers']
+    etag = headers.get('ETag')
+    if etag:
+        last_modified = entry.get('last_modified') if use_last_modified else None
+        response = not_modified_response(request, etag, last_modified)
+        if response is not None:
+            return response
+    return Response(entry['data'], headers=headers)
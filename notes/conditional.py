@@ -0,0 +1,48 @@
+# notelog-api/notes/conditional.py
+"""ETag / Last-Modified による条件付き GET
+
+ノートの (id, version, updated_at) だけから検証子を作るので、本文を読み込んだり
+シリアライズしたりせずに 304 を返せる。
+"""
+import hashlib
+from calendar import timegm
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def make_etag(*parts):
+    digest = hashlib.blake2b(
+        '|'.join(str(part) for part in parts).encode('utf-8'), digest_size=16
+    ).hexdigest()
+    return f'"{digest}"'
+
+
+def note_etag(pk, version, updated_at, variant=''):
+    """ノート 1 件の ETag（variant には ?fields= などの表現の違いを含める）"""
+    return make_etag('note', pk, version, updated_at.isoformat(), variant)
+
+
+def page_etag(notes, variant=''):
+    """一覧ページの ETag（ページ内のノートの id と版番号から計算）"""
+    return make_etag('page', variant, *(
+        f'{note.pk}:{note.version}:{note.updated_at.isoformat()}' for note in notes
+    ))
+
+
+def not_modified_response(request, etag, last_modified=None):
+    """If-None-Match / If-Modified-Since に一致すれば 304（または 412）を返す"""
+    timestamp = timegm(last_modified.utctimetuple()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(timegm(last_modified.utctimetuple()))
+    # 認証ユーザーごとに内容が変わるので共有キャッシュには載せない
+    response['Cache-Control'] = 'private, no-cache'
+    return response
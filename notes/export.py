@@ -0,0 +1,62 @@
+# notelog-api/notes/export.py
+"""ノートの NDJSON エクスポート
+
+QuerySet.iterator() で少しずつ読み出し（PostgreSQL ではサーバサイドカーソル）、
+1 行 1 ノートの JSON を StreamingHttpResponse で逐次送出する。
+クエリセット全体・レスポンス全体をメモリに載せないため、件数に関係なく
+ワーカーのメモリ使用量は一定に保たれる。
+"""
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+from .storage import decode_body
+
+EXPORT_FIELDS = ['id', 'title', 'content', 'created_at']
+# 本文は NoteBody から JOIN して読み、content に復号する
+QUERY_FIELDS = ['id', 'title', 'body__data', 'body__encoding', 'created_at']
+EXPORT_CHUNK_SIZE = 2000
+# 細かい write を避けるため、この程度のサイズにまとめてから送出する
+FLUSH_BYTES = 64 * 1024
+
+_encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+def iter_ndjson(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """NDJSON のバイト列を FLUSH_BYTES 程度ずつ返す"""
+    buffer = []
+    size = 0
+    rows = queryset.order_by('id').values_list(*QUERY_FIELDS).iterator(chunk_size=chunk_size)
+    for pk, title, data, encoding, created_at in rows:
+        row = dict(zip(EXPORT_FIELDS, (pk, title, decode_body(data, encoding), created_at)))
+        line = (_encoder.encode(row) + '\n').encode('utf-8')
+        buffer.append(line)
+        size += len(line)
+        if size >= FLUSH_BYTES:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def iter_gzip(chunks, level=6):
+    """バイト列のイテレータを gzip で逐次圧縮する"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(queryset, compress=False, filename='notes.ndjson'):
+    chunks = iter_ndjson(queryset)
+    if compress:
+        response = StreamingHttpResponse(iter_gzip(chunks), content_type='application/gzip')
+        filename += '.gz'
+    else:
+        response = StreamingHttpResponse(chunks, content_type='application/x-ndjson; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,267 @@
+# notelog-api/notes/importer.py
+"""ノートの大量インポート
+
+NDJSON（1 行 1 ノート）または Markdown ファイルをまとめた zip を逐次読み込み、
+一定件数ごとに書き込む。PostgreSQL では COPY、それ以外では bulk_create を使う。
+入力全体をメモリに載せないため、件数が増えてもメモリ使用量は一定に保たれる。
+"""
+import io
+import json
+import posixpath
+import shutil
+import tempfile
+import time
+import zipfile
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import cache
+from .models import Note, NoteBody, save_bodies
+from .rendering import render_body
+from .revisions import record_revisions
+from .search import build_search_document, index_notes
+from .storage import encode_body
+from .sync import assign_change_seqs
+
+IMPORT_BATCH_SIZE = 1000
+# 結果に含めるエラーの最大件数
+MAX_REPORTED_ERRORS = 20
+MARKDOWN_EXTENSIONS = ('.md', '.markdown', '.txt')
+# zip 全体が読めないときの例外
+ZIP_ERRORS = (zipfile.BadZipFile, zipfile.LargeZipFile)
+
+
+class ImportRecordError(ValueError):
+    pass
+
+
+def iter_ndjson_records(lines):
+    """バイト列または文字列の行イテレータから (行番号, dict) を返す"""
+    for lineno, line in enumerate(lines, start=1):
+        try:
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+        except UnicodeDecodeError as e:
+            yield lineno, ImportRecordError(f'UTF-8 として解釈できません: {e}')
+            continue
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield lineno, ImportRecordError(f'JSON として解釈できません: {e}')
+            continue
+        yield lineno, record
+
+
+def iter_markdown_zip_records(file):
+    """zip 内の Markdown ファイルを 1 ファイル 1 ノートとして返す
+
+    zip として読めなければ（書き込みを始める前に）ZIP_ERRORS を送出する。
+    個々のファイルが壊れている場合はそのファイルだけを失敗にする。
+    """
+    archive = zipfile.ZipFile(file)
+    return _iter_zip_members(archive)
+
+
+def _iter_zip_members(archive):
+    with archive:
+        for index, info in enumerate(archive.infolist(), start=1):
+            if info.is_dir() or not info.filename.lower().endswith(MARKDOWN_EXTENSIONS):
+                continue
+            try:
+                with archive.open(info) as member:
+                    text = io.TextIOWrapper(member, encoding='utf-8', errors='replace').read()
+            except (*ZIP_ERRORS, EOFError, NotImplementedError) as e:
+                # CRC 不一致・途中で切れたデータ・未対応の圧縮方式
+                yield index, ImportRecordError(f'{info.filename} を展開できません: {e}')
+                continue
+            yield index, markdown_to_record(info.filename, text)
+
+
+def spool_stream(stream, chunk_size=64 * 1024):
+    """zip の読み込みにはシーク可能なファイルが必要なため、一定サイズを超えたらディスクに書き出す"""
+    spooled = tempfile.SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    shutil.copyfileobj(stream, spooled, chunk_size)
+    spooled.seek(0)
+    return spooled
+
+
+def iter_records(file, name=''):
+    """ファイル名（拡張子）から形式を判定してレコードを返す"""
+    if name.lower().endswith('.zip'):
+        return iter_markdown_zip_records(file)
+    return iter_ndjson_records(file)
+
+
+def markdown_to_record(filename, text):
+    """先頭の '# 見出し' をタイトル、残りを本文にする（見出しがなければファイル名）"""
+    first_line, _, rest = text.lstrip('\ufeff').partition('\n')
+    if first_line.startswith('# '):
+        return {'title': first_line[2:].strip(), 'content': rest.lstrip('\n')}
+    stem = posixpath.splitext(posixpath.basename(filename))[0]
+    return {'title': stem, 'content': text}
+
+
+def build_note(record):
+    if isinstance(record, Exception):
+        raise record
+    if not isinstance(record, dict):
+        raise ImportRecordError('オブジェクトではありません')
+    title = record.get('title')
+    content = record.get('content')
+    if not isinstance(title, str) or not isinstance(content, str):
+        raise ImportRecordError('title と content（文字列）は必須です')
+
+    note = Note(title=title, content=content)
+    created_at = record.get('created_at')
+    if created_at:
+        try:
+            parsed = parse_datetime(created_at) if isinstance(created_at, str) else None
+        except ValueError:
+            # 形式は合っているが日付として存在しない（13 月など）
+            parsed = None
+        if parsed is None:
+            raise ImportRecordError(f'created_at が不正です: {created_at!r}')
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        note.created_at = parsed
+    note.refresh_derived_fields()
+    return note
+
+
+class NoteImporter:
+    """レコードのイテレータを受け取り、バッチごとに Note へ書き込む"""
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE, progress=None, use_copy=None):
+        self.batch_size = batch_size
+        self.progress = progress
+        if use_copy is None:
+            use_copy = connection.vendor == 'postgresql'
+        self.use_copy = use_copy
+        self.imported = 0
+        self.failed = 0
+        self.batches = 0
+        self.errors = []
+
+    def run(self, records):
+        started = time.monotonic()
+        batch = []
+        for position, record in records:
+            try:
+                batch.append(build_note(record))
+            except ImportRecordError as e:
+                self.failed += 1
+                if len(self.errors) < MAX_REPORTED_ERRORS:
+                    self.errors.append({'position': position, 'error': str(e)})
+                continue
+            if len(batch) >= self.batch_size:
+                self.write_batch(batch)
+                batch = []
+        if batch:
+            self.write_batch(batch)
+
+        return {
+            'imported': self.imported,
+            'failed': self.failed,
+            'batches': self.batches,
+            'errors': self.errors,
+            'elapsed': round(time.monotonic() - started, 3),
+        }
+
+    def write_batch(self, notes):
+        with transaction.atomic():
+            assign_change_seqs(notes)
+            if self.use_copy:
+                self.copy_notes(notes)
+            else:
+                # auto_now_add は bulk_create 時に上書きされるため、指定された日時を戻す
+                explicit = [(note, note.created_at) for note in notes if note.created_at]
+                Note.objects.bulk_create(notes)
+                if explicit:
+                    for note, created_at in explicit:
+                        note.created_at = created_at
+                    Note.objects.bulk_update([note for note, _ in explicit], ['created_at'])
+                save_bodies(notes)
+                index_notes(notes)
+            record_revisions(notes, created=True)
+            cache.invalidate()
+        self.imported += len(notes)
+        self.batches += 1
+        if self.progress:
+            self.progress(self.imported, self.failed)
+
+    def copy_notes(self, notes):
+        """PostgreSQL の COPY FROM STDIN（text 形式）で書き込む（本文は NoteBody へ）"""
+        # 本文の行に note_id が必要なので、id はシーケンスから先に払い出しておく
+        pk = Note._meta.pk
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+                [Note._meta.db_table, pk.column, len(notes)],
+            )
+            for note, (note_id,) in zip(notes, cursor.fetchall()):
+                note.pk = note_id
+
+        fields = Note._meta.concrete_fields
+        _copy_rows(Note, fields, (
+            [f.get_db_prep_save(_field_value(note, f), connection) for f in fields]
+            for note in notes
+        ))
+        bodies = []
+        for note in notes:
+            data, encoding = encode_body(note.content)
+            rendered, version = render_body(note.content)
+            # bytea の hex 形式
+            search_document = build_search_document(note.title, note.content)
+            bodies.append([note.pk, '\\x' + data.hex(), encoding, rendered, version, search_document])
+            note._content_changed = False
+        _copy_rows(NoteBody, NoteBody._meta.concrete_fields, bodies)
+
+
+def _copy_rows(model, fields, rows):
+    columns = ', '.join(connection.ops.quote_name(f.column) for f in fields)
+    sql = f'COPY {connection.ops.quote_name(model._meta.db_table)} ({columns}) FROM STDIN'
+
+    buffer = io.StringIO()
+    for values in rows:
+        buffer.write('\t'.join(_copy_text(value) for value in values))
+        buffer.write('\n')
+    buffer.seek(0)
+
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, 'copy_expert'):
+            raw.copy_expert(sql, buffer)
+        else:
+            # psycopg 3
+            with raw.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+
+def _field_value(note, field):
+    # インポート元の created_at などは auto_now_add より優先する
+    value = getattr(note, field.attname)
+    if value is None:
+        value = field.pre_save(note, add=True)
+    return value
+
+
+def _copy_text(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
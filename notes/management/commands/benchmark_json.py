@@ -0,0 +1,99 @@
+import io
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core.parsers import FastJSONParser
+from core.renderers import FastJSONRenderer, orjson
+from notes.models import Note
+from notes.serializers import NoteListSerializer, NoteSerializer
+
+WORDS = (
+    'Django', 'API', 'キャッシュ', '検索', '同期', '日本語', 'のメモ', 'を改善した。', '会議', '議事録',
+    '読書', '設計', 'について', 'まとめ', '性能', '「重要」', 'TODO:', '\n', '- ', '## ',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        '標準の JSONRenderer / JSONParser と orjson 版（core.renderers / core.parsers）で、'
+        'ノートのシリアライズ結果の変換時間を比較します'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--notes', type=int, default=100, help='一覧・同期ペイロードのノート数')
+        parser.add_argument('--content-size', type=int, default=4000, help='ノート本文の文字数')
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError('orjson がインストールされていません（pip install orjson）')
+
+        notes = self.make_notes(options['notes'], options['content_size'])
+        payloads = {
+            'detail': NoteSerializer(notes[0]).data,
+            'list': {
+                'next': None, 'previous': None,
+                'results': NoteListSerializer(notes[:20], many=True).data,
+            },
+            'sync': {
+                'changes': [{**item, 'deleted': False} for item in NoteSerializer(notes, many=True).data],
+                'next_token': '12345', 'has_more': False,
+            },
+            'bulk': {
+                'operations': [
+                    {'op': 'create', 'title': note.title, 'content': note.content} for note in notes
+                ],
+            },
+        }
+
+        self.stdout.write(
+            f"{'payload':<10}{'bytes':>10}{'render json':>14}{'orjson':>10}{'parse json':>14}{'orjson':>10}"
+        )
+        for name, data in payloads.items():
+            body = JSONRenderer().render(data)
+            fast_body = FastJSONRenderer().render(data)
+            if json.loads(body) != json.loads(fast_body):
+                raise CommandError(f'{name}: 出力が一致しません')
+            render = self.time_render(JSONRenderer(), data, options['iterations'])
+            fast_render = self.time_render(FastJSONRenderer(), data, options['iterations'])
+            parse = self.time_parse(JSONParser(), body, options['iterations'])
+            fast_parse = self.time_parse(FastJSONParser(), body, options['iterations'])
+            self.stdout.write(
+                f'{name:<10}{len(fast_body):>10}'
+                f'{render:>11.0f} µs{fast_render:>7.0f} µs ({render / fast_render:.1f}x)'
+                f'{parse:>8.0f} µs{fast_parse:>7.0f} µs ({parse / fast_parse:.1f}x)'
+            )
+
+    def make_notes(self, count, content_size):
+        rng = random.Random(0)
+        now = timezone.now()
+        notes = []
+        for i in range(count):
+            parts = []
+            while sum(map(len, parts)) < content_size:
+                parts.append(rng.choice(WORDS))
+            notes.append(Note(
+                id=i + 1, title=f'{rng.choice(WORDS)}{rng.choice(WORDS)} #{i}',
+                content=''.join(parts)[:content_size],
+                created_at=now, updated_at=now, excerpt=''.join(parts)[:120],
+                content_length=content_size, content_hash=f'{i:064x}',
+            ))
+        return notes
+
+    def time_render(self, renderer, data, iterations):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            renderer.render(data, 'application/json', {})
+        return (time.perf_counter() - started) * 1_000_000 / iterations
+
+    def time_parse(self, parser, body, iterations):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            parser.parse(io.BytesIO(body), 'application/json', {'encoding': 'utf-8'})
+        return (time.perf_counter() - started) * 1_000_000 / iterations
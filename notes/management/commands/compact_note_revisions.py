@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from notes.revisions import compact_revisions
+
+
+class Command(BaseCommand):
+    help = '古いノートの版を間引く（新しい版はすべて、古い版は 1 日 1 版、保持期間を過ぎた版は削除）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-all-days', type=int, default=settings.NOTES_REVISION_KEEP_ALL_DAYS,
+            help='すべての版を残す日数',
+        )
+        parser.add_argument(
+            '--retention-days', type=int, default=settings.NOTES_REVISION_RETENTION_DAYS,
+            help='版の保持日数（0 なら削除しない）',
+        )
+
+    def handle(self, *args, **options):
+        notes, deleted = compact_revisions(
+            keep_all=timedelta(days=options['keep_all_days']),
+            retention=timedelta(days=options['retention_days']),
+        )
+        self.stdout.write(self.style.SUCCESS(f'{notes} 件のノートから版を {deleted} 件削除しました'))
@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from notes.sync import compact_tombstones
+
+
+class Command(BaseCommand):
+    help = '保持期間を過ぎた削除ノートの墓標を削除する（差分同期用）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.NOTES_SYNC_TOMBSTONE_RETENTION_DAYS,
+            help='墓標の保持日数',
+        )
+
+    def handle(self, *args, **options):
+        deleted = compact_tombstones(retention=timedelta(days=options['days']))
+        self.stdout.write(self.style.SUCCESS(f'墓標を {deleted} 件削除しました'))
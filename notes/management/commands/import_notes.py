@@ -0,0 +1,46 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from notes.importer import IMPORT_BATCH_SIZE, ZIP_ERRORS, NoteImporter, iter_records
+
+
+class Command(BaseCommand):
+    help = 'NDJSON または Markdown の zip からノートを一括インポートする'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="入力ファイル（'-' で標準入力から NDJSON）")
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='PostgreSQL でも COPY を使わず bulk_create で書き込む',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        importer = NoteImporter(
+            batch_size=options['batch_size'],
+            progress=self.report_progress,
+            use_copy=False if options['no_copy'] else None,
+        )
+
+        if path == '-':
+            summary = importer.run(iter_records(sys.stdin.buffer))
+        else:
+            try:
+                with open(path, 'rb') as f:
+                    summary = importer.run(iter_records(f, path))
+            except OSError as e:
+                raise CommandError(f'ファイルを開けません: {e}')
+            except ZIP_ERRORS as e:
+                raise CommandError(f'zip ファイルを読み込めません: {e}')
+
+        for error in summary['errors']:
+            self.stderr.write(f"  #{error['position']}: {error['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"インポート完了: {summary['imported']} 件（失敗 {summary['failed']} 件, "
+            f"{summary['elapsed']} 秒）"
+        ))
+
+    def report_progress(self, imported, failed):
+        self.stdout.write(f'  {imported} 件インポート済み（失敗 {failed} 件）')
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.2 on 2026-10-18 12:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['-created_at', '-id'], name='note_created_at_id_idx'),
+        ),
+    ]
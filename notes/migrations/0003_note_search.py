@@ -0,0 +1,80 @@
+# Generated by Django 5.2.2 on 2026-10-18 12:03
+
+import django.db.models.deletion
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+def create_postgres_indexes(apps, schema_editor):
+    """PostgreSQL のみ: tsvector と pg_trgm の GIN インデックスを作成"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    from django.contrib.postgres.indexes import GinIndex, OpClass
+    from django.contrib.postgres.search import SearchVector
+
+    Note = apps.get_model('notes', 'Note')
+    # notes.search._search_postgres の SearchVector と同じ式にすること
+    schema_editor.add_index(Note, GinIndex(
+        SearchVector('search_document', config='simple'),
+        name='note_search_document_gin',
+    ))
+    schema_editor.add_index(Note, GinIndex(
+        OpClass('title', name='gin_trgm_ops'),
+        name='note_title_trgm_gin',
+    ))
+
+
+def drop_postgres_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS note_search_document_gin')
+    schema_editor.execute('DROP INDEX IF EXISTS note_title_trgm_gin')
+
+
+def build_search_index(apps, schema_editor):
+    """既存ノートの search_document と転置インデックスを作成"""
+    from notes.search import build_search_document, build_token_weights
+
+    Note = apps.get_model('notes', 'Note')
+    NoteSearchToken = apps.get_model('notes', 'NoteSearchToken')
+    db_alias = schema_editor.connection.alias
+    use_token_table = schema_editor.connection.vendor != 'postgresql'
+
+    for note in Note.objects.using(db_alias).iterator(chunk_size=500):
+        note.search_document = build_search_document(note.title, note.content)
+        note.save(update_fields=['search_document'])
+        if use_token_table:
+            NoteSearchToken.objects.using(db_alias).bulk_create(
+                NoteSearchToken(note_id=note.pk, token=token, weight=weight)
+                for token, weight in build_token_weights(note.title, note.content).items()
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0002_note_created_at_id_idx'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='note',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.CreateModel(
+            name='NoteSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=255)),
+                ('weight', models.PositiveIntegerField(default=1)),
+                ('note', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='notes.note')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['token', 'note'], name='note_search_token_idx')],
+            },
+        ),
+        migrations.RunPython(create_postgres_indexes, drop_postgres_indexes),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
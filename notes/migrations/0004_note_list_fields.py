@@ -0,0 +1,48 @@
+# Generated by Django 5.2.2 on 2026-10-18 12:04
+
+from django.db import migrations, models
+
+
+def fill_list_fields(apps, schema_editor):
+    """既存ノートの抜粋・文字数・ハッシュを計算"""
+    from notes.models import build_content_hash, build_excerpt
+
+    Note = apps.get_model('notes', 'Note')
+    db_alias = schema_editor.connection.alias
+    batch = []
+    for note in Note.objects.using(db_alias).only('id', 'content').iterator(chunk_size=500):
+        note.excerpt = build_excerpt(note.content)
+        note.content_length = len(note.content)
+        note.content_hash = build_content_hash(note.content)
+        batch.append(note)
+        if len(batch) >= 500:
+            Note.objects.using(db_alias).bulk_update(batch, ['excerpt', 'content_length', 'content_hash'])
+            batch = []
+    if batch:
+        Note.objects.using(db_alias).bulk_update(batch, ['excerpt', 'content_length', 'content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0003_note_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='content_length',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='excerpt',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200),
+        ),
+        migrations.RunPython(fill_list_fields, migrations.RunPython.noop),
+    ]
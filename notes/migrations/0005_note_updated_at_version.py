@@ -0,0 +1,32 @@
+# Generated by Django 5.2.2 on 2026-10-18 12:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def fill_updated_at(apps, schema_editor):
+    """既存ノートの updated_at は created_at とする"""
+    Note = apps.get_model('notes', 'Note')
+    Note.objects.using(schema_editor.connection.alias).update(updated_at=models.F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0004_note_list_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+    ]
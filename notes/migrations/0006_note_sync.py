@@ -0,0 +1,47 @@
+# Generated by Django 5.2.2 on 2026-10-18 12:09
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def fill_change_seq(apps, schema_editor):
+    """既存ノートの変更番号は id とし、カウンタをその最大値から始める"""
+    Note = apps.get_model('notes', 'Note')
+    NoteSyncState = apps.get_model('notes', 'NoteSyncState')
+    db_alias = schema_editor.connection.alias
+    Note.objects.using(db_alias).update(change_seq=models.F('id'))
+    last_seq = Note.objects.using(db_alias).aggregate(m=models.Max('id'))['m'] or 0
+    NoteSyncState.objects.using(db_alias).update_or_create(pk=1, defaults={'last_seq': last_seq})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0005_note_updated_at_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteSyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_seq', models.BigIntegerField(default=0)),
+                ('compacted_through', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='NoteTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('note_id', models.BigIntegerField()),
+                ('change_seq', models.BigIntegerField(db_index=True)),
+                ('deleted_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='change_seq',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(fill_change_seq, migrations.RunPython.noop),
+    ]
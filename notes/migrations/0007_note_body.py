@@ -0,0 +1,63 @@
+# Generated by Django 5.2.2 on 2026-10-18 12:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def move_content_to_body(apps, schema_editor):
+    """既存ノートの本文を NoteBody に（設定に応じて圧縮して）移す"""
+    from notes.storage import encode_body
+
+    Note = apps.get_model('notes', 'Note')
+    NoteBody = apps.get_model('notes', 'NoteBody')
+    db_alias = schema_editor.connection.alias
+    batch = []
+    for note_id, content in Note.objects.using(db_alias).values_list('id', 'content').iterator(chunk_size=500):
+        data, encoding = encode_body(content)
+        batch.append(NoteBody(note_id=note_id, data=data, encoding=encoding))
+        if len(batch) >= 500:
+            NoteBody.objects.using(db_alias).bulk_create(batch)
+            batch = []
+    if batch:
+        NoteBody.objects.using(db_alias).bulk_create(batch)
+
+
+def move_body_to_content(apps, schema_editor):
+    from notes.storage import decode_body
+
+    Note = apps.get_model('notes', 'Note')
+    NoteBody = apps.get_model('notes', 'NoteBody')
+    db_alias = schema_editor.connection.alias
+    for body in NoteBody.objects.using(db_alias).iterator(chunk_size=500):
+        Note.objects.using(db_alias).filter(pk=body.note_id).update(
+            content=decode_body(body.data, body.encoding)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0006_note_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteBody',
+            fields=[
+                ('note', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='body', serialize=False, to='notes.note')),
+                ('data', models.BinaryField()),
+                ('encoding', models.CharField(blank=True, default='', max_length=8)),
+            ],
+        ),
+        migrations.RunPython(move_content_to_body, move_body_to_content),
+        # 逆方向で既存行に列を戻せるよう、削除前に既定値を付けておく
+        migrations.AlterField(
+            model_name='note',
+            name='content',
+            field=models.TextField(default=''),
+        ),
+        migrations.RemoveField(
+            model_name='note',
+            name='content',
+        ),
+    ]
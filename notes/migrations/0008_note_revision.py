@@ -0,0 +1,56 @@
+# Generated by Django 5.2.2 on 2026-10-18 12:45
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def create_initial_revisions(apps, schema_editor):
+    """既存ノートの現在の本文を版 1（スナップショット）として記録する"""
+    Note = apps.get_model('notes', 'Note')
+    NoteRevision = apps.get_model('notes', 'NoteRevision')
+    db_alias = schema_editor.connection.alias
+    # スナップショットは NoteBody と同じ符号化なので、本文のバイト列をそのまま使う
+    notes = Note.objects.using(db_alias).values_list(
+        'id', 'title', 'body__data', 'body__encoding', 'content_length', 'content_hash'
+    )
+    batch = []
+    for note_id, title, data, encoding, content_length, content_hash in notes.iterator(chunk_size=500):
+        batch.append(NoteRevision(
+            note_id=note_id, number=1, base=1, title=title, data=data or b'', encoding=encoding or '',
+            content_length=content_length, content_hash=content_hash,
+        ))
+        if len(batch) >= 500:
+            NoteRevision.objects.using(db_alias).bulk_create(batch)
+            batch = []
+    if batch:
+        NoteRevision.objects.using(db_alias).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0007_note_body'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('base', models.PositiveIntegerField()),
+                ('title', models.TextField()),
+                ('data', models.BinaryField()),
+                ('encoding', models.CharField(blank=True, default='', max_length=8)),
+                ('content_length', models.PositiveIntegerField(default=0)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('note', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='notes.note')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('note', 'number'), name='note_revision_number_uniq')],
+            },
+        ),
+        migrations.RunPython(create_initial_revisions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.2 on 2026-10-18 12:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0008_note_revision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notebody',
+            name='html',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='notebody',
+            name='html_version',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 5.2.2 on 2026-10-18 13:01
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_to_body(apps, schema_editor):
+    """Note.search_document を NoteBody に移す（1 回の UPDATE）"""
+    Note = apps.get_model('notes', 'Note')
+    NoteBody = apps.get_model('notes', 'NoteBody')
+    db_alias = schema_editor.connection.alias
+    NoteBody.objects.using(db_alias).update(search_document=Subquery(
+        Note.objects.using(db_alias).filter(pk=OuterRef('note_id')).values('search_document')[:1]
+    ))
+
+
+def copy_to_note(apps, schema_editor):
+    Note = apps.get_model('notes', 'Note')
+    NoteBody = apps.get_model('notes', 'NoteBody')
+    db_alias = schema_editor.connection.alias
+    Note.objects.using(db_alias).filter(body__isnull=False).update(search_document=Subquery(
+        NoteBody.objects.using(db_alias).filter(note_id=OuterRef('pk')).values('search_document')[:1]
+    ))
+
+
+def create_body_index(apps, schema_editor):
+    """PostgreSQL のみ: NoteBody の tsvector の GIN インデックスを作成"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    NoteBody = apps.get_model('notes', 'NoteBody')
+    # notes.search._search_postgres の SearchVector と同じ式にすること
+    schema_editor.add_index(NoteBody, GinIndex(
+        SearchVector('search_document', config='simple'),
+        name='notebody_search_document_gin',
+    ))
+
+
+def drop_body_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS notebody_search_document_gin')
+
+
+def drop_note_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS note_search_document_gin')
+
+
+def create_note_index(apps, schema_editor):
+    """逆方向: 0003 と同じ Note のインデックスを作り直す"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    Note = apps.get_model('notes', 'Note')
+    schema_editor.add_index(Note, GinIndex(
+        SearchVector('search_document', config='simple'),
+        name='note_search_document_gin',
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0009_notebody_html'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notebody',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(copy_to_body, copy_to_note),
+        migrations.RunPython(create_body_index, drop_body_index),
+        migrations.RunPython(drop_note_index, create_note_index),
+        migrations.RemoveField(
+            model_name='note',
+            name='search_document',
+        ),
+    ]
@@ -1,9 +1,325 @@
-from django.db import models
+import hashlib
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+
+from .search import build_search_document
+from .rendering import cache_rendered_html, render_body, render_markdown, renderer_version
+from .storage import decode_body, encode_body
+
+EXCERPT_LENGTH = 200
+
+
+def build_excerpt(content, length=EXCERPT_LENGTH):
+    """一覧表示用の抜粋（空白を詰めた先頭 length 文字）"""
+    text = ' '.join((content or '').split())
+    return text[:length]
+
+
+def build_content_hash(content):
+    return hashlib.sha256((content or '').encode('utf-8')).hexdigest()
+
+
+class NoteQuerySet(models.QuerySet):
+    def with_content(self):
+        """本文（NoteBody）を JOIN して一緒に読み込む（HTML と検索用のトークン列は読まない）"""
+        return self.select_related('body').defer(
+            'body__html', 'body__html_version', 'body__search_document'
+        )
+
 
 class Note(models.Model):
     title = models.TextField()
-    content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # 保存のたびに増える版番号（ETag 用）
+    version = models.PositiveIntegerField(default=1, editable=False)
+    # 差分同期用の変更番号（NoteSyncState.allocate() で採番、単調増加）
+    change_seq = models.BigIntegerField(default=0, db_index=True, editable=False)
+    # 一覧用の派生値。本文を読み込まずに一覧を返すため save() 時に計算して保持する
+    excerpt = models.CharField(max_length=EXCERPT_LENGTH, blank=True, default='', editable=False)
+    content_length = models.PositiveIntegerField(default=0, editable=False)
+    content_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
+
+    # 本文・タイトルの変更時に再計算されるフィールド
+    DERIVED_FIELDS = {
+        'title': {'updated_at', 'version', 'change_seq'},
+        'content': {
+            'excerpt', 'content_length', 'content_hash', 'updated_at', 'version', 'change_seq',
+        },
+    }
+
+    objects = NoteQuerySet.as_manager()
+
+    # 本文は NoteBody に置き、content プロパティで透過的に読み書きする
+    _content = None
+    _content_changed = False
+    # 本文を変更する前の保存済みの本文（読み込み済みの場合のみ。版の差分の基準にする）
+    _saved_content = None
+
+    class Meta:
+        indexes = [
+            # カーソルページネーション（created_at, id のシーク）用
+            models.Index(fields=['-created_at', '-id'], name='note_created_at_id_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+    @property
+    def content(self):
+        """本文（初回参照時に NoteBody から読む。with_content() で取得していればクエリなし）"""
+        if self._content is None:
+            try:
+                self._content = self.body.text
+            except NoteBody.DoesNotExist:
+                self._content = ''
+        return self._content
+
+    @content.setter
+    def content(self, value):
+        if not self._content_changed:
+            self._saved_content = self._loaded_content()
+        self._content = value
+        self._content_changed = True
+
+    def _loaded_content(self):
+        """クエリを発行せずに分かる保存済みの本文（なければ None）"""
+        if self._content is not None:
+            return self._content
+        body = self._state.fields_cache.get('body')
+        return body.text if body is not None else None
+
+    def get_saved_content(self, using=None):
+        """DB 上の（保存前の）本文"""
+        if self._content_changed:
+            if self._saved_content is not None:
+                return self._saved_content
+            body = NoteBody.objects.using(using).filter(note_id=self.pk).only('data', 'encoding').first()
+            return body.text if body is not None else ''
+        return self.content
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        if fields is None or 'content' in fields:
+            self._content = self._saved_content = None
+            self._content_changed = False
+            if fields is not None:
+                fields = [name for name in fields if name != 'content']
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+
+    def refresh_derived_fields(self):
+        """title / content から派生するフィールドを再計算する（検索用のトークン列は保存時に NoteBody へ）"""
+        self.excerpt = build_excerpt(self.content)
+        self.content_length = len(self.content or '')
+        self.content_hash = build_content_hash(self.content)
+
+    def mark_changed(self):
+        """既存ノートの版番号と更新日時を進める（bulk_update など save() を通らない場合用）"""
+        self.version = (self.version or 0) + 1
+        self.updated_at = timezone.now()
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        adding = self._state.adding
+        changed = True
+        if update_fields is None:
+            self.refresh_derived_fields()
+            if not adding:
+                self.mark_changed()
+            write_body = adding or self._content_changed
+        else:
+            update_fields = set(update_fields)
+            changed = bool(update_fields & self.DERIVED_FIELDS.keys())
+            if changed:
+                self.refresh_derived_fields()
+                self.mark_changed()
+                for source, derived in self.DERIVED_FIELDS.items():
+                    if source in update_fields:
+                        update_fields |= derived
+            # content は Note のカラムではないので NoteBody に書く
+            write_body = 'content' in update_fields
+            update_fields.discard('content')
+            kwargs['update_fields'] = update_fields
+
+        if not changed:
+            return super().save(*args, **kwargs)
+        from .revisions import record_revisions
+
+        # 採番と保存を同じトランザクションにし、変更番号の順序とコミット順を一致させる
+        using = kwargs.get('using')
+        with transaction.atomic(using=using):
+            self.change_seq = NoteSyncState.allocate(using=using)
+            previous = {} if adding else {self.pk: self.get_saved_content(using=using)}
+            super().save(*args, **kwargs)
+            if write_body:
+                self.save_body(using=using, adding=adding)
+            else:
+                # タイトルだけの変更でも検索用のトークン列は作り直す
+                self.save_search_document(using=using)
+            record_revisions([self], using=using, previous=previous, created=adding)
+
+    def save_body(self, using=None, adding=False):
+        data, encoding = encode_body(self.content)
+        # 読まれる前に HTML を作ってキャッシュしておく（NOTES_RENDERED_HTML_PERSIST なら保存も）
+        rendered = render_markdown(self.content)
+        cache_rendered_html(self.content_hash, rendered)
+        if settings.NOTES_RENDERED_HTML_PERSIST:
+            fields = {'data': data, 'encoding': encoding, 'html': rendered, 'html_version': renderer_version()}
+        else:
+            fields = {'data': data, 'encoding': encoding, 'html': '', 'html_version': ''}
+        fields['search_document'] = build_search_document(self.title, self.content)
+        bodies = NoteBody.objects.using(using)
+        if adding or not bodies.filter(note_id=self.pk).update(**fields):
+            bodies.create(note_id=self.pk, **fields)
+        self._content_changed = False
+        self._saved_content = None
+
+    def save_search_document(self, using=None):
+        document = build_search_document(self.title, self.content)
+        if not NoteBody.objects.using(using).filter(note_id=self.pk).update(search_document=document):
+            self.save_body(using=using)
+
+
+class NoteBody(models.Model):
+    """ノート本文（Note.content の保存先）
+
+    一覧・並べ替え・同期の判定など、本文を使わないクエリで大きな本文を読まないよう
+    Note とは別のテーブルに置く。大きな本文は圧縮して保存する（notes.storage）。
+    本文の数倍の大きさになる検索用のトークン列も、Note の行を狭く保つためここに置く。
+    """
+    note = models.OneToOneField(Note, on_delete=models.CASCADE, primary_key=True, related_name='body')
+    data = models.BinaryField()
+    # notes.storage の符号化方式（'' は圧縮なし）
+    encoding = models.CharField(max_length=8, blank=True, default='')
+    # 本文をレンダリングした HTML（notes.rendering）と、作ったレンダラーの版（'' は未作成）
+    html = models.TextField(blank=True, default='')
+    html_version = models.CharField(max_length=64, blank=True, default='')
+    # 全文検索用のトークン列（CJK bigram + 英数字単語）。タイトルか本文の保存時に更新
+    search_document = models.TextField(blank=True, default='', editable=False)
+
+    def __str__(self):
+        return f'{self.note_id} ({self.encoding or "plain"})'
+
+    @property
+    def text(self):
+        return decode_body(self.data, self.encoding)
+
+
+def save_bodies(notes, using=None, batch_size=500):
+    """bulk_create / bulk_update の後に本文をまとめて書き込む（save() を通らない一括処理用）"""
+    bodies = []
+    for note in notes:
+        data, encoding = encode_body(note.content)
+        rendered, version = render_body(note.content)
+        bodies.append(NoteBody(
+            note_id=note.pk, data=data, encoding=encoding, html=rendered, html_version=version,
+            search_document=build_search_document(note.title, note.content),
+        ))
+        note._content_changed = False
+        note._saved_content = None
+    NoteBody.objects.using(using).bulk_create(
+        bodies, batch_size=batch_size,
+        update_conflicts=True, unique_fields=['note'],
+        update_fields=['data', 'encoding', 'html', 'html_version', 'search_document'],
+    )
+
+
+def save_search_documents(notes, using=None, batch_size=500):
+    """本文を変えずにタイトルだけを変えたノートの検索用トークン列をまとめて更新する"""
+    NoteBody.objects.using(using).bulk_update(
+        [
+            NoteBody(note_id=note.pk, search_document=build_search_document(note.title, note.content))
+            for note in notes
+        ],
+        ['search_document'], batch_size=batch_size,
+    )
+
+
+class NoteRevision(models.Model):
+    """ノートの版（notes.revisions）
+
+    base == number の版はスナップショット（data は本文全体）、それ以外は直前の版からの
+    差分。版 n の本文は、版 base のスナップショットに base より後・n 以下の差分を
+    順に当てて復元する。
+    """
+    note = models.ForeignKey(Note, on_delete=models.CASCADE, related_name='revisions')
+    # ノートごとの版番号（1 から。間引き後は飛ぶ）
+    number = models.PositiveIntegerField()
+    # 復元の起点になるスナップショットの版番号
+    base = models.PositiveIntegerField()
+    title = models.TextField()
+    data = models.BinaryField()
+    # notes.storage の符号化方式（'' は圧縮なし）
+    encoding = models.CharField(max_length=8, blank=True, default='')
+    content_length = models.PositiveIntegerField(default=0)
+    content_hash = models.CharField(max_length=64)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['note', 'number'], name='note_revision_number_uniq'),
+        ]
+
+    def __str__(self):
+        return f'{self.note_id} #{self.number}'
+
+    @property
+    def is_snapshot(self):
+        return self.base == self.number
+
+
+class NoteSearchToken(models.Model):
+    """PostgreSQL 以外で使う全文検索の転置インデックス"""
+    note = models.ForeignKey(Note, on_delete=models.CASCADE, related_name='search_tokens')
+    token = models.CharField(max_length=255)
+    weight = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['token', 'note'], name='note_search_token_idx'),
+        ]
+
+    def __str__(self):
+        return self.token
+
+
+class NoteTombstone(models.Model):
+    """削除されたノートの記録（差分同期で削除を伝えるため）"""
+    note_id = models.BigIntegerField()
+    change_seq = models.BigIntegerField(db_index=True)
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f'{self.note_id} ({self.change_seq})'
+
+
+class NoteSyncState(models.Model):
+    """変更番号のカウンタ（1 行のみ）
+
+    採番時に行ロックを取り、呼び出し元トランザクションのコミットまで保持するので、
+    変更番号の小さい変更ほど先にコミットされる。
+    """
+    last_seq = models.BigIntegerField(default=0)
+    # compact_note_tombstones で削除した墓標の最大変更番号。これより前の since は再同期が必要
+    compacted_through = models.BigIntegerField(default=0)
+
+    SINGLETON_ID = 1
+
+    @classmethod
+    def load(cls, using=None, for_update=False):
+        queryset = cls.objects.using(using)
+        if for_update:
+            queryset = queryset.select_for_update()
+        state, _ = queryset.get_or_create(pk=cls.SINGLETON_ID)
+        return state
+
+    @classmethod
+    def allocate(cls, count=1, using=None):
+        """count 個の連続した変更番号を確保し、先頭の番号を返す"""
+        with transaction.atomic(using=using):
+            state = cls.load(using=using, for_update=True)
+            first = state.last_seq + 1
+            state.last_seq += count
+            state.save(update_fields=['last_seq'])
+        return first
@@ -0,0 +1,131 @@
+# notelog-api/notes/pagination.py
+from base64 import b64decode, b64encode
+from urllib import parse
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class NoteCursorPagination(BasePagination):
+    """(created_at, id) をキーにしたキーセット（カーソル）ページネーション
+
+    OFFSET や COUNT(*) を発行せず、直前ページ末尾の (created_at, id) から
+    インデックスをシークするため、深いページでも 1 ページ目と同じコストで返せる。
+    """
+    page_size = api_settings.PAGE_SIZE or 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'カーソルが不正です'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.reverse, self.position = self.decode_cursor(request)
+
+        if self.position is not None:
+            created_at, pk = self.position
+            # created_at <= ts を先に置くことで (created_at, id) インデックスの範囲走査になる
+            if self.reverse:
+                queryset = queryset.filter(created_at__gte=created_at).filter(
+                    Q(created_at__gt=created_at) | Q(id__gt=pk)
+                )
+            else:
+                queryset = queryset.filter(created_at__lte=created_at).filter(
+                    Q(created_at__lt=created_at) | Q(id__lt=pk)
+                )
+
+        if self.reverse:
+            queryset = queryset.order_by('created_at', 'id')
+        else:
+            queryset = queryset.order_by('-created_at', '-id')
+
+        # 1 件多く取得して次ページの有無を判定する（COUNT は使わない）
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if self.reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.position is not None
+
+        return self.page
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                size = int(request.query_params[self.page_size_query_param])
+                if size > 0:
+                    return min(size, self.max_page_size)
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return False, None
+
+        try:
+            querystring = b64decode(encoded.encode('ascii')).decode('ascii')
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            reverse = bool(int(tokens.get('r', ['0'])[0]))
+            created_at = parse_datetime(tokens['p'][0])
+            pk = int(tokens['i'][0])
+        except (TypeError, ValueError, KeyError, IndexError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return reverse, (created_at, pk)
+
+    def encode_cursor(self, reverse, instance):
+        tokens = {'p': instance.created_at.isoformat(), 'i': instance.pk}
+        if reverse:
+            tokens['r'] = '1'
+        querystring = parse.urlencode(tokens, doseq=True)
+        encoded = b64encode(querystring.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            # 逆方向に進んで空になった場合はカーソルなしの先頭ページへ戻す
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(False, self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(True, self.page[0])
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
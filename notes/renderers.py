@@ -0,0 +1,20 @@
+# notelog-api/notes/renderers.py
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class NDJSONRenderer(BaseRenderer):
+    """エクスポート用（Accept: application/x-ndjson のネゴシエーションを通すため）
+
+    実際の本文は StreamingHttpResponse で返すので、ここではエラー時の
+    dict を 1 行の JSON として出力するだけ。
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return (json.dumps(data, ensure_ascii=False) + '\n').encode(self.charset)
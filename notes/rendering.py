@@ -0,0 +1,208 @@
+# notelog-api/notes/rendering.py
+"""ノート本文（Markdown）の HTML レンダリング
+
+Markdown（markdown パッケージ）で変換し nh3 でサニタイズする。どちらかが未インストール
+なら、すべてのテキストをエスケープする組み込みの簡易レンダラー（見出し・リスト・
+引用・コードブロック・強調・リンク）を使う。
+
+同じ本文は何度読まれても同じ HTML になるので、(レンダラーの版, Note.content_hash) を
+キーにキャッシュし、NoteBody.html にも保存しておく（NOTES_RENDERED_HTML_PERSIST）。
+本文かレンダラーの版が変わったときだけ変換し直す。
+"""
+import html
+import re
+from functools import lru_cache
+from importlib import metadata
+
+from django.conf import settings
+from django.core.cache import cache
+
+try:
+    import markdown
+except ImportError:
+    markdown = None
+
+try:
+    import nh3
+except ImportError:
+    nh3 = None
+
+CACHE_KEY_PREFIX = 'notes:html'
+# 出力が変わる修正をしたら上げる（保存済み・キャッシュ済みの HTML が作り直される）
+RENDERER_REVISION = 1
+MARKDOWN_EXTENSIONS = ['fenced_code', 'tables', 'sane_lists']
+SAFE_URL_SCHEMES = ('http', 'https', 'mailto')
+
+
+@lru_cache(maxsize=None)
+def renderer_version():
+    """NoteBody.html_version とキャッシュキーに使うレンダラーの版"""
+    if markdown is not None and nh3 is not None:
+        return (
+            f"{RENDERER_REVISION}:markdown-{metadata.version('markdown')}"
+            f"+nh3-{metadata.version('nh3')}"
+        )
+    return f'{RENDERER_REVISION}:builtin'
+
+
+def render_markdown(text):
+    """Markdown をサニタイズ済みの HTML にする"""
+    if markdown is not None and nh3 is not None:
+        converted = markdown.markdown(text or '', extensions=MARKDOWN_EXTENSIONS)
+        return nh3.clean(
+            converted, url_schemes=set(SAFE_URL_SCHEMES), link_rel='nofollow noopener noreferrer'
+        )
+    return _render_blocks((text or '').splitlines())
+
+
+def cache_key(content_hash):
+    return f'{CACHE_KEY_PREFIX}:{renderer_version()}:{content_hash}'
+
+
+def cache_rendered_html(content_hash, rendered):
+    cache.set(cache_key(content_hash), rendered, settings.NOTES_RENDERED_HTML_CACHE_TIMEOUT)
+
+
+def render_body(content):
+    """保存時に NoteBody に書き込む (html, html_version)。保存しない設定なら空"""
+    if not settings.NOTES_RENDERED_HTML_PERSIST:
+        return '', ''
+    return render_markdown(content), renderer_version()
+
+
+def get_rendered_html(note):
+    """ノートの HTML（キャッシュ → NoteBody.html → 変換の順に探す）
+
+    note は content_hash を読み込んだ Note。キャッシュか保存済みの HTML が使えれば
+    本文（Markdown）は読まない。
+    """
+    from .models import NoteBody
+
+    key = cache_key(note.content_hash)
+    rendered = cache.get(key)
+    if rendered is not None:
+        return rendered
+
+    version = renderer_version()
+    body = NoteBody.objects.filter(note_id=note.pk).only('html', 'html_version').first()
+    if body is not None and body.html_version == version:
+        rendered = body.html
+    else:
+        rendered = render_markdown(note.content)
+        if settings.NOTES_RENDERED_HTML_PERSIST:
+            NoteBody.objects.filter(note_id=note.pk).update(html=rendered, html_version=version)
+    cache_rendered_html(note.content_hash, rendered)
+    return rendered
+
+
+# --- 組み込みの簡易レンダラー（テキストはすべてエスケープし、タグはここで生成するものだけ）
+
+_FENCE = re.compile(r'^\s*(```|~~~)\s*([\w+-]*)\s*$')
+_HEADING = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+_RULE = re.compile(r'^\s*([-*_])(\s*\1){2,}\s*$')
+_BULLET = re.compile(r'^\s*[-*+]\s+(.*)$')
+_ORDERED = re.compile(r'^\s*\d+[.)]\s+(.*)$')
+_QUOTE = re.compile(r'^\s*>\s?(.*)$')
+_INLINE = re.compile(
+    r'`([^`]+)`'                      # コード
+    r'|\*\*(.+?)\*\*'                 # 強調
+    r'|\*([^*\s](?:.*?[^*\s])?)\*'    # 斜体
+    r'|\[([^\]]+)\]\(([^)\s]+)\)'     # リンク
+)
+
+
+def _render_blocks(lines):
+    out = []
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if not line.strip():
+            i += 1
+            continue
+
+        fence = _FENCE.match(line)
+        if fence:
+            code = []
+            i += 1
+            while i < len(lines) and not lines[i].strip().startswith(fence.group(1)):
+                code.append(lines[i])
+                i += 1
+            i += 1
+            lang = f' class="language-{fence.group(2)}"' if fence.group(2) else ''
+            out.append(f'<pre><code{lang}>{html.escape(chr(10).join(code))}\n</code></pre>')
+            continue
+
+        heading = _HEADING.match(line)
+        if heading:
+            level = len(heading.group(1))
+            out.append(f'<h{level}>{_render_inline(heading.group(2))}</h{level}>')
+            i += 1
+            continue
+
+        if _RULE.match(line):
+            out.append('<hr>')
+            i += 1
+            continue
+
+        if _QUOTE.match(line):
+            quoted = []
+            while i < len(lines) and _QUOTE.match(lines[i]):
+                quoted.append(_QUOTE.match(lines[i]).group(1))
+                i += 1
+            out.append(f'<blockquote>\n{_render_blocks(quoted)}\n</blockquote>')
+            continue
+
+        for pattern, tag in ((_BULLET, 'ul'), (_ORDERED, 'ol')):
+            if pattern.match(line):
+                items = []
+                while i < len(lines) and pattern.match(lines[i]):
+                    items.append(f'<li>{_render_inline(pattern.match(lines[i]).group(1))}</li>')
+                    i += 1
+                out.append(f'<{tag}>\n' + '\n'.join(items) + f'\n</{tag}>')
+                break
+        else:
+            paragraph = [line.strip()]
+            i += 1
+            while i < len(lines) and lines[i].strip() and not _starts_block(lines[i]):
+                paragraph.append(lines[i].strip())
+                i += 1
+            out.append(f"<p>{_render_inline(chr(10).join(paragraph))}</p>")
+    return '\n'.join(out)
+
+
+def _starts_block(line):
+    return any(
+        pattern.match(line) for pattern in (_FENCE, _HEADING, _RULE, _BULLET, _ORDERED, _QUOTE)
+    )
+
+
+def _render_inline(text):
+    parts = []
+    position = 0
+    for match in _INLINE.finditer(text):
+        parts.append(html.escape(text[position:match.start()]))
+        code, strong, emphasis, label, url = match.groups()
+        if code is not None:
+            parts.append(f'<code>{html.escape(code)}</code>')
+        elif strong is not None:
+            parts.append(f'<strong>{_render_inline(strong)}</strong>')
+        elif emphasis is not None:
+            parts.append(f'<em>{_render_inline(emphasis)}</em>')
+        elif _is_safe_url(url):
+            parts.append(
+                f'<a href="{html.escape(url)}" rel="nofollow noopener noreferrer">'
+                f'{_render_inline(label)}</a>'
+            )
+        else:
+            parts.append(_render_inline(label))
+        position = match.end()
+    parts.append(html.escape(text[position:]))
+    return ''.join(parts)
+
+
+def _is_safe_url(url):
+    scheme, sep, _ = url.partition(':')
+    # スキームなし（相対 URL・アンカー）か、許可したスキームだけ
+    if not sep or '/' in scheme or '?' in scheme or '#' in scheme:
+        return True
+    return scheme.lower() in SAFE_URL_SCHEMES
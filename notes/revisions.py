@@ -0,0 +1,225 @@
+# notelog-api/notes/revisions.py
+"""ノートの版の履歴
+
+版は NoteRevision に、一定間隔のスナップショット（本文全体）と、直前の版からの
+行単位の差分として保存する。保存量は文書の大きさ × 編集回数ではなく変更量に比例し、
+任意の版の復元はスナップショットから高々 NOTES_REVISION_SNAPSHOT_INTERVAL 件の
+差分を当てるだけで済む。
+
+差分は直前の版の本文を行（改行込み）に分けたものへの置き換え操作
+[[開始行, 終了行, [新しい行, ...]], ...] を JSON にしたもの。本文と同じく
+notes.storage で符号化する。
+"""
+import difflib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .models import Note, NoteRevision, build_content_hash
+from .storage import decode_body, encode_body
+
+
+def build_delta(old, new):
+    """old から new への差分（置き換え操作のリスト）"""
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines)
+    return [
+        [i1, i2, new_lines[j1:j2]]
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal'
+    ]
+
+
+def apply_delta(text, delta):
+    lines = text.splitlines(keepends=True)
+    # 後ろから当てれば、前の操作の行番号がずれない
+    for start, end, new_lines in reversed(delta):
+        lines[start:end] = new_lines
+    return ''.join(lines)
+
+
+def _latest_revisions(note_ids, using=None):
+    """{note_id: 最新の版}（data は読まない）"""
+    latest = (
+        NoteRevision.objects.using(using)
+        .filter(note_id=OuterRef('note_id')).order_by('-number').values('number')[:1]
+    )
+    revisions = (
+        NoteRevision.objects.using(using)
+        .filter(note_id__in=note_ids, number=Subquery(latest))
+        .only('note_id', 'number', 'base', 'title', 'content_hash')
+    )
+    return {revision.note_id: revision for revision in revisions}
+
+
+def build_revision(note_id, title, content, number, previous=None, previous_content=None):
+    """previous（直前の版）の次の版を作る（保存はしない）
+
+    previous_content は直前の版の本文。差分が大きい場合やスナップショットの間隔に
+    達した場合、直前の版の本文が分からない場合はスナップショットにする。
+    番号が飛んでいる（間引き後の）場合も、間隔は番号の差で数えるので復元コストは超えない。
+    """
+    revision = NoteRevision(
+        note_id=note_id, number=number, title=title,
+        content_length=len(content), content_hash=build_content_hash(content),
+    )
+    if (
+        previous is not None and previous_content is not None
+        and number - previous.base < settings.NOTES_REVISION_SNAPSHOT_INTERVAL
+    ):
+        delta = json.dumps(build_delta(previous_content, content), ensure_ascii=False)
+        # 差分が本文の半分を超えるならスナップショットの方が安い
+        if len(delta) * 2 < len(content) or len(delta) <= 64:
+            revision.base = previous.base
+            revision.data, revision.encoding = encode_body(delta)
+            return revision
+    revision.base = number
+    revision.data, revision.encoding = encode_body(content)
+    return revision
+
+
+def record_revisions(notes, using=None, previous=None, created=False):
+    """保存済みのノートの新しい版をまとめて記録する
+
+    previous は {note_id: 保存前の本文}。直前の版と本文が一致すれば差分で、
+    そうでなければ（履歴がない・途中が欠けている）スナップショットで保存する。
+    タイトル・本文とも直前の版と同じなら記録しない。created=True（新規作成のみ）
+    なら直前の版を調べない。
+    """
+    previous = previous or {}
+    latest = {} if created else _latest_revisions([note.pk for note in notes], using=using)
+    revisions = []
+    for note in notes:
+        last = latest.get(note.pk)
+        content = note.content
+        if last is None:
+            revisions.append(build_revision(note.pk, note.title, content, 1))
+            continue
+        if last.content_hash == note.content_hash and last.title == note.title:
+            continue
+        if last.content_hash == note.content_hash:
+            base_content = content
+        elif note.pk in previous and build_content_hash(previous[note.pk]) == last.content_hash:
+            base_content = previous[note.pk]
+        else:
+            base_content = None
+        revisions.append(build_revision(
+            note.pk, note.title, content, last.number + 1, last, base_content
+        ))
+    if revisions:
+        NoteRevision.objects.using(using).bulk_create(revisions)
+    return revisions
+
+
+def get_revision_content(revision):
+    """版の本文を復元する（スナップショットから差分を順に当てる。クエリは 1 回）"""
+    chain = (
+        NoteRevision.objects
+        .filter(note_id=revision.note_id, number__gte=revision.base, number__lte=revision.number)
+        .order_by('number')
+        .values_list('number', 'data', 'encoding')
+    )
+    content = None
+    for number, data, encoding in chain:
+        text = decode_body(data, encoding)
+        if number == revision.base:
+            content = text
+        else:
+            content = apply_delta(content, json.loads(text))
+    return content or ''
+
+
+def diff_revisions(old, new, old_content, new_content, context=3):
+    """2 つの版の unified diff（ヘッダーは版番号とタイトル）"""
+    return ''.join(difflib.unified_diff(
+        old_content.splitlines(keepends=True),
+        new_content.splitlines(keepends=True),
+        fromfile=f'#{old.number} {old.title}',
+        tofile=f'#{new.number} {new.title}',
+        n=context,
+    ))
+
+
+def select_kept_revisions(revisions, keep_all, retention=None, now=None):
+    """残す版の番号の集合
+
+    keep_all より新しい版はすべて、それより古い版は日ごとに最後の版だけを残し、
+    retention より古い版は削除する。最新の版は常に残す。
+    """
+    now = now or timezone.now()
+    keep_all_cutoff = now - keep_all
+    expire_cutoff = now - retention if retention else None
+    kept = {revisions[-1].number} if revisions else set()
+    daily = {}
+    for revision in revisions:
+        if revision.created_at >= keep_all_cutoff:
+            kept.add(revision.number)
+        elif expire_cutoff is None or revision.created_at >= expire_cutoff:
+            daily[timezone.localdate(revision.created_at)] = revision.number
+    kept.update(daily.values())
+    return kept
+
+
+def compact_note_revisions(note_id, keep_all, retention=None, now=None):
+    """1 ノート分の古い版を間引き、残った版を符号化し直す。削除数を返す"""
+    with transaction.atomic():
+        # 同じノートの保存（版の追加）と競合しないよう、ノートの行をロックする
+        if not list(Note.objects.select_for_update().filter(pk=note_id).values_list('pk', flat=True)):
+            return 0
+        revisions = list(
+            NoteRevision.objects.filter(note_id=note_id).order_by('number')
+            .only('number', 'created_at')
+        )
+        kept = select_kept_revisions(revisions, keep_all, retention, now)
+        if len(kept) == len(revisions):
+            return 0
+
+        # 全版の本文を先頭から順に復元し、残す版だけを間を詰めた差分で保存し直す
+        contents = {}
+        content = ''
+        for revision in NoteRevision.objects.filter(note_id=note_id).order_by('number'):
+            text = decode_body(revision.data, revision.encoding)
+            content = text if revision.base == revision.number else apply_delta(content, json.loads(text))
+            if revision.number in kept:
+                contents[revision.number] = (revision, content)
+
+        rebuilt = []
+        previous = previous_content = None
+        for number in sorted(contents):
+            revision, content = contents[number]
+            new = build_revision(note_id, revision.title, content, number, previous, previous_content)
+            revision.base, revision.data, revision.encoding = new.base, new.data, new.encoding
+            rebuilt.append(revision)
+            previous, previous_content = revision, content
+
+        deleted, _ = (
+            NoteRevision.objects.filter(note_id=note_id).exclude(number__in=kept).delete()
+        )
+        NoteRevision.objects.bulk_update(rebuilt, ['base', 'data', 'encoding'])
+    return deleted
+
+
+def compact_revisions(keep_all=None, retention=None, now=None):
+    """保持期間に従って全ノートの古い版を間引き、(対象ノート数, 削除数) を返す"""
+    if keep_all is None:
+        keep_all = timedelta(days=settings.NOTES_REVISION_KEEP_ALL_DAYS)
+    if retention is None:
+        # 0 日（timedelta(0)）は削除しない
+        retention = timedelta(days=settings.NOTES_REVISION_RETENTION_DAYS)
+    now = now or timezone.now()
+
+    note_ids = (
+        NoteRevision.objects.filter(created_at__lt=now - keep_all)
+        .values_list('note_id', flat=True).distinct().order_by('note_id')
+    )
+    notes = deleted = 0
+    for note_id in list(note_ids):
+        count = compact_note_revisions(note_id, keep_all, retention, now)
+        if count:
+            notes += 1
+            deleted += count
+    return notes, deleted
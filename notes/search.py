@@ -0,0 +1,208 @@
+# notelog-api/notes/search.py
+"""ノート全文検索
+
+日本語（CJK）は形態素解析を使わず文字 bigram に分割し、英数字は単語単位で
+トークン化する。トークン列は NoteBody.search_document に保持し、
+
+* PostgreSQL: NoteBody の to_tsvector('simple', search_document) の GIN インデックス
+  + title の pg_trgm GIN インデックス
+* それ以外（SQLite など）: NoteSearchToken テーブルによる転置インデックス
+
+で検索する。どちらもインデックス経由で候補を絞るため、ノート件数に対して
+線形にはならない。
+"""
+import html
+import re
+import unicodedata
+from collections import Counter
+
+from django.db import connection
+from django.db.models import Count, F, Q, Sum
+
+CJK_CHARS = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+TOKEN_RE = re.compile(rf'([{CJK_CHARS}]+)|([^\W_{CJK_CHARS}]+)')
+
+# URL や base64 などの長い文字列は索引しない
+MAX_TOKEN_LENGTH = 64
+# tsvector の 1MB 制限を超えないよう、1 ノートあたりの索引トークン数を制限する
+MAX_INDEXED_TOKENS = 50000
+
+TITLE_WEIGHT = 2
+CONTENT_WEIGHT = 1
+
+
+def normalize(text):
+    """全角英数・半角カナを揃え、小文字化する"""
+    return unicodedata.normalize('NFKC', text or '').lower()
+
+
+def tokenize(text):
+    """CJK は bigram、英数字は単語としてトークンを返す"""
+    for match in TOKEN_RE.finditer(normalize(text)):
+        cjk, word = match.groups()
+        if word:
+            if len(word) <= MAX_TOKEN_LENGTH:
+                yield word
+        elif len(cjk) == 1:
+            yield cjk
+        else:
+            for i in range(len(cjk) - 1):
+                yield cjk[i:i + 2]
+
+
+def build_search_document(title, content):
+    """NoteBody.search_document に保存するトークン列（重複なし・出現順）"""
+    tokens = dict.fromkeys(tokenize(title))
+    for token in tokenize(content):
+        if len(tokens) >= MAX_INDEXED_TOKENS:
+            break
+        tokens.setdefault(token)
+    return ' '.join(tokens)
+
+
+def parse_query(query):
+    """検索クエリをトークンに分割する。1 文字の CJK は前方一致として扱う"""
+    terms = []
+    for token in dict.fromkeys(tokenize(query)):
+        is_prefix = len(token) == 1 and bool(re.match(f'[{CJK_CHARS}]', token))
+        terms.append((token, is_prefix))
+    return terms
+
+
+def uses_postgres_index():
+    return connection.vendor == 'postgresql'
+
+
+def build_token_weights(title, content):
+    """転置インデックス用に トークン -> 重み（タイトル優先）を返す"""
+    weights = Counter()
+    for token in tokenize(title):
+        weights[token] += TITLE_WEIGHT
+    for token in tokenize(content):
+        if token not in weights and len(weights) >= MAX_INDEXED_TOKENS:
+            continue
+        weights[token] += CONTENT_WEIGHT
+    return weights
+
+
+def index_note(note):
+    """フォールバック用転置インデックスを更新する（PostgreSQL では何もしない）"""
+    index_notes([note])
+
+
+def index_notes(notes):
+    """複数ノートの転置インデックスをまとめて更新する（bulk 操作用）"""
+    from .models import NoteSearchToken
+
+    if uses_postgres_index() or not notes:
+        return
+
+    NoteSearchToken.objects.filter(note_id__in=[note.pk for note in notes]).delete()
+    NoteSearchToken.objects.bulk_create(
+        (
+            NoteSearchToken(note_id=note.pk, token=token, weight=weight)
+            for note in notes
+            for token, weight in build_token_weights(note.title, note.content).items()
+        ),
+        batch_size=1000,
+    )
+
+
+def search_notes(queryset, query, limit):
+    """ランク順に並んだノートのリストを返す（各要素に rank 属性を付与）"""
+    terms = parse_query(query)
+    if not terms:
+        return []
+    if uses_postgres_index():
+        return _search_postgres(queryset, query, terms, limit)
+    return _search_fallback(queryset, terms, limit)
+
+
+def _search_postgres(queryset, query, terms, limit):
+    from django.contrib.postgres.search import (
+        SearchQuery,
+        SearchRank,
+        SearchVector,
+        TrigramWordSimilarity,
+    )
+
+    tsquery = ' & '.join(
+        f"'{token}':*" if is_prefix else f"'{token}'" for token, is_prefix in terms
+    )
+    from .models import NoteBody
+
+    search_query = SearchQuery(tsquery, search_type='raw', config='simple')
+    # インデックス定義（migrations/0010）と同じ式にすること
+    vector = SearchVector('search_document', config='simple')
+
+    # トークン列（NoteBody）とタイトル（Note）は別のテーブルなので、OR で 1 つの条件に
+    # せず、それぞれの GIN インデックスで候補の id を取って UNION する
+    by_document = NoteBody.objects.alias(search=vector).filter(search=search_query).values('note_id')
+    by_title = queryset.model.objects.filter(title__trigram_word_similar=query).values('pk')
+
+    return list(
+        queryset
+        .filter(pk__in=by_document.union(by_title))
+        .alias(search=SearchVector('body__search_document', config='simple'))
+        .annotate(
+            rank=SearchRank(F('search'), search_query)
+            + TrigramWordSimilarity(query, 'title')
+        )
+        .with_content()
+        .order_by('-rank', '-created_at', '-id')[:limit]
+    )
+
+
+def _search_fallback(queryset, terms, limit):
+    from .models import NoteSearchToken
+
+    conditions = [
+        Q(token__startswith=token) if is_prefix else Q(token=token)
+        for token, is_prefix in terms
+    ]
+    any_term = Q()
+    for condition in conditions:
+        any_term |= condition
+    per_term = {f'term_{i}': Count('pk', filter=c) for i, c in enumerate(conditions)}
+
+    # 全クエリトークンを含むノートだけを重みの合計順に取り出す
+    ranked = list(
+        NoteSearchToken.objects
+        .filter(any_term, note__in=queryset.values('pk'))
+        .values('note_id')
+        .annotate(rank=Sum('weight'), **per_term)
+        .filter(**{f'{name}__gt': 0 for name in per_term})
+        .order_by('-rank', '-note_id')
+        .values_list('note_id', 'rank')[:limit]
+    )
+    ranks = dict(ranked)
+    notes = queryset.model.objects.filter(pk__in=ranks).with_content()
+    notes = sorted(notes, key=lambda n: (-ranks[n.pk], -n.pk))
+    for note in notes:
+        note.rank = float(ranks[note.pk])
+    return notes
+
+
+def highlight(text, query, width=80):
+    """クエリ語を <mark> で囲んだ抜粋（HTML エスケープ済み）を返す"""
+    text = unicodedata.normalize('NFKC', text or '')
+    words = [re.escape(w) for w in normalize(query).split() if w]
+    if not words:
+        return html.escape(text[:width])
+
+    pattern = re.compile('|'.join(sorted(words, key=len, reverse=True)), re.IGNORECASE)
+    match = pattern.search(text)
+    start = max(match.start() - width // 4, 0) if match else 0
+    excerpt = text[start:start + width]
+
+    parts = []
+    last = 0
+    for m in pattern.finditer(excerpt):
+        parts.append(html.escape(excerpt[last:m.start()]))
+        parts.append(f'<mark>{html.escape(m.group())}</mark>')
+        last = m.end()
+    parts.append(html.escape(excerpt[last:]))
+
+    prefix = '…' if start > 0 else ''
+    suffix = '…' if start + width < len(text) else ''
+    return prefix + ''.join(parts) + suffix
@@ -1,7 +1,162 @@
 from rest_framework import serializers
-from .models import Note
+from .models import Note, NoteRevision, NoteTombstone
+from .search import highlight
+
+
+def get_requested_fields(request):
+    """?fields=id,title のようなスパースフィールド指定を集合で返す（指定なしは None）"""
+    if request is None:
+        return None
+    value = request.query_params.get('fields')
+    if not value:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class SparseFieldsetMixin:
+    """?fields= で指定されたフィールドのみを出力する"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = get_requested_fields(self.context.get('request'))
+        if requested is not None:
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+    @classmethod
+    def get_output_fields(cls, request):
+        """出力するフィールド名"""
+        requested = get_requested_fields(request)
+        return cls.Meta.fields if requested is None else [
+            name for name in cls.Meta.fields if name in requested
+        ]
+
+    @classmethod
+    def get_model_fields(cls, request):
+        """出力に必要なモデルのカラム名（.only() 用）"""
+        return [name for name in cls.get_output_fields(request) if name not in cls._declared_fields]
+
+
+class NoteSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    # 本文は NoteBody に置かれ、Note.content はプロパティ
+    content = serializers.CharField(style={'base_template': 'textarea.html'})
+
+    class Meta:
+        model = Note
+        fields = ['id', 'title', 'content', 'created_at', 'updated_at']
+
+
+class NoteListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """一覧用の軽量表現（本文の代わりに抜粋・文字数・ハッシュを返す）"""
 
-class NoteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Note
-        fields = ['id', 'title', 'content', 'created_at']
+        fields = [
+            'id', 'title', 'excerpt', 'content_length', 'content_hash',
+            'created_at', 'updated_at',
+        ]
+        read_only_fields = fields
+
+
+class NoteSyncChangeSerializer(serializers.BaseSerializer):
+    """差分同期の 1 変更分（ノート本体、または削除の墓標）"""
+
+    def to_representation(self, instance):
+        if isinstance(instance, NoteTombstone):
+            return {
+                'id': instance.note_id,
+                'deleted': True,
+                'deleted_at': serializers.DateTimeField().to_representation(instance.deleted_at),
+            }
+        data = NoteSerializer(instance).to_representation(instance)
+        data['deleted'] = False
+        return data
+
+
+class NoteSearchResultSerializer(serializers.ModelSerializer):
+    """検索結果（スコアとハイライト付き抜粋）"""
+    rank = serializers.FloatField(read_only=True)
+    highlight = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Note
+        fields = ['id', 'title', 'created_at', 'rank', 'highlight']
+
+    def get_highlight(self, obj):
+        query = self.context.get('query', '')
+        return {
+            'title': highlight(obj.title, query),
+            'content': highlight(obj.content, query, width=160),
+        }
+
+
+class NoteRevisionSerializer(serializers.ModelSerializer):
+    """版の一覧用（本文なし）"""
+
+    class Meta:
+        model = NoteRevision
+        fields = ['number', 'title', 'content_length', 'content_hash', 'created_at']
+        read_only_fields = fields
+
+
+class NoteRevisionDetailSerializer(NoteRevisionSerializer):
+    """版の本文付き表現（content は notes.revisions で復元して context に渡す）"""
+    content = serializers.SerializerMethodField()
+
+    class Meta(NoteRevisionSerializer.Meta):
+        fields = ['number', 'title', 'content', 'content_length', 'content_hash', 'created_at']
+        read_only_fields = fields
+
+    def get_content(self, obj):
+        return self.context['content']
+
+
+class NoteBulkOperationSerializer(serializers.Serializer):
+    """一括 API の 1 操作分（create / update / delete）"""
+    OP_CREATE = 'create'
+    OP_UPDATE = 'update'
+    OP_DELETE = 'delete'
+
+    op = serializers.ChoiceField(choices=[OP_CREATE, OP_UPDATE, OP_DELETE])
+    id = serializers.IntegerField(required=False, min_value=1)
+    title = serializers.CharField(required=False, allow_blank=True, trim_whitespace=False)
+    content = serializers.CharField(required=False, allow_blank=True, trim_whitespace=False)
+
+    def validate(self, attrs):
+        op = attrs['op']
+        if op == self.OP_CREATE:
+            missing = [name for name in ('title', 'content') if name not in attrs]
+            if missing:
+                raise serializers.ValidationError({name: 'この項目は必須です。' for name in missing})
+            if 'id' in attrs:
+                raise serializers.ValidationError({'id': 'create では id を指定できません。'})
+        else:
+            if 'id' not in attrs:
+                raise serializers.ValidationError({'id': 'この項目は必須です。'})
+            if op == self.OP_UPDATE and not ({'title', 'content'} & attrs.keys()):
+                raise serializers.ValidationError('title または content を指定してください。')
+        return attrs
+
+
+class NoteBulkSerializer(serializers.Serializer):
+    operations = NoteBulkOperationSerializer(many=True, allow_empty=False)
+
+    def __init__(self, *args, max_operations=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if max_operations is not None:
+            self.fields['operations'].max_length = max_operations
+
+    def validate_operations(self, operations):
+        seen = set()
+        errors = []
+        for item in operations:
+            pk = item.get('id')
+            if pk is not None and pk in seen:
+                errors.append({'id': f'id={pk} が同じリクエスト内で重複しています。'})
+            else:
+                errors.append({})
+            if pk is not None:
+                seen.add(pk)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return operations
@@ -0,0 +1,35 @@
+# notelog-api/notes/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import cache
+from .models import Note
+from .search import index_note
+from .sync import record_tombstones
+
+# 検索インデックスの元になるフィールド。content は Note のカラムではないため、
+# update_fields には派生フィールドの content_hash として現れる
+SEARCH_SOURCE_FIELDS = {'title', 'content_hash'}
+
+
+@receiver(post_save, sender=Note)
+def update_search_index(sender, instance, raw=False, update_fields=None, **kwargs):
+    """ノート保存時に検索インデックスを更新する"""
+    if raw:
+        return
+    if update_fields is not None and not SEARCH_SOURCE_FIELDS & update_fields:
+        return
+    index_note(instance)
+
+
+@receiver(post_delete, sender=Note)
+def create_tombstone(sender, instance, using=None, **kwargs):
+    """ノート削除時に差分同期用の墓標を残す"""
+    record_tombstones([instance.pk], using=using)
+
+
+@receiver(post_save, sender=Note)
+@receiver(post_delete, sender=Note)
+def invalidate_response_cache(sender, **kwargs):
+    """ノートの保存・削除でレスポンスキャッシュを無効化する"""
+    cache.invalidate()
@@ -0,0 +1,55 @@
+# notelog-api/notes/storage.py
+"""ノート本文（NoteBody.data）の符号化
+
+NOTES_BODY_COMPRESSION_MIN_BYTES 以上の本文は NOTES_BODY_COMPRESSION（zstd / zlib）で
+圧縮して保存する。zstd は zstandard パッケージが必要で、未インストールなら圧縮せずに
+保存する。読み出しは NoteBody.encoding を見て復号するので、設定を変えても既存の
+本文はそのまま読める（次に保存されたときに新しい設定で書き直される）。
+"""
+import zlib
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# NoteBody.encoding の値（'' は圧縮なしの UTF-8）
+PLAIN = ''
+ZLIB = 'zlib'
+ZSTD = 'zstd'
+
+
+def _compress(encoding, data):
+    if encoding == ZSTD:
+        return zstandard.ZstdCompressor(level=settings.NOTES_BODY_ZSTD_LEVEL).compress(data)
+    return zlib.compress(data, settings.NOTES_BODY_ZLIB_LEVEL)
+
+
+def encode_body(text):
+    """本文を (data, encoding) にする。圧縮しても小さくならなければそのまま保存する"""
+    data = (text or '').encode('utf-8')
+    encoding = settings.NOTES_BODY_COMPRESSION
+    if encoding == ZSTD and zstandard is None:
+        encoding = PLAIN
+    if encoding not in (ZSTD, ZLIB) or len(data) < settings.NOTES_BODY_COMPRESSION_MIN_BYTES:
+        return data, PLAIN
+    compressed = _compress(encoding, data)
+    if len(compressed) >= len(data):
+        return data, PLAIN
+    return compressed, encoding
+
+
+def decode_body(data, encoding):
+    if data is None:
+        return ''
+    data = bytes(data)
+    if encoding == ZSTD:
+        if zstandard is None:
+            raise ImproperlyConfigured('zstd で圧縮されたノート本文の読み出しには zstandard が必要です')
+        return zstandard.ZstdDecompressor().decompress(data).decode('utf-8')
+    if encoding == ZLIB:
+        return zlib.decompress(data).decode('utf-8')
+    return data.decode('utf-8')
@@ -0,0 +1,99 @@
+# notelog-api/notes/sync.py
+"""オフラインクライアント向けの差分同期
+
+作成・更新されたノートは Note.change_seq、削除は NoteTombstone.change_seq に
+単調増加の変更番号を持つ。クライアントは前回受け取った番号（トークン）以降の
+変更だけを受け取るので、再同期のコストはライブラリ全体ではなく変更量に比例する。
+"""
+import heapq
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import NoteSyncState, NoteTombstone
+
+SYNC_DEFAULT_LIMIT = 500
+SYNC_MAX_LIMIT = 1000
+
+
+class SyncTokenExpired(Exception):
+    """since が墓標の保持期間より古く、差分では同期できない"""
+
+
+def parse_token(value):
+    """トークン（変更番号の文字列）を整数にする。未指定は 0（全件同期）"""
+    if value in (None, ''):
+        return 0
+    seq = int(value)
+    if seq < 0:
+        raise ValueError(value)
+    return seq
+
+
+def record_tombstones(note_ids, using=None):
+    """削除されたノートの墓標を作成する"""
+    note_ids = list(note_ids)
+    if not note_ids:
+        return
+    first = NoteSyncState.allocate(len(note_ids), using=using)
+    NoteTombstone.objects.using(using).bulk_create(
+        NoteTombstone(note_id=note_id, change_seq=first + i)
+        for i, note_id in enumerate(note_ids)
+    )
+
+
+def assign_change_seqs(notes, using=None):
+    """save() を通らない一括書き込み用に、連続した変更番号をまとめて割り当てる"""
+    if not notes:
+        return
+    first = NoteSyncState.allocate(len(notes), using=using)
+    for i, note in enumerate(notes):
+        note.change_seq = first + i
+
+
+def changes_since(queryset, since, limit=SYNC_DEFAULT_LIMIT):
+    """since より後の変更を変更番号順に返す
+
+    戻り値は (変更のリスト, 次回のトークン, 続きがあるか)。変更はノートまたは
+    墓標のインスタンス。
+    """
+    if since and since < NoteSyncState.load().compacted_through:
+        raise SyncTokenExpired(since)
+
+    notes = queryset.filter(change_seq__gt=since).with_content().order_by('change_seq')[:limit + 1]
+    if since:
+        tombstones = (
+            NoteTombstone.objects.filter(change_seq__gt=since)
+            .order_by('change_seq')[:limit + 1]
+        )
+    else:
+        # 全件同期では削除済みノートを伝える必要がない
+        tombstones = []
+
+    merged = list(heapq.merge(notes, tombstones, key=lambda change: change.change_seq))
+    has_more = len(merged) > limit
+    changes = merged[:limit]
+    next_token = changes[-1].change_seq if changes else since
+    return changes, next_token, has_more
+
+
+def compact_tombstones(retention=None, now=None):
+    """保持期間を過ぎた墓標を削除し、削除数を返す"""
+    if retention is None:
+        retention = timedelta(days=settings.NOTES_SYNC_TOMBSTONE_RETENTION_DAYS)
+    cutoff = (now or timezone.now()) - retention
+
+    with transaction.atomic():
+        expired = NoteTombstone.objects.filter(deleted_at__lt=cutoff)
+        horizon = expired.aggregate(m=Max('change_seq'))['m']
+        if horizon is None:
+            return 0
+        deleted, _ = NoteTombstone.objects.filter(change_seq__lte=horizon).delete()
+        state = NoteSyncState.load(for_update=True)
+        if horizon > state.compacted_through:
+            state.compacted_through = horizon
+            state.save(update_fields=['compacted_through'])
+    return deleted
@@ -1,3 +1,394 @@
-from django.test import TestCase
+import gzip
+import json
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from users.tokens import RevocableRefreshToken
+
+from . import cache as response_cache
+from .bulk import apply_bulk_operations
+from .models import Note, NoteRevision, NoteSearchToken
+from .revisions import compact_note_revisions, get_revision_content
+from .sync import compact_tombstones
+
+
+class NoteAPITestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            email='notes@example.com', name='notes', password='notes-password'
+        )
+
+    def setUp(self):
+        cache.clear()
+        token = RevocableRefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+
+class NoteImportTests(NoteAPITestCase):
+    def post_ndjson(self, body):
+        return self.client.post('/api/notes/import/', body, content_type='application/x-ndjson')
+
+    def test_invalid_records_are_reported_per_record(self):
+        lines = [
+            json.dumps({'title': 'first', 'content': 'a'}),
+            json.dumps({'title': 'bad date', 'content': 'b', 'created_at': '2020-13-45T00:00:00'}),
+            '{not json',
+            json.dumps({'title': 'no content'}),
+            json.dumps({'title': 'last', 'content': 'c', 'created_at': '2020-01-02T03:04:05+09:00'}),
+        ]
+        body = ('\n'.join(lines) + '\n').encode() + b'\xff\n'
+        response = self.post_ndjson(body)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['imported'], 2)
+        self.assertEqual(response.data['failed'], 4)
+        self.assertEqual([error['position'] for error in response.data['errors']], [2, 3, 4, 6])
+        self.assertIn('created_at', response.data['errors'][0]['error'])
+        self.assertEqual(
+            sorted(Note.objects.values_list('title', flat=True)), ['first', 'last']
+        )
+
+
+class NoteExportTests(NoteAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Note.objects.create(title='日本語', content='本文\n2 行目')
+        Note.objects.create(title='long', content='x' * 10000)
+
+    def export(self, **params):
+        response = self.client.get('/api/notes/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def snapshot(self):
+        # DjangoJSONEncoder は日時をミリ秒までで書き出す
+        return {
+            note.title: (
+                note.content,
+                note.created_at.replace(microsecond=note.created_at.microsecond // 1000 * 1000),
+            )
+            for note in Note.objects.all()
+        }
+
+    def test_export_round_trips_through_import(self):
+        exported = self.snapshot()
+        body = self.export()
+        self.assertEqual(gzip.decompress(self.export(gzip=1)), body)
+
+        Note.objects.all().delete()
+        response = self.client.post('/api/notes/import/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['imported'], response.data['failed']), (2, 0))
+        self.assertEqual(self.snapshot(), exported)
+
+
+class NoteCursorPaginationTests(NoteAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.notes = [Note.objects.create(title=f'note {i}', content=f'body {i}') for i in range(5)]
+
+    def test_pages_follow_next_and_previous_links(self):
+        response = self.client.get('/api/notes/', {'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([note['title'] for note in response.data['results']], ['note 4', 'note 3'])
+        self.assertIsNone(response.data['previous'])
+
+        titles = []
+        url = response.data['next']
+        while url:
+            page = self.client.get(url)
+            titles += [note['title'] for note in page.data['results']]
+            url = page.data['next']
+        self.assertEqual(titles, ['note 2', 'note 1', 'note 0'])
+
+        previous = self.client.get(page.data['previous'])
+        self.assertEqual([note['title'] for note in previous.data['results']], ['note 2', 'note 1'])
+
+    def test_invalid_cursor_is_rejected(self):
+        for cursor in ('not-base64!', 'cD14Jmk9MQ=='):
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/api/notes/', {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.data['detail'], 'カーソルが不正です')
+
+
+class NoteSearchTests(NoteAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.tokyo = Note.objects.create(title='東京旅行', content='浅草と上野を歩いた')
+        cls.kyoto = Note.objects.create(title='京都', content='東京から新幹線で移動')
+        cls.other = Note.objects.create(title='Django notes', content='Search with SQLite fallback')
+
+    def search(self, query):
+        response = self.client.get('/api/notes/search/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [result['id'] for result in response.data['results']]
+
+    def test_cjk_bigrams_rank_title_matches_first(self):
+        self.assertEqual(self.search('東京'), [self.tokyo.pk, self.kyoto.pk])
+        # 全角英字は NFKC で正規化してから照合する
+        self.assertEqual(self.search('ＳＱＬｉｔｅ'), [self.other.pk])
+        # 1 文字の CJK は前方一致
+        self.assertEqual(self.search('浅'), [self.tokyo.pk])
+        self.assertEqual(self.search('大阪'), [])
+
+    def test_all_query_terms_must_match(self):
+        self.assertEqual(self.search('東京 上野'), [self.tokyo.pk])
+
+    def test_empty_query_is_rejected(self):
+        response = self.client.get('/api/notes/search/', {'q': ' '})
+        self.assertEqual(response.status_code, 400)
+
+    def test_title_and_content_updates_reindex(self):
+        note = Note.objects.get(pk=self.other.pk)
+        note.content = '大阪の話'
+        note.save(update_fields=['content'])
+        self.assertEqual(self.search('大阪'), [note.pk])
+
+        note.title = '名古屋'
+        note.save(update_fields=['title'])
+        self.assertEqual(self.search('名古屋'), [note.pk])
+
+    def test_unrelated_update_does_not_reindex(self):
+        NoteSearchToken.objects.filter(note=self.other).delete()
+        note = Note.objects.get(pk=self.other.pk)
+        note.save(update_fields=['excerpt'])
+        self.assertFalse(NoteSearchToken.objects.filter(note=note).exists())
+
+
+class NoteBulkTests(NoteAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.keep = Note.objects.create(title='keep', content='original')
+        cls.drop = Note.objects.create(title='drop', content='to be deleted')
+
+    def post_bulk(self, operations):
+        return self.client.post('/api/notes/bulk/', {'operations': operations}, format='json')
+
+    def test_operations_are_applied_together(self):
+        response = self.post_bulk([
+            {'op': 'create', 'title': 'new', 'content': '新しいノート'},
+            {'op': 'update', 'id': self.keep.pk, 'content': 'changed'},
+            {'op': 'delete', 'id': self.drop.pk},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [result['status'] for result in response.data['results']], ['created', 'updated', 'deleted']
+        )
+        keep = Note.objects.get(pk=self.keep.pk)
+        self.assertEqual((keep.title, keep.content, keep.version), ('keep', 'changed', 2))
+        self.assertEqual(Note.objects.get(pk=response.data['results'][0]['id']).content, '新しいノート')
+        self.assertFalse(Note.objects.filter(pk=self.drop.pk).exists())
+
+    def test_missing_note_rolls_back_every_operation(self):
+        response = self.post_bulk([
+            {'op': 'create', 'title': 'new', 'content': 'not created'},
+            {'op': 'update', 'id': self.keep.pk, 'title': 'not updated'},
+            {'op': 'delete', 'id': self.drop.pk},
+            {'op': 'delete', 'id': self.drop.pk + 1000},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['not_applied', 'not_applied', 'not_applied', 'error'],
+        )
+        self.assertEqual(
+            sorted(Note.objects.values_list('title', flat=True)), ['drop', 'keep']
+        )
+        self.assertEqual(Note.objects.get(pk=self.keep.pk).version, 1)
+
+    def test_failure_after_writes_rolls_back(self):
+        operations = [
+            {'op': 'create', 'title': 'new', 'content': 'not created'},
+            {'op': 'update', 'id': self.keep.pk, 'title': 'not updated'},
+            {'op': 'delete', 'id': self.drop.pk},
+        ]
+        with mock.patch('notes.bulk.save_bodies', side_effect=DatabaseError('boom')):
+            with self.assertRaises(DatabaseError):
+                apply_bulk_operations(Note.objects.all(), operations)
+
+        self.assertEqual(
+            sorted(Note.objects.values_list('title', flat=True)), ['drop', 'keep']
+        )
+
+    def test_invalid_operations_are_rejected(self):
+        response = self.post_bulk([
+            {'op': 'update', 'id': self.keep.pk},
+            {'op': 'delete', 'id': self.keep.pk},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('operations', response.data['details'])
+        self.assertEqual(Note.objects.count(), 2)
+
+
+class NoteSyncTests(NoteAPITestCase):
+    def sync(self, **params):
+        return self.client.get('/api/notes/sync/', params)
+
+    def test_changes_and_tombstones_since_token(self):
+        first = Note.objects.create(title='first', content='a')
+        second = Note.objects.create(title='second', content='b')
+        response = self.sync()
+        self.assertEqual([change['id'] for change in response.data['changes']], [first.pk, second.pk])
+        token = response.data['next_token']
+
+        self.assertEqual(self.sync(since=token).data['changes'], [])
+
+        first.title = 'first (edited)'
+        first.save()
+        second_id = second.pk
+        second.delete()
+        third = Note.objects.create(title='third', content='c')
+
+        response = self.sync(since=token)
+        self.assertEqual(
+            [(change['id'], change['deleted']) for change in response.data['changes']],
+            [(first.pk, False), (second_id, True), (third.pk, False)],
+        )
+        self.assertEqual(response.data['changes'][0]['title'], 'first (edited)')
+        self.assertFalse(response.data['has_more'])
+
+    def test_limit_pages_through_changes(self):
+        notes = [Note.objects.create(title=f'note {i}', content='') for i in range(3)]
+        response = self.sync(limit=2)
+        self.assertTrue(response.data['has_more'])
+
+        response = self.sync(since=response.data['next_token'], limit=2)
+        self.assertEqual([change['id'] for change in response.data['changes']], [notes[2].pk])
+        self.assertFalse(response.data['has_more'])
+
+    def test_invalid_token_is_rejected(self):
+        for token in ('abc', '-1'):
+            with self.subTest(token=token):
+                self.assertEqual(self.sync(since=token).status_code, 400)
+
+    def test_token_older_than_compacted_tombstones_requires_reset(self):
+        note = Note.objects.create(title='old', content='')
+        token = self.sync().data['next_token']
+        note.delete()
+        compact_tombstones(retention=timedelta(0), now=timezone.now() + timedelta(seconds=1))
+
+        response = self.sync(since=token)
+        self.assertEqual(response.status_code, 410)
+        self.assertTrue(response.data['reset'])
+        self.assertEqual(self.sync().status_code, 200)
+
+
+class NoteResponseCacheTests(NoteAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.note = Note.objects.create(title='cached', content='body')
+
+    def setUp(self):
+        super().setUp()
+        response_cache.stats.reset()
+
+    def test_second_request_is_served_from_cache(self):
+        first = self.client.get('/api/notes/')
+        second = self.client.get('/api/notes/')
+
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(response_cache.stats.as_dict()['hits'], 1)
+
+    def test_save_and_delete_invalidate_cached_responses(self):
+        url = f'/api/notes/{self.note.pk}/'
+        self.client.get('/api/notes/')
+        self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(url, {'title': 'renamed'}, format='json')
+        self.assertEqual(self.client.get(url).data['title'], 'renamed')
+        self.assertEqual(self.client.get('/api/notes/').data['results'][0]['title'], 'renamed')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Note.objects.get(pk=self.note.pk).delete()
+        self.assertEqual(self.client.get('/api/notes/').data['results'], [])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_if_none_match_returns_304_from_cache(self):
+        for url in ('/api/notes/', f'/api/notes/{self.note.pk}/'):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_if_modified_since_only_applies_to_retrieve(self):
+        url = f'/api/notes/{self.note.pk}/'
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        # 一覧は削除が Last-Modified に現れないので、キャッシュ済みでも 304 にしない
+        last_modified = self.client.get('/api/notes/')['Last-Modified']
+        response = self.client.get('/api/notes/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response_cache.stats.as_dict()['hits'], 2)
+
+
+@override_settings(NOTES_REVISION_SNAPSHOT_INTERVAL=3)
+class NoteRevisionTests(NoteAPITestCase):
+    def setUp(self):
+        super().setUp()
+        lines = [f'line {i}\n' for i in range(40)]
+        self.contents = []
+        note = Note.objects.create(title='revised', content=''.join(lines))
+        self.contents.append(note.content)
+        for i in range(5):
+            lines[i * 3] = f'edited {i}\n'
+            note.content = ''.join(lines)
+            note.save()
+            self.contents.append(note.content)
+        self.note = note
+
+    def url(self, suffix=''):
+        return f'/api/notes/{self.note.pk}/revisions/{suffix}'
+
+    def test_revisions_are_stored_as_snapshots_and_deltas(self):
+        revisions = NoteRevision.objects.filter(note=self.note).order_by('number')
+        self.assertEqual(
+            [(revision.number, revision.base) for revision in revisions],
+            [(1, 1), (2, 1), (3, 1), (4, 4), (5, 4), (6, 4)],
+        )
+        for number, content in enumerate(self.contents, start=1):
+            with self.subTest(number=number):
+                response = self.client.get(self.url(f'{number}/'))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data['content'], content)
+
+    def test_diff_between_revisions(self):
+        response = self.client.get(self.url('diff/'), {'from': 2, 'to': 5})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('-line 3\n', response.data['diff'])
+        self.assertIn('+edited 3\n', response.data['diff'])
+
+        self.assertEqual(self.client.get(self.url('diff/'), {'from': 1}).data['to'], 6)
+        self.assertEqual(self.client.get(self.url('diff/'), {'from': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url('diff/')).status_code, 400)
+        self.assertEqual(self.client.get(self.url('diff/'), {'from': 99}).status_code, 404)
+        self.assertEqual(self.client.get(self.url('99/')).status_code, 404)
+
+    def test_compaction_keeps_remaining_revisions_restorable(self):
+        month_ago = timezone.now() - timedelta(days=30)
+        NoteRevision.objects.filter(note=self.note).update(created_at=month_ago)
+        deleted = compact_note_revisions(self.note.pk, keep_all=timedelta(days=7))
+
+        self.assertEqual(deleted, 5)
+        revision = NoteRevision.objects.get(note=self.note)
+        self.assertEqual((revision.number, revision.base), (6, 6))
+        self.assertEqual(get_revision_content(revision), self.contents[-1])
@@ -1,9 +1,328 @@
-from rest_framework import viewsets
-from rest_framework.permissions import IsAuthenticated
-from .models import Note
-from .serializers import NoteSerializer
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from . import cache
+from .bulk import BulkOperationError, apply_bulk_operations
+from .conditional import (
+    make_etag,
+    not_modified_response,
+    note_etag,
+    page_etag,
+    set_validators,
+)
+from .export import export_response
+from .importer import ZIP_ERRORS, NoteImporter, iter_ndjson_records, iter_records, spool_stream
+from .models import Note, NoteRevision
+from .pagination import NoteCursorPagination
+from .renderers import NDJSONRenderer
+from .rendering import get_rendered_html, renderer_version
+from .revisions import diff_revisions, get_revision_content
+from .search import search_notes
+from .serializers import (
+    NoteBulkSerializer,
+    NoteListSerializer,
+    NoteRevisionDetailSerializer,
+    NoteRevisionSerializer,
+    NoteSearchResultSerializer,
+    NoteSerializer,
+    NoteSyncChangeSerializer,
+)
+from .sync import (
+    SYNC_DEFAULT_LIMIT,
+    SYNC_MAX_LIMIT,
+    SyncTokenExpired,
+    changes_since,
+    parse_token,
+)
 
 class NoteViewSet(viewsets.ModelViewSet):
-    queryset = Note.objects.all().order_by('-created_at')
+    queryset = Note.objects.all().order_by('-created_at', '-id')
     serializer_class = NoteSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = NoteCursorPagination
+
+    # ページネーション・オブジェクト取得に常に必要なカラム
+    required_fields = ['id', 'created_at', 'updated_at', 'version']
+
+    search_default_limit = 20
+    search_max_limit = 100
+    bulk_max_operations = 1000
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return NoteListSerializer
+        return super().get_serializer_class()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            # 一覧では本文を、?fields= 指定時は不要なカラムを読み込まない
+            serializer_class = self.get_serializer_class()
+            fields = serializer_class.get_model_fields(self.request)
+            if 'content' in serializer_class.get_output_fields(self.request):
+                queryset = queryset.with_content()
+                fields += ['body__data', 'body__encoding']
+            queryset = queryset.only(*dict.fromkeys(self.required_fields + fields))
+        elif self.action in ('update', 'partial_update'):
+            # 派生フィールドの再計算とレスポンスで本文を使う
+            queryset = queryset.with_content()
+        elif self.action in ('revisions', 'revision', 'revision_diff'):
+            # 版の API ではノートの存在確認だけに使う
+            queryset = queryset.only('id')
+        elif self.action == 'rendered':
+            # HTML はキャッシュか NoteBody.html から返すので、本文は必要なときだけ読む
+            queryset = queryset.only('id', 'content_hash')
+        return queryset
+
+    def get_representation_variant(self):
+        """同じノートでも表現が変わる要素（アクション・?fields=・ページ位置）"""
+        return f'{self.action}:{self.request.get_full_path()}'
+
+    def list(self, request, *args, **kwargs):
+        return cache.cached_response(
+            request, 'list', lambda: self.list_uncached(request, *args, **kwargs)
+        )
+
+    def list_uncached(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return super().list(request, *args, **kwargs)
+
+        # 取得済みのページ行（本文なし）から ETag を計算し、一致すればシリアライズしない
+        etag = page_etag(page, self.get_representation_variant())
+        last_modified = max((note.updated_at for note in page), default=None)
+        # 削除は updated_at に現れないため、一覧では If-Modified-Since による 304 は返さない
+        response = not_modified_response(request, etag)
+        if response is not None:
+            return response
+
+        serializer = self.get_serializer(page, many=True)
+        response = self.get_paginated_response(serializer.data)
+        return set_validators(response, etag, last_modified)
+
+    def retrieve(self, request, *args, **kwargs):
+        return cache.cached_response(
+            request, 'retrieve', lambda: self.retrieve_uncached(request, *args, **kwargs),
+            use_last_modified=True,
+        )
+
+    def retrieve_uncached(self, request, *args, **kwargs):
+        # 版番号と更新日時だけを読む軽量クエリで先に判定する
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        state = (
+            self.filter_queryset(self.get_queryset())
+            .filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+            .values('pk', 'version', 'updated_at')
+            .first()
+        )
+        if state is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        etag = note_etag(
+            state['pk'], state['version'], state['updated_at'],
+            self.get_representation_variant()
+        )
+        response = not_modified_response(request, etag, state['updated_at'])
+        if response is not None:
+            return response
+
+        response = super().retrieve(request, *args, **kwargs)
+        return set_validators(response, etag, state['updated_at'])
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """全文検索 /api/notes/search/?q=...&limit=..."""
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response(
+                {'error': '検索キーワード（q）は必須です'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            limit = int(request.query_params.get('limit', self.search_default_limit))
+        except ValueError:
+            limit = self.search_default_limit
+        limit = max(1, min(limit, self.search_max_limit))
+
+        notes = search_notes(self.get_queryset(), query, limit)
+        serializer = NoteSearchResultSerializer(
+            notes, many=True, context={**self.get_serializer_context(), 'query': query}
+        )
+        return Response({'query': query, 'results': serializer.data})
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """一括作成・更新・削除 /api/notes/bulk/（全操作を 1 トランザクションで実行）"""
+        serializer = NoteBulkSerializer(
+            data=request.data, max_operations=self.bulk_max_operations
+        )
+        if not serializer.is_valid():
+            return Response(
+                {'error': '不正な操作が含まれています', 'details': serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            results = apply_bulk_operations(
+                Note.objects.all(), serializer.validated_data['operations']
+            )
+        except BulkOperationError as e:
+            return Response(
+                {'error': '適用できない操作が含まれています', 'results': e.results},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], renderer_classes=[JSONRenderer, NDJSONRenderer])
+    def export(self, request):
+        """NDJSON エクスポート /api/notes/export/（?gzip=1 で gzip 圧縮）"""
+        compress = request.query_params.get('gzip', '').lower() in ('1', 'true')
+        return export_response(self.get_queryset(), compress=compress)
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_notes(self, request):
+        """大量インポート /api/notes/import/
+
+        application/x-ndjson / application/zip の本文、または multipart の file を
+        逐次読み込む。本文をメモリに展開しないため 5MB の上限に掛からない。
+        """
+        content_type = request.content_type.split(';')[0].strip()
+        try:
+            if content_type == 'application/x-ndjson':
+                records = iter_ndjson_records(iter(request.stream.readline, b''))
+            elif content_type == 'application/zip':
+                records = iter_records(spool_stream(request.stream), 'upload.zip')
+            elif content_type == 'multipart/form-data' and 'file' in request.FILES:
+                upload = request.FILES['file']
+                records = iter_records(upload, upload.name)
+            else:
+                return Response(
+                    {'error': 'NDJSON または zip ファイルを送信してください'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        except ZIP_ERRORS as e:
+            return Response(
+                {'error': f'zip ファイルを読み込めません: {e}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        summary = NoteImporter().run(records)
+        return Response(summary, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def sync(self, request):
+        """差分同期 /api/notes/sync/?since=<token>&limit=...
+
+        since 以降に作成・更新されたノートと、削除されたノートの墓標を返す。
+        since を省略すると全件（墓標なし）を返す。
+        """
+        try:
+            since = parse_token(request.query_params.get('since'))
+        except ValueError:
+            return Response(
+                {'error': 'since が不正です'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = int(request.query_params.get('limit', SYNC_DEFAULT_LIMIT))
+        except ValueError:
+            limit = SYNC_DEFAULT_LIMIT
+        limit = max(1, min(limit, SYNC_MAX_LIMIT))
+
+        try:
+            changes, next_token, has_more = changes_since(self.get_queryset(), since, limit)
+        except SyncTokenExpired:
+            return Response(
+                {'error': 'トークンの有効期限が切れています。全件を再同期してください', 'reset': True},
+                status=status.HTTP_410_GONE
+            )
+
+        serializer = NoteSyncChangeSerializer(changes, many=True)
+        return Response({
+            'changes': serializer.data,
+            'next_token': str(next_token),
+            'has_more': has_more,
+        })
+
+    @action(detail=True, methods=['get'])
+    def rendered(self, request, pk=None):
+        """本文をレンダリングしたサニタイズ済み HTML /api/notes/{id}/rendered/
+
+        HTML は本文とレンダラーの版だけで決まる。本文には id も含むので、ノートの id と合わせて ETag にする。
+        """
+        note = self.get_object()
+        version = renderer_version()
+        etag = make_etag('rendered', note.pk, note.content_hash, version)
+        response = not_modified_response(request, etag)
+        if response is not None:
+            return response
+        response = Response({
+            'id': note.pk,
+            'content_hash': note.content_hash,
+            'renderer': version,
+            'rendered_html': get_rendered_html(note),
+        })
+        return set_validators(response, etag)
+
+    @action(detail=True, methods=['get'])
+    def revisions(self, request, pk=None):
+        """版の一覧 /api/notes/{id}/revisions/（新しい順）"""
+        note = self.get_object()
+        revisions = NoteRevision.objects.filter(note=note).defer('data').order_by('-number')
+        return Response({'results': NoteRevisionSerializer(revisions, many=True).data})
+
+    @action(detail=True, methods=['get'], url_path=r'revisions/(?P<number>[0-9]+)')
+    def revision(self, request, pk=None, number=None):
+        """版の本文 /api/notes/{id}/revisions/{number}/"""
+        revision = self.get_revision(self.get_object(), number)
+        if revision is None:
+            return Response({'error': '版が見つかりません'}, status=status.HTTP_404_NOT_FOUND)
+        serializer = NoteRevisionDetailSerializer(
+            revision, context={'content': get_revision_content(revision)}
+        )
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['get'], url_path='revisions/diff')
+    def revision_diff(self, request, pk=None):
+        """2 つの版の差分 /api/notes/{id}/revisions/diff/?from=1&to=3（to を省略すると最新の版）"""
+        try:
+            numbers = [
+                int(request.query_params[name]) if request.query_params.get(name) else None
+                for name in ('from', 'to')
+            ]
+        except ValueError:
+            return Response(
+                {'error': 'from / to は版番号で指定してください'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if numbers[0] is None:
+            return Response(
+                {'error': 'from は必須です'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        note = self.get_object()
+        old, new = (self.get_revision(note, number) for number in numbers)
+        if old is None or new is None:
+            return Response({'error': '版が見つかりません'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'from': old.number,
+            'to': new.number,
+            'diff': diff_revisions(old, new, get_revision_content(old), get_revision_content(new)),
+        })
+
+    def get_revision(self, note, number=None):
+        """ノートの版（number が None なら最新の版）。なければ None"""
+        revisions = NoteRevision.objects.filter(note=note).defer('data')
+        if number is None:
+            return revisions.order_by('-number').first()
+        return revisions.filter(number=number).first()
+
+    @action(detail=False, methods=['get'], url_path='cache-stats', permission_classes=[IsAdminUser])
+    def cache_stats(self, request):
+        """レスポンスキャッシュのヒット・ミス数（このプロセス分）"""
+        return Response(cache.stats.as_dict())
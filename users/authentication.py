@@ -0,0 +1,73 @@
+# notelog-api/users/authentication.py
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from core.metrics import record_cache
+
+# キャッシュに保存するユーザー項目（password などは含めない）
+SNAPSHOT_FIELDS = ('id', 'email', 'name', 'is_active', 'is_staff', 'is_superuser')
+
+
+def snapshot_key(user_id):
+    return f'users:snapshot:{user_id}'
+
+
+def get_snapshot_timeout():
+    return getattr(settings, 'JWT_USER_CACHE_TIMEOUT', 300)
+
+
+def invalidate_user_snapshot(user_id):
+    cache.delete(snapshot_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """ユーザーのスナップショットをキャッシュし、認証ごとの users テーブル参照を省く JWT 認証
+
+    キャッシュにない場合のみ DB から読み込む。スナップショットは User の保存・削除時に
+    破棄され（users.signals）、それ以外の経路（QuerySet.update など）の変更も
+    JWT_USER_CACHE_TIMEOUT 秒で反映される。
+    """
+
+    def get_user(self, validated_token):
+        # パスワード変更による失効チェックにはハッシュが必要なので通常の取得に任せる
+        if api_settings.CHECK_REVOKE_TOKEN or api_settings.USER_ID_FIELD != 'id':
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        key = snapshot_key(user_id)
+        snapshot = cache.get(key)
+        record_cache(hit=snapshot is not None)
+        if snapshot is None:
+            snapshot = (
+                self.user_model.objects.filter(pk=user_id).values(*SNAPSHOT_FIELDS).first()
+            )
+            if snapshot is None:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            cache.set(key, snapshot, timeout=get_snapshot_timeout())
+
+        user = self.build_user(snapshot)
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
+
+    def build_user(self, snapshot):
+        """スナップショットから User を組み立てる
+
+        他の項目は遅延読み込み（deferred）扱いになるので、アクセスすれば DB から読まれ、
+        save() しても読み込んでいない項目は上書きされない。
+        """
+        db = router.db_for_read(self.user_model)
+        # from_db() は値をモデルのフィールド定義順で受け取る
+        names = [
+            f.attname for f in self.user_model._meta.concrete_fields if f.attname in snapshot
+        ]
+        return self.user_model.from_db(db, names, [snapshot[name] for name in names])
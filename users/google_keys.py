@@ -0,0 +1,130 @@
+# notelog-api/users/google_keys.py
+"""Google の ID トークン（id_token）をローカルで検証する
+
+署名鍵（JWKS）はプロセス内と共有キャッシュの 2 段でキャッシュし、有効期限は
+レスポンスの Cache-Control: max-age に従う。期限が近づいたらバックグラウンドで
+更新し、未知の kid（鍵のローテーション）を受け取った場合はその場で取り直す。
+"""
+import asyncio
+import logging
+import re
+import time
+
+import jwt
+from django.conf import settings
+from django.core.cache import cache
+
+from .http import http_client
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_ISSUERS = ['accounts.google.com', 'https://accounts.google.com']
+CACHE_KEY = 'users:google:jwks'
+# Cache-Control がない場合の保持秒数
+DEFAULT_MAX_AGE = 3600
+# 期限のこの秒数前からバックグラウンドで更新する
+REFRESH_AHEAD = 300
+# 未知の kid による再取得の最小間隔（不正なトークンで Google を叩かせないため）
+MIN_REFETCH_INTERVAL = 60
+
+MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+
+class GoogleTokenError(Exception):
+    pass
+
+
+class GoogleKeySet:
+    def __init__(self):
+        self.keys = {}
+        self.expires_at = 0.0
+        self.fetched_at = 0.0
+        self._refresh_task = None
+        self._lock = None
+        self._lock_loop = None
+
+    def load(self, jwks, expires_at):
+        self.keys = {
+            key.key_id: key
+            for key in jwt.PyJWKSet.from_dict(jwks).keys
+            if key.key_id
+        }
+        self.expires_at = expires_at
+
+    async def get_key(self, kid, pooled=True):
+        now = time.time()
+        if now >= self.expires_at or kid not in self.keys:
+            # 他プロセスが取得済みの鍵があれば使う
+            shared = await cache.aget(CACHE_KEY)
+            if shared and shared['expires_at'] > now:
+                self.load(shared['jwks'], shared['expires_at'])
+
+        if kid not in self.keys or now >= self.expires_at:
+            if kid in self.keys or now - self.fetched_at >= MIN_REFETCH_INTERVAL:
+                await self.refresh(pooled=pooled)
+        elif self.expires_at - now < REFRESH_AHEAD and pooled:
+            self.schedule_refresh()
+
+        try:
+            return self.keys[kid]
+        except KeyError:
+            raise GoogleTokenError(f'Unknown signing key: {kid}')
+
+    def schedule_refresh(self):
+        """期限切れ前にバックグラウンドで鍵を更新する（同時に 1 つだけ）"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.get_running_loop().create_task(self.refresh())
+
+    async def refresh(self, pooled=True):
+        # WSGI ではリクエストごとにイベントループが変わるため、ループごとにロックを作る
+        loop = asyncio.get_running_loop()
+        if self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        async with self._lock:
+            # 待っている間に他のコルーチンが更新済みなら取り直さない
+            if time.time() - self.fetched_at < 1:
+                return
+            try:
+                async with http_client(pooled=pooled) as client:
+                    response = await client.get(settings.GOOGLE_OAUTH2_JWKS_URL)
+                response.raise_for_status()
+                jwks = response.json()
+            except Exception as e:
+                logger.warning('Failed to fetch Google JWKS: %s', e)
+                self.fetched_at = time.time()
+                return
+
+            match = MAX_AGE_RE.search(response.headers.get('Cache-Control', ''))
+            max_age = int(match.group(1)) if match else DEFAULT_MAX_AGE
+            expires_at = time.time() + max_age
+            self.load(jwks, expires_at)
+            self.fetched_at = time.time()
+            await cache.aset(
+                CACHE_KEY, {'jwks': jwks, 'expires_at': expires_at}, timeout=max_age
+            )
+
+
+key_set = GoogleKeySet()
+
+
+async def verify_id_token(id_token, client_id, pooled=True):
+    """署名・aud・iss・exp を検証し、クレームを返す"""
+    try:
+        header = jwt.get_unverified_header(id_token)
+    except jwt.PyJWTError as e:
+        raise GoogleTokenError(f'Malformed id_token: {e}')
+
+    signing_key = await key_set.get_key(header.get('kid'), pooled=pooled)
+    try:
+        return jwt.decode(
+            id_token,
+            key=signing_key.key,
+            algorithms=['RS256'],
+            audience=client_id,
+            issuer=GOOGLE_ISSUERS,
+            leeway=settings.GOOGLE_ID_TOKEN_LEEWAY,
+            options={'require': ['exp', 'iat', 'iss', 'aud', 'sub']},
+        )
+    except jwt.PyJWTError as e:
+        raise GoogleTokenError(f'Invalid id_token: {e}')
@@ -0,0 +1,129 @@
+# notelog-api/users/hashers.py
+"""パスワードハッシュ
+
+ハッシュ計算（encode / verify）は上限付きのスレッドプールで実行し、ログインや登録が
+集中してもハッシュに使う CPU を PASSWORD_HASHING_WORKERS 本に抑える。
+空きを待つリクエストが PASSWORD_HASHING_QUEUE 件を超えるか、PASSWORD_HASHING_TIMEOUT
+秒待っても空かない場合は 503 を返す。hashlib（PBKDF2 / scrypt）と argon2-cffi は
+計算中に GIL を解放するため、スレッドでも並列に動く。
+
+コストは settings の PASSWORD_HASHER_* で調整する。設定を変えても既存のハッシュは
+検証でき、ログイン時に現在の設定で自動的に再ハッシュされる（must_update）。
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher,
+    PBKDF2PasswordHasher,
+    ScryptPasswordHasher,
+)
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class PasswordHashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'ログインが混み合っています。しばらくしてから再度お試しください。'
+    default_code = 'password_hashing_busy'
+
+
+class HashingPool:
+    """実行中と待機中の合計をセマフォで制限するスレッドプール"""
+
+    def __init__(self, workers, queue_size, timeout):
+        self.workers = workers
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hashing')
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._local = threading.local()
+
+    def run(self, func, *args, **kwargs):
+        # プール内からの呼び出し（verify 内の encode など）はそのまま実行する
+        if getattr(self._local, 'active', False):
+            return func(*args, **kwargs)
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PasswordHashingBusy()
+        try:
+            return self._executor.submit(self._call, func, *args, **kwargs).result()
+        finally:
+            self._slots.release()
+
+    def _call(self, func, *args, **kwargs):
+        self._local.active = True
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self._local.active = False
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HashingPool(
+                    workers=settings.PASSWORD_HASHING_WORKERS or os.cpu_count() or 1,
+                    queue_size=settings.PASSWORD_HASHING_QUEUE,
+                    timeout=settings.PASSWORD_HASHING_TIMEOUT,
+                )
+    return _pool
+
+
+class PooledHasherMixin:
+    def encode(self, password, salt, *args, **kwargs):
+        return get_pool().run(super().encode, password, salt, *args, **kwargs)
+
+    def verify(self, password, encoded):
+        return get_pool().run(super().verify, password, encoded)
+
+    def harden_runtime(self, password, encoded):
+        return get_pool().run(super().harden_runtime, password, encoded)
+
+
+class TunedPBKDF2PasswordHasher(PooledHasherMixin, PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASHER_PBKDF2_ITERATIONS
+
+
+class TunedScryptPasswordHasher(PooledHasherMixin, ScryptPasswordHasher):
+    @property
+    def work_factor(self):
+        return settings.PASSWORD_HASHER_SCRYPT_WORK_FACTOR
+
+    @property
+    def block_size(self):
+        return settings.PASSWORD_HASHER_SCRYPT_BLOCK_SIZE
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_HASHER_SCRYPT_PARALLELISM
+
+    @property
+    def maxmem(self):
+        # scrypt の必要メモリ（128 * N * r * p）に余裕を持たせる
+        return 256 * self.work_factor * self.block_size * self.parallelism
+
+
+class TunedArgon2PasswordHasher(PooledHasherMixin, Argon2PasswordHasher):
+    """argon2-cffi が必要（pip install argon2-cffi）"""
+
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_HASHER_ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_HASHER_ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_HASHER_ARGON2_PARALLELISM
+
@@ -0,0 +1,66 @@
+# notelog-api/users/http.py
+"""外部 API（Google）呼び出し用の HTTP クライアント
+
+ASGI ではイベントループごとに 1 つの httpx.AsyncClient を共有し、keep-alive の
+コネクションプールで TLS ハンドシェイクを使い回す。WSGI（リクエストごとに
+async_to_sync でループが作られる）では共有せず、リクエスト内でだけ使う。
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import httpx
+from django.conf import settings
+
+from core.metrics import record_http
+
+_clients = {}
+
+
+async def _mark_start(request):
+    request.extensions['notelog_started'] = time.perf_counter()
+
+
+async def _record_elapsed(response):
+    # レスポンスヘッダーを受け取るまでの時間を計測する（core.metrics）
+    started = response.request.extensions.get('notelog_started')
+    if started is not None:
+        record_http(time.perf_counter() - started)
+
+
+def build_client():
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(settings.GOOGLE_HTTP_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=settings.GOOGLE_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.GOOGLE_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=settings.GOOGLE_HTTP_KEEPALIVE_EXPIRY,
+        ),
+        event_hooks={'request': [_mark_start], 'response': [_record_elapsed]},
+    )
+
+
+def get_pooled_client():
+    """実行中のイベントループで共有するクライアントを返す"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = _clients[loop] = build_client()
+    return client
+
+
+@asynccontextmanager
+async def http_client(pooled=True):
+    if pooled:
+        yield get_pooled_client()
+    else:
+        async with build_client() as client:
+            yield client
+
+
+async def close_pooled_clients():
+    """ASGI の lifespan.shutdown で呼び出す"""
+    loop = asyncio.get_running_loop()
+    client = _clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
@@ -0,0 +1,80 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hashers
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from users.hashers import get_pool
+
+
+class Command(BaseCommand):
+    help = 'パスワードハッシュ方式ごとに、1 コアあたりの秒間ログイン数（verify）を計測します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=50, help='方式ごとの検証回数')
+        parser.add_argument(
+            '--concurrency', type=int, default=os.cpu_count() or 1,
+            help='同時にログインするリクエスト数',
+        )
+        parser.add_argument(
+            '--set', action='append', default=[], metavar='NAME=VALUE',
+            help='コスト設定を上書きする（例: --set PASSWORD_HASHER_SCRYPT_WORK_FACTOR=32768）',
+        )
+
+    def handle(self, *args, **options):
+        overrides = {}
+        for item in options['set']:
+            name, sep, value = item.partition('=')
+            if not sep or not name.startswith('PASSWORD_HASHER_'):
+                raise CommandError(f'--set の形式が不正です: {item}')
+            # 現在の設定値と同じ型で解釈する（コスト設定は数値のみ）
+            current = getattr(settings, name, None)
+            if not isinstance(current, (int, float)) or isinstance(current, bool):
+                raise CommandError(f'--set で変更できない設定です: {name}')
+            try:
+                overrides[name] = type(current)(value)
+            except ValueError:
+                raise CommandError(
+                    f'{name} には {type(current).__name__} の値を指定してください: {value!r}'
+                ) from None
+
+        pool = get_pool()
+        cores = min(options['concurrency'], pool.workers, os.cpu_count() or 1)
+        self.stdout.write(
+            f"logins={options['logins']} concurrency={options['concurrency']} "
+            f'pool_workers={pool.workers} cores={cores}'
+        )
+        with override_settings(**overrides):
+            for hasher in get_hashers():
+                self.benchmark(hasher, options['logins'], options['concurrency'], cores)
+
+    def benchmark(self, hasher, logins, concurrency, cores):
+        try:
+            encoded = hasher.encode('benchmark-password', hasher.salt())
+        except (ImportError, ValueError) as e:
+            self.stdout.write(f'{hasher.algorithm:<14} スキップ: {e}')
+            return
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(
+                lambda _: hasher.verify('benchmark-password', encoded), range(logins)
+            ))
+        elapsed = time.perf_counter() - started
+        if not all(results):
+            raise CommandError(f'{hasher.algorithm} の検証に失敗しました')
+
+        per_second = logins / elapsed
+        params = {
+            k: v for k, v in hasher.decode(encoded).items()
+            if k not in ('algorithm', 'hash', 'salt')
+        }
+        current = ' *' if hasher.algorithm == get_hashers()[0].algorithm else ''
+        self.stdout.write(
+            f'{hasher.algorithm:<14}{current} {params} '
+            f'{elapsed * 1000 / logins:.1f} ms/login, {per_second:.1f} logins/s, '
+            f'{per_second / cores:.1f} logins/s/core'
+        )
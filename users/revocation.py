@@ -0,0 +1,169 @@
+# notelog-api/users/revocation.py
+"""リフレッシュトークンの失効リスト
+
+失効した JTI を共有キャッシュにトークンの残り有効期限（exp まで）だけ保持する。
+期限切れのトークンは署名検証の段階で弾かれるため、それ以降は覚えておく必要がなく、
+token_blacklist アプリのようにテーブルが増え続けることはない。
+
+JWT_REVOCATION_FILTER を有効にすると、プロセス内にブルームフィルタを持ち
+「失効していない」ことが確実なトークンはキャッシュを引かずに通す。フィルタは
+失効ログ（キャッシュ上の連番付きエントリ）から JWT_REVOCATION_FILTER_SYNC_INTERVAL
+秒ごとに同期するため、他プロセスでの失効が反映されるまでその秒数だけ遅れる。
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+KEY_PREFIX = 'users:revoked'
+SEQ_KEY = 'users:revoked:seq'
+# exp を丸める単位（秒）。フィルタはこの単位ごとに作り、期限が過ぎたら捨てる
+BUCKET_SECONDS = 3600
+# 失効ログを get_many でまとめて読み込む件数
+SYNC_BATCH = 1000
+# 連番の採番からログの書き込みまでの間に同期すると、ログがまだ無い連番を読み飛ばす。
+# 末尾 SYNC_BATCH 件の中で見つからなかった連番は、この秒数のあいだ次の同期で読み直す
+LOG_GAP_GRACE_SECONDS = 60
+
+
+def revoked_key(jti):
+    return f'{KEY_PREFIX}:{jti}'
+
+
+def log_key(seq):
+    return f'{KEY_PREFIX}:log:{seq}'
+
+
+def remaining_ttl(exp):
+    return max(int(exp - time.time()) + 1, 1)
+
+
+class BloomFilter:
+    """ビット配列と blake2b による二重ハッシュのブルームフィルタ"""
+
+    def __init__(self, size_bits, num_hashes):
+        self.size = size_bits
+        self.num_hashes = num_hashes
+        self.bits = bytearray((size_bits + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.num_hashes))
+
+    def add(self, value):
+        for pos in self._positions(value):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value))
+
+
+class RevocationFilter:
+    """exp のバケットごとのブルームフィルタと、失効ログの同期状態"""
+
+    def __init__(self, size_bits, num_hashes, sync_interval):
+        self.size_bits = size_bits
+        self.num_hashes = num_hashes
+        self.sync_interval = sync_interval
+        self.buckets = {}
+        self.seq = None
+        # 見つからなかった末尾付近の連番 -> 最初に見つからなかった時刻（monotonic）
+        self.gaps = {}
+        self.synced_at = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, jti, exp):
+        bucket = int(exp) // BUCKET_SECONDS
+        with self._lock:
+            bloom = self.buckets.get(bucket)
+            if bloom is None:
+                bloom = self.buckets[bucket] = BloomFilter(self.size_bits, self.num_hashes)
+            bloom.add(jti)
+
+    def might_contain(self, jti, exp):
+        self.sync()
+        bloom = self.buckets.get(int(exp) // BUCKET_SECONDS)
+        return bloom is not None and jti in bloom
+
+    def sync(self):
+        now = time.monotonic()
+        if now - self.synced_at < self.sync_interval:
+            return
+        with self._lock:
+            if now - self.synced_at < self.sync_interval:
+                return
+            self.synced_at = now
+            current = cache.get(SEQ_KEY, 0)
+            if self.seq is None or current < self.seq:
+                # 起動直後やキャッシュのクリア後は、残っているログをすべて読み直す
+                self.seq = 0
+                self.gaps = {}
+            start, self.seq = self.seq + 1, current
+            retry = dict(self.gaps)
+            # 期限切れのバケットを捨てる
+            expired = int(time.time()) // BUCKET_SECONDS
+            for bucket in [b for b in self.buckets if b < expired]:
+                del self.buckets[bucket]
+
+        # 期限切れで消えたログは、トークン自体も期限切れなので読み飛ばしてよい。
+        # ただし書き込み途中の可能性がある末尾付近の連番は gaps に残して読み直す
+        seqs = [*retry, *range(start, current + 1)]
+        gaps = {}
+        for offset in range(0, len(seqs), SYNC_BATCH):
+            batch = seqs[offset:offset + SYNC_BATCH]
+            found = cache.get_many([log_key(seq) for seq in batch])
+            for seq in batch:
+                entry = found.get(log_key(seq))
+                if entry is not None:
+                    self.add(*entry)
+                elif seq in retry:
+                    if now - retry[seq] < LOG_GAP_GRACE_SECONDS:
+                        gaps[seq] = retry[seq]
+                elif seq > current - SYNC_BATCH:
+                    gaps[seq] = now
+        with self._lock:
+            self.gaps = gaps
+
+_filter = None
+
+
+def get_filter():
+    global _filter
+    if not getattr(settings, 'JWT_REVOCATION_FILTER', False):
+        return None
+    if _filter is None:
+        _filter = RevocationFilter(
+            size_bits=settings.JWT_REVOCATION_FILTER_BITS,
+            num_hashes=settings.JWT_REVOCATION_FILTER_HASHES,
+            sync_interval=settings.JWT_REVOCATION_FILTER_SYNC_INTERVAL,
+        )
+    return _filter
+
+
+def revoke(jti, exp):
+    """JTI を失効させる。すでに失効済みなら False を返す（同時リフレッシュの検出用）"""
+    ttl = remaining_ttl(exp)
+    if not cache.add(revoked_key(jti), 1, timeout=ttl):
+        return False
+
+    revocation_filter = get_filter()
+    if revocation_filter is not None:
+        revocation_filter.add(jti, exp)
+        try:
+            seq = cache.incr(SEQ_KEY)
+        except ValueError:
+            cache.add(SEQ_KEY, 0, timeout=None)
+            seq = cache.incr(SEQ_KEY)
+        cache.set(log_key(seq), (jti, exp), timeout=ttl)
+    return True
+
+
+def is_revoked(jti, exp):
+    revocation_filter = get_filter()
+    if revocation_filter is not None and not revocation_filter.might_contain(jti, exp):
+        return False
+    return cache.get(revoked_key(jti)) is not None
@@ -1,17 +1,29 @@
 # notelog-api/users/serializers.py
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from dj_rest_auth.jwt_auth import CookieTokenRefreshSerializer
 from dj_rest_auth.registration.serializers import RegisterSerializer
+from .tokens import RevocableRefreshToken
 
 User = get_user_model()
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = RevocableRefreshToken
+
     def validate(self, attrs):
         data = super().validate(attrs)
         data['name'] = self.user.name  # nameをフロントへ返す
         return data
 
+class RevocableTokenRefreshSerializer(TokenRefreshSerializer):
+    """ローテーション時に古いリフレッシュトークンを失効リストに入れる"""
+    token_class = RevocableRefreshToken
+
+class RevocableCookieTokenRefreshSerializer(CookieTokenRefreshSerializer):
+    """dj-rest-auth の token/refresh/ 用（Cookie からも読む）"""
+    token_class = RevocableRefreshToken
+
 class UserRegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
 
@@ -0,0 +1,15 @@
+# notelog-api/users/signals.py
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import invalidate_user_snapshot
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_auth_snapshot(sender, instance, **kwargs):
+    """ユーザーの更新・無効化・削除で認証用スナップショットを破棄する"""
+    invalidate_user_snapshot(instance.pk)
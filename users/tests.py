@@ -1,3 +1,82 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
 from django.test import TestCase
+from rest_framework.test import APITestCase
+
+from . import revocation
+from .tokens import RevocableRefreshToken
+
+
+class RefreshTokenRevocationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            email='revocation@example.com', name='revocation', password='revocation-password'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_rotated_refresh_token_cannot_be_reused(self):
+        refresh = str(RevocableRefreshToken.for_user(self.user))
+
+        response = self.client.post('/api/auth/refresh/', {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.data['refresh'], refresh)
+
+        response = self.client.post('/api/auth/refresh/', {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_revoke_reports_already_revoked(self):
+        token = RevocableRefreshToken.for_user(self.user)
+        jti, exp = token['jti'], token['exp']
+
+        self.assertFalse(revocation.is_revoked(jti, exp))
+        self.assertTrue(revocation.revoke(jti, exp))
+        self.assertFalse(revocation.revoke(jti, exp))
+        self.assertTrue(revocation.is_revoked(jti, exp))
+
+
+class RevocationFilterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.filter = revocation.RevocationFilter(size_bits=1 << 12, num_hashes=3, sync_interval=0)
+        self.exp = int(time.time()) + 3600
+
+    def publish(self, seq, jti):
+        cache.set(revocation.log_key(seq), (jti, self.exp))
+
+    def test_sync_reads_log_entries_from_other_processes(self):
+        self.publish(1, 'first')
+        self.publish(2, 'second')
+        cache.set(revocation.SEQ_KEY, 2)
+
+        self.assertTrue(self.filter.might_contain('first', self.exp))
+        self.assertTrue(self.filter.might_contain('second', self.exp))
+        self.assertFalse(self.filter.might_contain('other', self.exp))
+
+    def test_sync_retries_seq_published_before_its_log_entry(self):
+        # 他プロセスの revoke() が連番を進めた直後、ログを書く前に同期した場合
+        cache.set(revocation.SEQ_KEY, 1)
+        self.assertFalse(self.filter.might_contain('racing', self.exp))
+        self.assertEqual(list(self.filter.gaps), [1])
+
+        self.publish(1, 'racing')
+        self.assertTrue(self.filter.might_contain('racing', self.exp))
+        self.assertEqual(self.filter.gaps, {})
+
 
-# Create your tests here.
+class BenchmarkPasswordHashersCommandTests(TestCase):
+    def test_invalid_overrides_are_rejected(self):
+        for item in (
+            'PASSWORD_HASHER_PBKDF2_ITERATIONS',
+            'PASSWORD_HASHER_PBKDF2_ITERATIONS=many',
+            'PASSWORD_HASHER=argon2',
+            'PASSWORD_HASHER_UNKNOWN=1',
+        ):
+            with self.subTest(item=item):
+                with self.assertRaises(CommandError):
+                    call_command('benchmark_password_hashers', '--set', item, '--logins', '1')
@@ -0,0 +1,31 @@
+# notelog-api/users/tokens.py
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import revocation
+
+
+class RevocableRefreshToken(RefreshToken):
+    """失効リスト（users.revocation）で失効を管理するリフレッシュトークン
+
+    発行時には何も記録しない（OutstandingToken への INSERT は行わない）。
+    """
+
+    def verify(self, *args, **kwargs):
+        super().verify(*args, **kwargs)
+        self.check_blacklist()
+
+    def check_blacklist(self):
+        if revocation.is_revoked(self.payload[api_settings.JTI_CLAIM], self.payload['exp']):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        """TokenRefreshSerializer がローテーション時に呼び出す"""
+        if not revocation.revoke(self.payload[api_settings.JTI_CLAIM], self.payload['exp']):
+            # 同じトークンによる同時リフレッシュは 1 つだけ通す
+            raise TokenError(_("Token is blacklisted"))
+
+    def outstand(self):
+        return None
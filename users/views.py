@@ -7,16 +7,26 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from django.contrib.auth import get_user_model
 from django.shortcuts import redirect
+from django.core.handlers.asgi import ASGIRequest
 from django.http import JsonResponse
 from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from rest_framework_simplejwt.tokens import RefreshToken
-import requests
+from django.views import View
+from dj_rest_auth.jwt_auth import get_refresh_view
+import httpx
+import json
 import logging
 
 # シリアライザのインポート
-from .serializers import CustomTokenObtainPairSerializer, UserRegisterSerializer
+from .google_keys import GoogleTokenError, verify_id_token
+from .http import http_client
+from .serializers import (
+    CustomTokenObtainPairSerializer,
+    RevocableCookieTokenRefreshSerializer,
+    UserRegisterSerializer,
+)
+from .tokens import RevocableRefreshToken
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -25,6 +35,10 @@ logger = logging.getLogger(__name__)
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
 
+# dj-rest-auth のトークンリフレッシュビュー（失効リストは users.revocation で管理）
+class RevocableCookieTokenRefreshView(get_refresh_view()):
+    serializer_class = RevocableCookieTokenRefreshSerializer
+
 # ユーザー登録ビュー
 class UserRegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
@@ -32,25 +46,28 @@ class UserRegisterView(generics.CreateAPIView):
     permission_classes = [AllowAny]
 
 # Google認証トークン生成ビュー（メインAPI）
+# Google との通信中にワーカーを占有しないよう非同期ビューとして実装（ASGI で共有コネクションプールを使用）
 @method_decorator(csrf_exempt, name='dispatch')
-class GoogleAuthTokenView(APIView):
-    permission_classes = [AllowAny]
-    
-    def get(self, request):
+class GoogleAuthTokenView(View):
+    async def get(self, request):
         """GET時は簡単な確認メッセージを返す"""
-        return Response({
+        return JsonResponse({
             'message': 'Google Auth Token API endpoint is working',
             'method': 'POST required with code parameter'
         })
-    
-    def post(self, request):
+
+    async def post(self, request):
         """Googleの認証コードからJWTトークンを発行"""
         try:
-            code = request.data.get('code')
-            logger.info(f"Google auth request received. Code: {code[:10] if code else 'None'}...")
+            try:
+                payload = json.loads(request.body or b'{}')
+            except ValueError:
+                payload = {}
+            code = payload.get('code') if isinstance(payload, dict) else None
+            logger.info("Google auth request received. Code: %s...", code[:10] if code else None)
             
             if not code:
-                return Response(
+                return JsonResponse(
                     {'error': 'Authorization code is required'}, 
                     status=status.HTTP_400_BAD_REQUEST
                 )
@@ -66,93 +83,108 @@ class GoogleAuthTokenView(APIView):
             
             if not client_id or not client_secret:
                 logger.error("Google OAuth2 credentials not found")
-                return Response(
+                return JsonResponse(
                     {'error': 'Google OAuth2 credentials not configured'}, 
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR
                 )
             
             redirect_uri = 'http://localhost:5173/auth/callback'
             
-            logger.info(f"Making Google token request with client_id: {client_id[:10]}...")
-            
-            # Googleからアクセストークンを取得
-            token_response = requests.post('https://oauth2.googleapis.com/token', data={
-                'client_id': client_id,
-                'client_secret': client_secret,
-                'code': code,
-                'grant_type': 'authorization_code',
-                'redirect_uri': redirect_uri,
-            }, timeout=10)
-            
-            logger.info(f"Google token response: {token_response.status_code}")
-            
-            if token_response.status_code != 200:
-                logger.error(f"Google token error: {token_response.text}")
-                return Response(
-                    {
-                        'error': 'Failed to obtain access token from Google',
-                        'details': token_response.text,
-                        'status_code': token_response.status_code
-                    }, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            token_data = token_response.json()
-            access_token = token_data.get('access_token')
-            
-            if not access_token:
-                logger.error(f"No access token in Google response: {token_data}")
-                return Response(
-                    {'error': 'Access token not found in Google response'}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+            logger.info("Making Google token request with client_id: %s...", client_id[:10])
             
-            logger.info("Getting user info from Google...")
-            
-            # Googleからユーザー情報を取得
-            user_response = requests.get(
-                'https://www.googleapis.com/oauth2/v2/userinfo',
-                headers={'Authorization': f'Bearer {access_token}'},
-                timeout=10
-            )
-            
-            if user_response.status_code != 200:
-                logger.error(f"Google user info error: {user_response.text}")
-                return Response(
-                    {'error': 'Failed to obtain user info from Google'}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+            # ASGI ではイベントループで共有するプール済みクライアントを使う
+            pooled = isinstance(request, ASGIRequest)
+            async with http_client(pooled=pooled) as client:
+                # Googleからアクセストークンを取得
+                token_response = await client.post(settings.GOOGLE_OAUTH2_TOKEN_URL, data={
+                    'client_id': client_id,
+                    'client_secret': client_secret,
+                    'code': code,
+                    'grant_type': 'authorization_code',
+                    'redirect_uri': redirect_uri,
+                })
+                
+                logger.info("Google token response: %s", token_response.status_code)
+                
+                if token_response.status_code != 200:
+                    logger.error("Google token error: %s", token_response.text)
+                    return JsonResponse(
+                        {
+                            'error': 'Failed to obtain access token from Google',
+                            'details': token_response.text,
+                            'status_code': token_response.status_code
+                        }, 
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                
+                token_data = token_response.json()
+                access_token = token_data.get('access_token')
+                id_token = token_data.get('id_token')
+                
+                if not access_token:
+                    logger.error("No access token in Google response: %s", token_data)
+                    return JsonResponse(
+                        {'error': 'Access token not found in Google response'}, 
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                
+                if id_token:
+                    # id_token を手元で署名検証してユーザー情報を得る（userinfo への往復を省略）
+                    try:
+                        user_data = await verify_id_token(id_token, client_id, pooled=pooled)
+                    except GoogleTokenError as e:
+                        logger.error("Google id_token verification failed: %s", e)
+                        return JsonResponse(
+                            {'error': 'Invalid id_token from Google'}, 
+                            status=status.HTTP_400_BAD_REQUEST
+                        )
+                else:
+                    logger.info("Getting user info from Google...")
+                    
+                    # Googleからユーザー情報を取得
+                    user_response = await client.get(
+                        settings.GOOGLE_OAUTH2_USERINFO_URL,
+                        headers={'Authorization': f'Bearer {access_token}'},
+                    )
+                    
+                    if user_response.status_code != 200:
+                        logger.error("Google user info error: %s", user_response.text)
+                        return JsonResponse(
+                            {'error': 'Failed to obtain user info from Google'}, 
+                            status=status.HTTP_400_BAD_REQUEST
+                        )
+                    
+                    user_data = user_response.json()
             
-            user_data = user_response.json()
             email = user_data.get('email')
             name = user_data.get('name', user_data.get('given_name', ''))
-            google_id = user_data.get('id', '')
+            google_id = user_data.get('id', user_data.get('sub', ''))
             
-            logger.info(f"Google user data: email={email}, name={name}")
+            logger.info("Google user data: email=%s, name=%s", email, name)
             
             if not email:
-                return Response(
+                return JsonResponse(
                     {'error': 'Email not found in Google user data'}, 
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
             # ユーザーを取得または作成
-            user, created = User.objects.get_or_create(
+            user, created = await User.objects.aget_or_create(
                 email=email,
                 defaults={'name': name if name else email.split('@')[0]}
             )
             
             if created:
-                logger.info(f"New user created: {user.email}")
+                logger.info("New user created: %s", user.email)
             else:
-                logger.info(f"Existing user found: {user.email}")
+                logger.info("Existing user found: %s", user.email)
                 # 既存ユーザーの名前を更新（空の場合のみ）
                 if not user.name and name:
                     user.name = name
-                    user.save()
+                    await user.asave()
             
             # JWTトークンを生成
-            refresh = RefreshToken.for_user(user)
+            refresh = RevocableRefreshToken.for_user(user)
             
             response_data = {
                 'access': str(refresh.access_token),
@@ -164,19 +196,19 @@ class GoogleAuthTokenView(APIView):
                 }
             }
             
-            logger.info(f"JWT token generated successfully for user: {user.email}")
+            logger.info("JWT token generated successfully for user: %s", user.email)
             
-            return Response(response_data, status=status.HTTP_200_OK)
+            return JsonResponse(response_data, status=status.HTTP_200_OK)
             
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Network error during Google auth: {str(e)}")
-            return Response(
+        except httpx.HTTPError as e:
+            logger.error("Network error during Google auth: %s", e)
+            return JsonResponse(
                 {'error': f'Network error: {str(e)}'}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
         except Exception as e:
-            logger.error(f"Unexpected error during Google auth: {str(e)}", exc_info=True)
-            return Response(
+            logger.error("Unexpected error during Google auth: %s", e, exc_info=True)
+            return JsonResponse(
                 {'error': f'Authentication failed: {str(e)}'}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
@@ -196,7 +228,7 @@ try:
             """レスポンス形式をカスタマイズ"""
             if getattr(settings, 'REST_AUTH', {}).get('USE_JWT', False):
                 # JWT使用時
-                refresh = RefreshToken.for_user(self.user)
+                refresh = RevocableRefreshToken.for_user(self.user)
                 
                 return Response({
                     'access': str(refresh.access_token),
@@ -211,7 +243,7 @@ try:
                 return super().get_response()
 
 except ImportError as e:
-    logger.warning(f"allauth import error: {e}")
+    logger.warning("allauth import error: %s", e)
     
     class GoogleLogin(APIView):
         permission_classes = [AllowAny]
@@ -234,7 +266,7 @@ def google_callback(request):
     try:
         error = request.GET.get('error')
         if error:
-            logger.error(f"Google callback error: {error}")
+            logger.error("Google callback error: %s", error)
             return JsonResponse({'error': error}, status=400)
         
         code = request.GET.get('code')
@@ -246,5 +278,5 @@ def google_callback(request):
         return redirect(frontend_url)
         
     except Exception as e:
-        logger.error(f"Google callback error: {str(e)}")
+        logger.error("Google callback error: %s", e)
         return JsonResponse({'error': str(e)}, status=500)
\ No newline at end of file